@@ -0,0 +1,476 @@
+"""
+Headless JSON HTTP API over the data layer, for mobile clients and kiosks.
+
+    python api_server.py [--host HOST] [--port PORT]
+
+This runs one process. To use every core, run api_workers.py instead.
+
+The server is a small HTTP/1.1 implementation on asyncio streams, with
+keep-alive and JSON bodies, so it needs nothing beyond the standard library.
+The data-layer functions block, so each one runs on a thread pool sized to
+the connection pool. That keeps the event loop free, and there are never
+more database calls in flight than pooled connections.
+API_CONFIG['max_concurrency'] caps the requests being handled at once.
+Requests over the cap wait up to queue_timeout seconds and then get a 503.
+
+Every endpoint except /login needs the session token from /login, sent as
+"Authorization: Bearer <token>" (or as "token" in the JSON body). Requests
+without a live session get a 401. The caller is always the session's user:
+requests are booked for them, only a space's provider can accept, deny or
+bill its requests, and only the booker or the provider can park and unpark.
+
+Endpoints:
+    POST /login                       {username, password} -> user and session token
+    POST /session                     -> user, without a password check
+    POST /logout
+    GET  /spaces/nearby?lat=&lon=&radius_km=
+    GET  /spaces/<id>
+    POST /requests                    {space_id, vehicle_number}
+    POST /requests/<id>/accept        (provider)
+    POST /requests/<id>/deny          (provider)
+    POST /requests/<id>/park          ACCEPTED -> ACTIVE
+    POST /requests/<id>/unpark        ACTIVE -> COMPLETED
+    POST /requests/<id>/bill          {amount} (provider; COMPLETED requests, once; defaults to duration x rate)
+    GET  /users/<id>/bills            (own bills only)
+    POST /bills/<id>/pay              {amount, payment_method} (own PENDING bills, for the billed amount)
+"""
+import argparse
+import asyncio
+import json
+import math
+import re
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from config import API_CONFIG, POOL_CONFIG
+from database import (
+    BillRejectedError,
+    PaymentRejectedError,
+    SpaceFullError,
+    SpaceNotFoundError,
+    calculate_bill,
+    create_parking_request,
+    generate_bill,
+    get_parking_space,
+    get_parking_spaces_in_bbox,
+    get_pending_bills,
+    process_payment,
+    update_pending_requests,
+    update_request_status,
+    verify_user
+)
+from sessions import create_session, revoke_session, validate_token
+from spatial_index import bounding_box, within_radius_batch
+
+PAYMENT_METHODS = ('CREDIT_CARD', 'DEBIT_CARD', 'UPI', 'NET_BANKING')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _number(data, name, kind=float, required=True, default=None):
+    value = data.get(name)
+    if value is None or value == '':
+        if required:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} is required")
+        return default
+    try:
+        return kind(value[0] if isinstance(value, list) else value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a number")
+
+
+def _require_provider(session, action):
+    if session['user_type'] != 'PROVIDER':
+        raise HTTPError(HTTPStatus.FORBIDDEN, f"Only providers can {action}")
+
+
+class ParkingAPI:
+    """Routes requests to data-layer functions; one instance per server process"""
+
+    def __init__(self, max_concurrency=None, db_threads=None):
+        self.max_concurrency = max_concurrency or API_CONFIG['max_concurrency']
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        # One thread per pooled connection: DB calls queue here rather than in the pool
+        self._db_executor = ThreadPoolExecutor(max_workers=db_threads or POOL_CONFIG['size'],
+                                               thread_name_prefix='api-db')
+        self.connections = set()  # writers of open client connections
+        self.in_flight = 0
+        self.closing = False
+        # Routes that do not need a session
+        self.public_routes = {self.login}
+        self.routes = [
+            ('POST', r'/login', self.login),
+            ('POST', r'/session', self.resume_session),
+            ('POST', r'/logout', self.logout),
+            ('GET', r'/spaces/nearby', self.nearby_spaces),
+            ('GET', r'/spaces/(\d+)', self.space_detail),
+            ('POST', r'/requests', self.submit_request),
+            ('POST', r'/requests/(\d+)/(accept|deny)', self.decide_request),
+            ('POST', r'/requests/(\d+)/(park|unpark)', self.park_or_unpark),
+            ('POST', r'/requests/(\d+)/bill', self.bill_request),
+            ('GET', r'/users/(\d+)/bills', self.pending_bills),
+            ('POST', r'/bills/(\d+)/pay', self.pay_bill),
+        ]
+        self.routes = [(method, re.compile(pattern + r'$'), handler) for method, pattern, handler in self.routes]
+
+    async def db(self, func, *args, **kwargs):
+        """Run a blocking data-layer call off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, lambda: func(*args, **kwargs))
+
+    def close(self):
+        self._db_executor.shutdown(wait=False)
+
+    async def shutdown(self, server, timeout):
+        """Stop accepting, give in-flight requests up to timeout seconds, then drop idle connections"""
+        self.closing = True
+        server.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.in_flight and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self.connections):
+            writer.close()
+        # Let the connection handlers see the close and exit before the loop stops
+        while self.connections and loop.time() < deadline + 1:
+            await asyncio.sleep(0.05)
+
+    async def authenticate(self, headers, body):
+        """
+        Resolve the request's session token to the session's user (plus its
+        'token'). Raises a 401 if the token is missing, forged, expired or revoked.
+        """
+        scheme, _, token = (headers or {}).get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token.strip():
+            token = body.get('token')
+        token = token.strip() if isinstance(token, str) else None
+        if not token:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Log in first: session token required")
+        # The session store lookup is file I/O, so it runs off the event loop too
+        session = await self.db(validate_token, token)
+        if not session:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Session expired or invalid; log in again")
+        session['token'] = token
+        return session
+
+    async def dispatch(self, method, path, query, body, headers=None):
+        """Return (status, payload) for one request"""
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+
+            session = None if handler in self.public_routes else await self.authenticate(headers, body)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), API_CONFIG['queue_timeout'])
+            except asyncio.TimeoutError:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, retry shortly")
+            try:
+                return await handler(session, query, body, *match.groups())
+            finally:
+                self._slots.release()
+
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+
+    # Handlers: (session, query, body, *path groups) -> (status, payload).
+    # session is the caller's user dict, None on public routes.
+
+    async def login(self, session, query, body):
+        username, password = body.get('username'), body.get('password')
+        if not username or not password:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "username and password are required")
+        user = await self.db(verify_user, username, password)
+        if not user:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Invalid username or password")
+        user['token'] = await self.db(create_session, user)
+        return HTTPStatus.OK, user
+
+    async def resume_session(self, session, query, body):
+        return HTTPStatus.OK, {key: value for key, value in session.items() if key != 'token'}
+
+    async def logout(self, session, query, body):
+        await self.db(revoke_session, session['token'])
+        return HTTPStatus.OK, {'status': 'LOGGED_OUT'}
+
+    async def nearby_spaces(self, session, query, body):
+        center = (_number(query, 'lat'), _number(query, 'lon'))
+        radius_km = _number(query, 'radius_km', required=False, default=0.5)
+        if not (-90 <= center[0] <= 90 and -180 <= center[1] <= 180) or not 0 < radius_km <= 50:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "lat/lon out of range or radius_km not in (0, 50]")
+
+        spaces = await self.db(get_parking_spaces_in_bbox, *bounding_box(center, radius_km))
+        if spaces is None:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Could not load parking spaces")
+        if not spaces:
+            return HTTPStatus.OK, {'spaces': []}
+
+        # Exact distance check on the bounding-box candidates, nearest first
+        distances, mask = within_radius_batch(center, [s['latitude'] for s in spaces],
+                                              [s['longitude'] for s in spaces], radius_km)
+        nearby = []
+        for space, distance, inside in zip(spaces, distances, mask):
+            if inside:
+                space['distance_km'] = round(float(distance), 3)
+                space['available'] = space['capacity'] - space['occupied']
+                nearby.append(space)
+        nearby.sort(key=lambda space: space['distance_km'])
+        return HTTPStatus.OK, {'spaces': nearby}
+
+    async def space_detail(self, session, query, body, space_id):
+        space = await self.db(get_parking_space, int(space_id))
+        if space is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No such parking space")
+        space['available'] = space['capacity'] - space['occupied']
+        return HTTPStatus.OK, space
+
+    async def submit_request(self, session, query, body):
+        vehicle_number = str(body.get('vehicle_number') or '').strip()
+        if not vehicle_number:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "vehicle_number is required")
+        try:
+            request_id = await self.db(create_parking_request, session['id'],
+                                       _number(body, 'space_id', int), vehicle_number)
+        except SpaceFullError as e:
+            raise HTTPError(HTTPStatus.CONFLICT, str(e))
+        except SpaceNotFoundError as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(e))
+        if not request_id:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to create parking request")
+        return HTTPStatus.CREATED, {'id': request_id, 'status': 'PENDING'}
+
+    async def decide_request(self, session, query, body, request_id, action):
+        _require_provider(session, f"{action} requests")
+        status = 'ACCEPTED' if action == 'accept' else 'DENIED'
+        outcomes = await self.db(update_pending_requests, [int(request_id)], status,
+                                 provider_id=session['id'])
+        if outcomes is None:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to update request")
+        outcome = outcomes[int(request_id)]
+        if outcome == 'NOT_FOUND':
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No such request for this provider")
+        if outcome != 'UPDATED':
+            raise HTTPError(HTTPStatus.CONFLICT, f"Request is already {outcome}")
+        return HTTPStatus.OK, {'id': int(request_id), 'status': status}
+
+    async def park_or_unpark(self, session, query, body, request_id, action):
+        status, expected_status = ('ACTIVE', 'ACCEPTED') if action == 'park' else ('COMPLETED', 'ACTIVE')
+        # Scoped to the caller: their own booking, or a request on one of their spaces
+        scope = ({'provider_id': session['id']} if session['user_type'] == 'PROVIDER'
+                 else {'user_id': session['id']})
+        if not await self.db(update_request_status, int(request_id), status,
+                             expected_status=expected_status, **scope):
+            raise HTTPError(HTTPStatus.CONFLICT,
+                            f"Could not {action}: no such {expected_status} request of yours, or space full")
+        return HTTPStatus.OK, {'id': int(request_id), 'status': status}
+
+    async def bill_request(self, session, query, body, request_id):
+        _require_provider(session, "bill requests")
+        amount = _number(body, 'amount', required=False)
+        if amount is None:
+            try:
+                bill = await self.db(calculate_bill, int(request_id))
+            except TypeError:
+                bill = None  # request has no duration to bill by
+            if not bill:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "amount is required for this request")
+            amount = float(bill['amount'])
+        if not (math.isfinite(amount) and amount > 0):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "amount must be a positive number")
+        try:
+            billed = await self.db(generate_bill, int(request_id), amount, provider_id=session['id'])
+        except BillRejectedError as e:
+            raise HTTPError(HTTPStatus.CONFLICT, str(e))
+        if not billed:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No such request on your spaces")
+        return HTTPStatus.CREATED, {'request_id': int(request_id), 'amount': amount, 'status': 'PENDING'}
+
+    async def pending_bills(self, session, query, body, user_id):
+        if int(user_id) != session['id']:
+            raise HTTPError(HTTPStatus.FORBIDDEN, "You can only list your own bills")
+        return HTTPStatus.OK, {'bills': await self.db(get_pending_bills, int(user_id))}
+
+    async def pay_bill(self, session, query, body, bill_id):
+        payment_method = body.get('payment_method')
+        if payment_method not in PAYMENT_METHODS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"payment_method must be one of {', '.join(PAYMENT_METHODS)}")
+        try:
+            paid = await self.db(process_payment, int(bill_id), session['id'],
+                                 _number(body, 'amount'), payment_method)
+        except PaymentRejectedError as e:
+            raise HTTPError(HTTPStatus.CONFLICT, str(e))
+        if not paid:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Payment failed")
+        return HTTPStatus.OK, {'bill_id': int(bill_id), 'status': 'PAID'}
+
+
+async def _read_request(reader):
+    """Return (method, target, headers, body) or None at end of stream"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > API_CONFIG['max_body_bytes']:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+def _parse_body(raw_body):
+    """Decode a JSON object request body; an empty body is {}"""
+    if not raw_body:
+        return {}
+    try:
+        body = json.loads(raw_body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+    if not isinstance(body, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+    return body
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload, default=_json_default).encode()
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def handle_connection(api, reader, writer):
+    """Serve requests on one keep-alive connection until the client closes it or idles out"""
+    api.connections.add(writer)
+    try:
+        while not api.closing:
+            try:
+                request = await asyncio.wait_for(_read_request(reader), API_CONFIG['keepalive_timeout'])
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except HTTPError as e:
+                writer.write(_response(e.status, {'error': e.message}, False))
+                break
+            if request is None:
+                break
+
+            method, target, headers, raw_body = request
+            url = urlsplit(target)
+            api.in_flight += 1
+            try:
+                status, payload = await api.dispatch(method, url.path.rstrip('/') or '/',
+                                                     parse_qs(url.query), _parse_body(raw_body), headers)
+            except HTTPError as e:
+                status, payload = e.status, {'error': e.message}
+            except Exception as e:
+                print(f"API error on {method} {url.path}: {e}")
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal server error"}
+
+            try:
+                keep_alive = headers.get('connection', '').lower() != 'close' and not api.closing
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+            finally:
+                api.in_flight -= 1
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        api.connections.discard(writer)
+        writer.close()
+
+
+async def serve(host=None, port=None, sock=None, ready=None, stop=None):
+    """
+    Run the API until cancelled, or until the asyncio.Event stop is set. Then
+    in-flight requests get API_CONFIG['graceful_timeout'] seconds to finish.
+    Pass sock to serve on an already bound listening socket instead of
+    host/port. ready(server) is called once the server is accepting connections.
+    """
+    api = ParkingAPI()
+    handler = lambda reader, writer: handle_connection(api, reader, writer)
+    if sock is not None:
+        server = await asyncio.start_server(handler, sock=sock, backlog=API_CONFIG['backlog'])
+    else:
+        server = await asyncio.start_server(handler, host or API_CONFIG['host'], port or API_CONFIG['port'],
+                                            backlog=API_CONFIG['backlog'])
+    if ready:
+        ready(server)
+    try:
+        async with server:
+            if stop is None:
+                await server.serve_forever()
+            else:
+                await stop.wait()
+                await api.shutdown(server, API_CONFIG['graceful_timeout'])
+    finally:
+        api.close()
+
+
+def run_worker(sock, ready=None):
+    """Worker process entry point for api_workers: serve on sock until SIGTERM or SIGINT"""
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await serve(sock=sock, ready=ready and (lambda server: ready()), stop=stop)
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking system JSON HTTP API")
+    parser.add_argument('--host', default=API_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=API_CONFIG['port'])
+    args = parser.parse_args()
+
+    print(f"Parking API listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Multi-process mode for the JSON API: one supervisor and N worker processes.
+
+    python api_workers.py [--workers N] [--host HOST] [--port PORT] [--shared-socket]
+
+A single process can only use one core for Python code. The supervisor
+forks API_CONFIG['workers'] processes (0 means one per core). Each worker
+runs its own event loop, connection pool and space catalog. Workers share
+nothing except the database, and the catalog TTL keeps their caches in step.
+Each worker opens up to POOL_CONFIG['size'] connections, so size the
+database's connection limit for workers x size.
+
+By default every worker binds its own SO_REUSEPORT socket, and the kernel
+spreads new connections across them. With --shared-socket, or where
+SO_REUSEPORT is missing, the supervisor binds one socket before forking and
+the workers accept from it in turn.
+
+The supervisor never imports the application. Workers import api_server
+after the fork, so code changes take effect on a graceful restart.
+
+Signals to the supervisor:
+    SIGHUP           start a fresh set of workers, then retire the old ones
+                     once the new ones are listening
+    SIGTERM, SIGINT  stop accepting, let in-flight requests finish, exit
+
+Workers that die unexpectedly are replaced. Needs os.fork, so not Windows.
+"""
+import argparse
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from config import API_CONFIG
+
+WORKER_TARGET = 'api_server:run_worker'
+MIGRATE_TARGET = 'database:initialize_database'
+
+
+def _load(target):
+    module, _, function = target.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def bind_socket(host, port, reuse_port, backlog):
+    """Return a listening, non-blocking TCP socket"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class WorkerSupervisor:
+    """Pre-forks worker processes, replaces ones that die and restarts them on SIGHUP"""
+
+    def __init__(self, workers=None, host=None, port=None, reuse_port=None,
+                 graceful_timeout=None, target=WORKER_TARGET):
+        self.workers = workers or API_CONFIG['workers'] or os.cpu_count() or 1
+        self.host = host or API_CONFIG['host']
+        self.port = port or API_CONFIG['port']
+        if reuse_port is None:
+            reuse_port = API_CONFIG['reuse_port']
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.graceful_timeout = graceful_timeout or API_CONFIG['graceful_timeout']
+        self.target = target
+
+        self._shared_socket = None
+        self._workers = {}  # pid -> generation
+        self._generation = 0       # generation that replacements join
+        self._last_generation = 0
+        self._stopping = False
+        self._restart = False
+
+    def _fork(self, run):
+        """Run run(ready) in a child process; returns (pid, fd that becomes readable once it is ready)"""
+        ready_read, ready_write = os.pipe()
+        sys.stdout.flush()  # or the child repeats whatever is still buffered
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+
+            def ready():
+                try:
+                    os.write(ready_write, b'1')
+                except BrokenPipeError:
+                    pass  # replacement workers: nobody is waiting
+                os.close(ready_write)
+
+            code = 0
+            try:
+                if run(ready) is False:
+                    code = 1
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+        os.close(ready_write)
+        return pid, ready_read
+
+    def _spawn_worker(self, generation):
+        sock = self._shared_socket
+        if sock is None:
+            sock = bind_socket(self.host, self.port, True, API_CONFIG['backlog'])
+        pid, ready_fd = self._fork(lambda ready: _load(self.target)(sock, ready))
+        if self._shared_socket is None:
+            sock.close()  # the worker holds its own copy
+        self._workers[pid] = generation
+        return pid, ready_fd
+
+    def _spawn_generation(self):
+        """Start a full set of workers; returns (generation, whether all of them are listening)"""
+        self._last_generation += 1
+        ready_fds = [self._spawn_worker(self._last_generation)[1] for _ in range(self.workers)]
+        deadline = time.monotonic() + self.graceful_timeout
+        pending = list(ready_fds)
+        while pending and time.monotonic() < deadline:
+            try:
+                readable, _, _ = select.select(pending, [], [], 0.5)
+            except InterruptedError:
+                continue
+            for fd in readable:
+                pending.remove(fd)
+        for fd in ready_fds:
+            os.close(fd)
+        return self._last_generation, not pending
+
+    def _signal_workers(self, signum, generations=None):
+        """Send signum to every worker, or to those whose generation passes generations(generation)"""
+        for pid, generation in list(self._workers.items()):
+            if generations is None or generations(generation):
+                try:
+                    os.kill(pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self, replace=True):
+        """Collect exited workers and replace current-generation ones that died"""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._workers.clear()
+                return
+            if pid == 0:
+                return
+            generation = self._workers.pop(pid, None)
+            if replace and generation == self._generation:
+                print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; replacing it")
+                time.sleep(0.5)  # don't spin if workers die on startup
+                os.close(self._spawn_worker(self._generation)[1])
+
+    def _migrate(self):
+        """Apply pending schema migrations once, in a child, before any worker starts"""
+        pid, ready_fd = self._fork(lambda ready: _load(MIGRATE_TARGET)())
+        os.close(ready_fd)
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status) == 0
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_restart(self, signum, frame):
+        self._restart = True
+
+    def run(self):
+        if not self._migrate():
+            print("Database initialization failed; not starting workers")
+            return False
+
+        if not self.reuse_port:
+            self._shared_socket = bind_socket(self.host, self.port, False, API_CONFIG['backlog'])
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        self._generation, _ = self._spawn_generation()
+        print(f"Parking API listening on http://{self.host}:{self.port} with {self.workers} workers "
+              f"({'SO_REUSEPORT' if self.reuse_port else 'shared socket'})")
+
+        while not self._stopping:
+            if self._restart:
+                self._restart = False
+                print("Graceful restart: starting new workers")
+                generation, ready = self._spawn_generation()
+                if ready:
+                    self._generation = generation
+                    self._signal_workers(signal.SIGTERM, lambda g: g != generation)
+                else:
+                    print("New workers did not become ready; keeping the old ones")
+                    self._signal_workers(signal.SIGTERM, lambda g: g == generation)
+            self._reap()
+            time.sleep(0.2)
+
+        # Workers finish their in-flight requests within graceful_timeout
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 1
+        while self._workers and time.monotonic() < deadline:
+            self._reap(replace=False)
+            time.sleep(0.1)
+        self._signal_workers(signal.SIGKILL)
+        self._reap(replace=False)
+        if self._shared_socket is not None:
+            self._shared_socket.close()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the parking JSON API with multiple worker processes")
+    parser.add_argument('--host', default=API_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=API_CONFIG['port'])
+    parser.add_argument('--workers', type=int, default=API_CONFIG['workers'],
+                        help="worker processes (0: one per CPU core)")
+    parser.add_argument('--shared-socket', action='store_true',
+                        help="accept from one socket bound before forking instead of SO_REUSEPORT")
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        sys.exit("Multi-process mode needs os.fork; run api_server.py instead")
+
+    supervisor = WorkerSupervisor(args.workers, args.host, args.port,
+                                  reuse_port=False if args.shared_socket else None)
+    sys.exit(0 if supervisor.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import itertools
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+
+class BackgroundExecutor:
+    """
+    Run blocking work (database queries, geocoding) on a thread pool and
+    deliver the results back on the Tk thread. Tasks submitted under the same
+    key supersede each other: only the latest one's callback ever runs.
+    """
+
+    def __init__(self, widget, max_workers=4, poll_ms=30, on_busy_change=None):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.on_busy_change = on_busy_change
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parking-worker")
+        self._results = queue.Queue()
+        self._generations = {}
+        self._futures = {}
+        self._anonymous = itertools.count()
+        self._pending = 0
+        self._polling = False
+        self._closed = False
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def submit(self, key, func, *args, on_success=None, on_error=None, **kwargs):
+        """
+        Run func(*args, **kwargs) on a worker thread. on_success(result) or
+        on_error(exception) is then called on the Tk thread, unless a newer
+        task was submitted under the same key in the meantime. Pass key=None
+        for work that should never be superseded.
+        """
+        if self._closed:
+            return
+        if key is None:
+            key = ('anonymous', next(self._anonymous))
+
+        self.cancel(key)
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+
+        self._set_pending(self._pending + 1)
+        self._futures[key] = self._executor.submit(
+            self._run, key, generation, func, args, kwargs, on_success, on_error
+        )
+        self._schedule_poll()
+
+    def cancel(self, key):
+        """Drop the task running under key; its callbacks will not fire"""
+        if key not in self._generations:
+            return
+        self._generations[key] += 1
+        future = self._futures.pop(key, None)
+        if future is not None and future.cancel():
+            # Never started, so it will never report back through the queue
+            self._set_pending(self._pending - 1)
+
+    def shutdown(self):
+        """Stop accepting work and drop everything still queued"""
+        self._closed = True
+        self._generations.clear()
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key, generation, func, args, kwargs, on_success, on_error):
+        try:
+            result = func(*args, **kwargs)
+            self._results.put((key, generation, on_success, result, None))
+        except Exception as e:
+            self._results.put((key, generation, on_error, None, e))
+
+    def _schedule_poll(self):
+        if self._polling or self._closed:
+            return
+        try:
+            self.widget.after(self.poll_ms, self._poll)
+            self._polling = True
+        except tk.TclError:
+            # The widget is gone, so there is nobody left to deliver results to
+            self.shutdown()
+
+    def _poll(self):
+        self._polling = False
+        while True:
+            try:
+                key, generation, callback, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            self._set_pending(self._pending - 1)
+            if self._closed or self._generations.get(key) != generation:
+                continue  # superseded or cancelled
+            self._futures.pop(key, None)
+            if isinstance(key, tuple) and key[0] == 'anonymous':
+                del self._generations[key]
+
+            if error is not None:
+                if callback is not None:
+                    callback(error)
+                else:
+                    messagebox.showerror("Error", str(error))
+            elif callback is not None:
+                callback(result)
+
+        if self._pending:
+            self._schedule_poll()
+
+    def _set_pending(self, pending):
+        was_busy = self.busy
+        self._pending = pending
+        if self.on_busy_change is not None and was_busy != self.busy:
+            self.on_busy_change(self.busy)
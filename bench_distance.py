@@ -0,0 +1,64 @@
+"""
+Microbenchmark: per-row haversine (the old is_within_radius path) against the
+vectorized batch engine in spatial_index.
+
+    python bench_distance.py [--sizes 1000 100000 1000000] [--radius 0.5]
+"""
+import argparse
+import random
+import time
+
+from spatial_index import haversine_km, within_radius_batch
+
+# Search centre and spread roughly matching a city (Pune)
+CENTER = (18.5204, 73.8567)
+SPREAD_DEG = 0.2
+
+
+def make_points(count, seed=42):
+    rng = random.Random(seed)
+    latitudes = [CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG) for _ in range(count)]
+    longitudes = [CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG) for _ in range(count)]
+    return latitudes, longitudes
+
+
+def per_row(latitudes, longitudes, radius_km):
+    return [haversine_km(CENTER, (lat, lon)) <= radius_km for lat, lon in zip(latitudes, longitudes)]
+
+
+def batch(latitudes, longitudes, radius_km):
+    return within_radius_batch(CENTER, latitudes, longitudes, radius_km)[1]
+
+
+def best_of(func, repeat, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--radius', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'spaces':>10} {'per-row (ms)':>14} {'batch (ms)':>12} {'speedup':>9} {'matches':>9}")
+    for size in args.sizes:
+        latitudes, longitudes = make_points(size)
+        row_time, row_result = best_of(per_row, args.repeat, latitudes, longitudes, args.radius)
+        batch_time, batch_result = best_of(batch, args.repeat, latitudes, longitudes, args.radius)
+
+        if list(batch_result) != row_result:
+            raise SystemExit(f"Mismatch between per-row and batch results at {size} spaces")
+
+        print(f"{size:>10} {row_time * 1000:>14.2f} {batch_time * 1000:>12.2f} "
+              f"{row_time / batch_time:>8.1f}x {int(batch_result.sum()):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Login throughput at several bcrypt cost factors and hashing pool sizes.
+
+    python bench_login.py [--costs 8 10 12] [--workers 0 2 4] [--logins 64] [--concurrency 8]
+
+Each run registers users in a throwaway SQLite database and then sends
+--logins verify_user calls from --concurrency threads. Workers 0 hashes on
+the calling threads, the old behaviour, for comparison.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import passwords
+from config import PASSWORD_CONFIG
+from storage import SQLiteBackend
+
+
+def run(cost, workers, logins, concurrency, directory):
+    PASSWORD_CONFIG['bcrypt_rounds'] = cost
+    PASSWORD_CONFIG['hash_workers'] = workers
+    passwords.shutdown_pool()
+
+    database.use_backend(SQLiteBackend(os.path.join(directory, f"login-{cost}-{workers}.sqlite3")))
+    database.initialize_database()
+    usernames = [f"bench{i}" for i in range(concurrency)]
+    for username in usernames:
+        database.register_user(username, 'secret', username)
+    # Start the hashing threads outside the timed section
+    passwords.verify_password('secret', passwords.hash_password('secret'))
+
+    def login(i):
+        started = time.perf_counter()
+        if not database.verify_user(usernames[i % len(usernames)], 'secret'):
+            raise RuntimeError("login failed")
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return logins / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--costs', type=int, nargs='+', default=[8, 10, 12])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count() or 1])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins from {args.concurrency} threads, {os.cpu_count()} cores\n")
+    print(f"{'cost':>4} {'workers':>8} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for cost in args.costs:
+            for workers in args.workers:
+                throughput, p50, p95 = run(cost, workers, args.logins, args.concurrency, directory)
+                print(f"{cost:>4} {workers:>8} {throughput:>10.1f} {p50:>9.1f} {p95:>9.1f}")
+        passwords.shutdown_pool()
+        database.use_backend(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Cold-start benchmark for the login screen's import path, using -X importtime.
+
+    python bench_startup.py [--runs 5] [--top 15]
+
+Imports main in fresh interpreters, reports the median cumulative import time,
+the slowest modules, and fails if any map or geocoding module is loaded
+before login.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that belong to the dashboards and must not load with the login screen
+DEFERRED_MODULES = ('tkintermapview', 'geopy', 'numpy', 'PIL', 'user_dashboard', 'provider_dashboard', 'map_view')
+
+
+def import_profile(module):
+    """Run `import module` in a fresh interpreter and parse its -X importtime output"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    profile = {}
+    for _ in range(args.runs):
+        profile = import_profile(args.module)
+        totals.append(profile[args.module][1] / 1000)
+
+    print(f"import {args.module}: median {statistics.median(totals):.1f} ms, "
+          f"min {min(totals):.1f} ms over {args.runs} runs")
+
+    print("\nSlowest modules (self time, last run):")
+    slowest = sorted(profile.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {self_us / 1000:>8.1f} ms  {cumulative_us / 1000:>8.1f} ms cumulative  {name}")
+
+    leaked = sorted(name for name in profile if name.split('.')[0] in DEFERRED_MODULES)
+    if leaked:
+        raise SystemExit(f"\nLoaded before login: {', '.join(leaked)}")
+    print("\nNo map or geocoding modules loaded before login")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,83 @@ DB_CONFIG = {
     'password': 'nishi',
     'database': 'parking_near'
 }
+
+POOL_CONFIG = {
+    'size': 5,                  # maximum open connections
+    'checkout_timeout': 10,     # seconds to wait for a free connection
+    'max_idle_seconds': 300,    # idle connections older than this are closed
+    'health_check_after': 30    # ping connections idle longer than this on checkout
+}
+
+GEOCODE_CACHE_CONFIG = {
+    'path': 'geocode_cache.sqlite3',
+    'ttl_seconds': 30 * 24 * 3600,  # re-resolve addresses after 30 days
+    'negative_ttl_seconds': 3600,   # retry lookups that found nothing after an hour
+    'max_entries': 10000,           # least recently used entries beyond this are evicted
+    'coordinate_precision': 5,      # decimals kept for reverse lookup keys (~1 m)
+    'touch_batch': 100              # entries hit before their last_used times are written together
+}
+
+GEOCODER_CONFIG = {
+    'min_interval_seconds': 1.0     # Nominatim usage policy: at most one request per second
+}
+
+NOTIFY_CONFIG = {
+    'host': '127.0.0.1',            # point every client at one broker when they run on several machines
+    'port': 8765,
+    'connect_timeout': 2,
+    'embedded_broker': 'auto',      # first client to find no broker runs one; 'auto': only if the database is local
+    'publish_queue': 10000,         # events waiting to be sent before new ones are dropped
+    'subscriber_queue': 1000        # events queued per subscriber before the broker disconnects it
+}
+
+SPACE_CATALOG_CONFIG = {
+    'ttl_seconds': 60               # per-space reload interval; bounds staleness from other processes
+}
+
+QUERY_STATS_CONFIG = {
+    'enabled': True,                # time every statement run through the connection pool
+    'slow_query_ms': 200,           # statements at least this slow go to the slow-query log
+    'slow_query_log': 'slow_queries.log',  # None logs through the root logger instead
+    'dump_at_exit': False           # print the statistics table when the process exits
+}
+
+SPACE_IMPORT_CONFIG = {
+    'chunk_size': 500,              # rows inserted per transaction
+    'geocode_workers': 4            # concurrent geocoding lookups (cache hits skip the rate limit)
+}
+
+API_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8080,
+    'max_concurrency': 64,          # requests handled at once; the rest wait in line
+    'queue_timeout': 5,             # seconds a request may wait for a slot before a 503
+    'max_body_bytes': 64 * 1024,
+    'keepalive_timeout': 15,        # idle seconds before a keep-alive connection is closed
+    'backlog': 128,
+    'workers': 0,                   # api_workers.py processes, 0 for one per CPU core; each has its own pool
+    'reuse_port': True,             # one SO_REUSEPORT socket per worker instead of a shared one
+    'graceful_timeout': 30          # seconds in-flight requests get to finish on shutdown or restart
+}
+
+PASSWORD_CONFIG = {
+    'bcrypt_rounds': 12,            # cost factor for new hashes; older hashes are upgraded at login
+    'hash_workers': 2,              # threads that run bcrypt (the most cores it uses), 0 to hash on the calling thread
+    'max_pending': 64               # hashes queued at once before callers wait
+}
+
+SESSION_CONFIG = {
+    'store': 'sqlite',              # 'sqlite' is shared by all processes and survives restarts; or 'memory'
+    'path': 'sessions.sqlite3',
+    'ttl_seconds': 7 * 24 * 3600,
+    'max_sessions': 10000,          # oldest sessions are evicted beyond this
+    'secret_file': 'session.key',   # token signing key, generated on first use
+    'token_file': 'session.token'   # desktop app's remembered login; None to always ask for a password
+}
+
+# Storage engine behind database.py: 'mysql', or 'sqlite' to run without a server
+DB_BACKEND = 'mysql'
+
+SQLITE_CONFIG = {
+    'path': 'parking.sqlite3'
+}
@@ -1,55 +1,556 @@
-import mysql.connector
-from mysql.connector import Error
+import math
+import threading
+import time
+from contextlib import contextmanager
+
 from datetime import datetime, timedelta
-import bcrypt
+
+from config import POOL_CONFIG, SPACE_CATALOG_CONFIG
+from notifications import provider_topic, publish, user_topic
+from passwords import hash_password, needs_rehash, verify_password
+from query_stats import InstrumentedCursor, caller_tag, get_query_stats
+from space_catalog import SpaceCatalog
+from spatial_index import bbox_where_clause
+from storage import Error, create_backend
+
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool; close() returns it to the pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        stats = get_query_stats()
+        return InstrumentedCursor(cursor, stats) if stats else cursor
+
+    def is_connected(self):
+        # Checked-out connections count as live; the pool pings them on checkout
+        return not self._released
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._released and exc_type is not None:
+            self._released = True
+            self._pool.release(self._raw, suspect=True)
+        self.close()
+        return False
+
+    def __del__(self):
+        # Dropped without close(), e.g. a caller raised first: hand the
+        # connection back so its slot is not lost for good. The garbage
+        # collector may run this while a pool lock is held, so it only queues
+        # the connection; the next acquire() returns it to the pool.
+        if not self.__dict__.get('_released', True):
+            self._released = True
+            self._pool._abandoned.append(self._raw)
+
+
+class ConnectionPool:
+    """Bounded pool of reusable database connections"""
+
+    def __init__(self, connect, size=5, checkout_timeout=10, max_idle_seconds=300, health_check_after=30):
+        self._connect = connect
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_after = health_check_after
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, released_at) pairs, most recently used last
+        self._abandoned = []  # connections garbage-collected without close(); list.append is atomic
+        self._stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'connections_reclaimed': 0,
+            'idle_evictions': 0,
+            'health_check_failures': 0,
+            'checkout_timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+
+    def acquire(self):
+        """Check out a connection, waiting up to checkout_timeout for a free slot"""
+        self._reclaim_abandoned()
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._stats['checkout_timeouts'] += 1
+            raise Exception(f"Error connecting to database: no free connection after {self.checkout_timeout}s")
+        waited = time.perf_counter() - started
+
+        try:
+            raw = self._take_idle()
+            if raw is None:
+                raw = self._connect()
+                with self._lock:
+                    self._stats['connections_opened'] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+        return PooledConnection(self, raw)
+
+    def release(self, raw, suspect=False):
+        """Return a connection to the idle list, discarding it if it is unusable"""
+        try:
+            if suspect and not self._is_healthy(raw):
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                self._discard(raw)
+                return
+            if getattr(raw, 'in_transaction', False):
+                raw.rollback()
+            with self._lock:
+                self._idle.append((raw, time.monotonic()))
+        except Exception:
+            self._discard(raw)
+        finally:
+            self._slots.release()
+        self.evict_idle()
+
+    def _reclaim_abandoned(self):
+        """Release connections whose PooledConnection was garbage-collected unreleased"""
+        while self._abandoned:
+            try:
+                raw = self._abandoned.pop()
+            except IndexError:
+                return
+            with self._lock:
+                self._stats['connections_reclaimed'] += 1
+            self.release(raw, suspect=True)
+
+    def evict_idle(self):
+        """Close connections that have been idle longer than max_idle_seconds"""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        with self._lock:
+            stale = [raw for raw, released_at in self._idle if released_at < cutoff]
+            self._idle = [(raw, released_at) for raw, released_at in self._idle if released_at >= cutoff]
+            self._stats['idle_evictions'] += len(stale)
+        for raw in stale:
+            self._discard(raw)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+    def _take_idle(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                raw, released_at = self._idle.pop()
+
+            idle_for = now - released_at
+            if idle_for > self.max_idle_seconds:
+                with self._lock:
+                    self._stats['idle_evictions'] += 1
+                self._discard(raw)
+                continue
+
+            if idle_for > self.health_check_after and not self._is_healthy(raw):
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                self._discard(raw)
+                continue
+
+            return raw
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the storage backend, built from config.DB_BACKEND on first use"""
+    global _backend
+    if _backend is None:
+        with _pool_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def use_backend(backend):
+    """Switch every data-access function to another storage backend"""
+    global _backend, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _backend = backend
+        _pool = None
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        backend = get_backend()
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(backend.connect, **POOL_CONFIG)
+    return _pool
+
+
+def get_pool_stats():
+    """Return checkout and wait-time counters for the shared pool"""
+    return get_pool().stats()
 
 
 def create_db_connection():
-    """Create a connection to the database"""
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='nishi',
-            database='parking_near'
+    """Check out a connection from the pool; close() hands it back"""
+    stats = get_query_stats()
+    if stats is None:
+        return get_pool().acquire()
+
+    started = time.perf_counter()
+    conn = get_pool().acquire()
+    stats.record_acquire(caller_tag(), (time.perf_counter() - started) * 1000)
+    return conn
+
+
+@contextmanager
+def get_connection():
+    """Context manager that checks out a pooled connection and always returns it"""
+    with create_db_connection() as conn:
+        yield conn
+
+
+def ensure_index(cursor, table, index_name, columns):
+    """Create an index unless the table already has one with this name"""
+    get_backend().ensure_index(cursor, table, index_name, columns)
+
+
+def create_schema(cursor):
+    """Issue the CREATE TABLE statements for every table"""
+    get_backend().create_schema(cursor)
+
+
+# Composite indexes, each matched to the queries that filter on its columns
+HOT_QUERY_INDEXES = [
+    # Occupancy backfill and per-space request lookups: space_id = ? AND status IN (...)
+    ('parking_requests', 'idx_parking_requests_space_status', ('space_id', 'status')),
+    # check_current_booking / load_bookings: user_id = ? AND status IN (...)
+    ('parking_requests', 'idx_parking_requests_user_status', ('user_id', 'status')),
+    # get_pending_bills / mark_bill_as_paid: user_id = ? AND status = 'PENDING'
+    ('bills', 'idx_bills_user_status', ('user_id', 'status')),
+    # get_provider_requests and provider map tiles: provider_id = ? [AND latitude BETWEEN ...]
+    ('parking_spaces', 'idx_parking_spaces_provider_location', ('provider_id', 'latitude', 'longitude')),
+    # Radius searches and map tiles: latitude BETWEEN ... AND longitude BETWEEN ...
+    ('parking_spaces', 'idx_parking_spaces_location', ('latitude', 'longitude')),
+    # get_provider_requests_page, providers with few requests: per space, newest first
+    ('parking_requests', 'idx_parking_requests_space_time', ('space_id', 'request_time', 'id')),
+    # get_provider_requests_page, busy providers: walk all requests newest first,
+    # stopping once a page of this provider's rows is found
+    ('parking_requests', 'idx_parking_requests_time', ('request_time', 'id'))
+]
+
+
+def add_hot_query_indexes(cursor):
+    for table, index_name, columns in HOT_QUERY_INDEXES:
+        ensure_index(cursor, table, index_name, columns)
+
+
+# Every status a parking request moves through, and the ones that hold a slot
+REQUEST_STATUSES = ('PENDING', 'ACCEPTED', 'DENIED', 'ACTIVE', 'COMPLETED')
+OCCUPYING_STATUSES = ('PENDING', 'ACCEPTED', 'ACTIVE')
+
+
+def add_occupancy_counter(cursor):
+    """
+    Allow the ACTIVE/COMPLETED lifecycle statuses and add parking_spaces.occupied,
+    backfilled from the requests that currently hold a slot
+    """
+    backend = get_backend()
+    backend.set_request_statuses(cursor, REQUEST_STATUSES)
+    backend.ensure_column(cursor, 'parking_spaces', 'occupied', 'INT NOT NULL DEFAULT 0')
+    # Rebuilding parking_requests (SQLite) drops its indexes; this is a no-op elsewhere
+    add_hot_query_indexes(cursor)
+
+    placeholders = ', '.join(['%s'] * len(OCCUPYING_STATUSES))
+    cursor.execute(f"""
+        UPDATE parking_spaces SET occupied = (
+            SELECT COUNT(*) FROM parking_requests
+            WHERE space_id = parking_spaces.id AND status IN ({placeholders})
         )
-        return connection
+    """, OCCUPYING_STATUSES)
+
+
+# Indexes behind get_changes_since: only rows newer than the caller's version are read
+CHANGE_TRACKING_INDEXES = [
+    ('parking_requests', 'idx_parking_requests_version', ('version',)),
+    ('parking_requests', 'idx_parking_requests_user_version', ('user_id', 'version')),
+    ('bills', 'idx_bills_user_version', ('user_id', 'version')),
+    ('bills', 'idx_bills_version', ('version',))
+]
+
+
+def add_change_tracking(cursor):
+    """
+    Add a version column to parking_requests and bills and the single-row
+    change_version counter that every write to those tables advances
+    """
+    backend = get_backend()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("SELECT COUNT(*) FROM change_version WHERE id = 1")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("INSERT INTO change_version (id, version) VALUES (1, 0)")
+
+    for table in ('parking_requests', 'bills'):
+        backend.ensure_column(cursor, table, 'version', 'BIGINT NOT NULL DEFAULT 0')
+    for table, index_name, columns in CHANGE_TRACKING_INDEXES:
+        ensure_index(cursor, table, index_name, columns)
+
+
+def add_change_log(cursor):
+    """
+    Replace the single-row change_version counter, whose row lock serialized
+    every write, with change_log: one auto-increment id per write transaction.
+    The log continues from the counter, so versions already on rows stay valid.
+    """
+    get_backend().create_change_log_table(cursor)
+    cursor.execute("SELECT 1 FROM change_log LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT version FROM change_version WHERE id = 1")
+        row = cursor.fetchone()
+        if row and row[0]:
+            cursor.execute("INSERT INTO change_log (id, created_at) VALUES (%s, 0)", (row[0],))
+    cursor.execute("DROP TABLE IF EXISTS change_version")
+
+
+# Ordered schema migrations: (version, description, function taking a cursor).
+# Every step must be safe to re-run against a database that already has it.
+MIGRATIONS = [
+    (1, 'create tables', create_schema),
+    (2, 'composite indexes for hot queries', add_hot_query_indexes),
+    (3, 'request lifecycle statuses and occupancy counter', add_occupancy_counter),
+    (4, 'keyset pagination indexes for provider requests', add_hot_query_indexes),
+    (5, 'change tracking versions', add_change_tracking),
+    (6, 'change log instead of a global version counter', add_change_log)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(cursor):
+    """Return the applied schema version, or 0 if the database was never migrated"""
+    try:
+        cursor.execute("SELECT version FROM schema_version WHERE id = 1")
     except Error as e:
-        raise Exception(f"Error connecting to database: {e}")
+        if not get_backend().is_missing_table(e):
+            raise
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def run_migrations():
+    """
+    Apply every pending migration in order and return (old_version, new_version).
+    An up-to-date database costs one indexed SELECT: no DDL, no metadata locks.
+    """
+    conn = create_db_connection()
+    cursor = conn.cursor()
+    try:
+        current = get_schema_version(cursor)
+        if current >= SCHEMA_VERSION:
+            return current, current
+
+        backend = get_backend()
+        if current == 0:
+            backend.create_schema_version_table(cursor)
+
+        version = current
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"Applying schema migration {version}: {description}")
+            migrate(cursor)
+            backend.set_schema_version(cursor, version)
+            conn.commit()
+        return current, version
+    finally:
+        cursor.close()
+        conn.close()
 
 
-def initialize_database():
+# SQL of the hot queries. The functions below run these exact statements and
+# check_hot_query_indexes EXPLAINs them, so the index check cannot drift from
+# what actually runs. {where} and {keyset} are filled in by the callers.
+
+# Spaces with their provider's name: the catalog, lists and map viewports
+PARKING_SPACES_SQL = """
+    SELECT ps.*, u.full_name as provider_name
+    FROM parking_spaces ps
+    JOIN users u ON ps.provider_id = u.id
+"""
+
+# Location search (map_utils.search_parking_spaces); {where} from spatial_index.bbox_where_clause
+SEARCH_PARKING_SPACES_SQL = """
+    SELECT id, address, latitude, longitude, capacity, rate_per_hour, occupied
+    FROM parking_spaces
+    WHERE {where}
+"""
+
+PROVIDER_REQUESTS_SQL = """
+    SELECT 
+        pr.id,
+        u.full_name as user_name,
+        pr.vehicle_number,
+        pr.duration_hours,
+        pr.status,
+        pr.request_time,
+        ps.address as space_address,
+        ps.rate_per_hour
+    FROM parking_requests pr
+    JOIN users u ON pr.user_id = u.id
+    JOIN parking_spaces ps ON pr.space_id = ps.id
+    WHERE ps.provider_id = %s
+"""
+
+# {keyset} is empty for the first page, PROVIDER_REQUESTS_KEYSET after that
+PROVIDER_REQUESTS_PAGE_SQL = PROVIDER_REQUESTS_SQL + """
+    {keyset}
+    ORDER BY pr.request_time DESC, pr.id DESC
+    LIMIT %s
+"""
+PROVIDER_REQUESTS_KEYSET = "AND (pr.request_time < %s OR (pr.request_time = %s AND pr.id < %s))"
+
+# The user dashboard's latest open booking
+CURRENT_BOOKING_SQL = """
+    SELECT 
+        parking_requests.id,
+        vehicle_number,
+        parking_requests.status,
+        address,
+        rate_per_hour
+    FROM parking_requests
+    JOIN parking_spaces ON space_id = parking_spaces.id
+    WHERE user_id = %s 
+    AND parking_requests.status IN ('PENDING', 'ACCEPTED', 'ACTIVE')
+    ORDER BY request_time DESC
+    LIMIT 1
+"""
+
+PENDING_BILLS_SQL = """
+    SELECT b.*, ps.address, ps.rate_per_hour 
+    FROM bills b
+    JOIN parking_spaces ps ON b.space_id = ps.id
+    WHERE b.user_id = %s AND b.status = 'PENDING'
+"""
+
+_SAMPLE_BBOX = (18.51, 18.53, 73.84, 73.87)
+_SAMPLE_TIME = '2030-01-01 00:00:00'
+
+
+def _hot_queries():
+    """
+    name -> (sql, sample parameters, tables whose access must go through an
+    index), built from the statements above the way their callers build them
+    """
+    bbox_where, bbox_params = bbox_where_clause(_SAMPLE_BBOX, 'ps.latitude', 'ps.longitude')
+    search_where, search_params = bbox_where_clause(_SAMPLE_BBOX)
+    return {
+        'get_parking_spaces_in_bbox': (PARKING_SPACES_SQL + f" WHERE {bbox_where}", bbox_params, ('ps',)),
+        'search_parking_spaces': (SEARCH_PARKING_SPACES_SQL.format(where=search_where), search_params,
+                                  ('parking_spaces',)),
+        'get_provider_requests': (PROVIDER_REQUESTS_SQL + " ORDER BY pr.request_time DESC", (1,), ('ps', 'pr')),
+        'get_provider_requests_page': (PROVIDER_REQUESTS_PAGE_SQL.format(keyset=PROVIDER_REQUESTS_KEYSET),
+                                       (1, _SAMPLE_TIME, _SAMPLE_TIME, 1000, 51), ('ps', 'pr')),
+        'check_current_booking': (CURRENT_BOOKING_SQL, (1,), ('parking_requests',)),
+        'get_pending_bills': (PENDING_BILLS_SQL, (1,), ('b',))
+    }
+
+
+HOT_QUERIES = _hot_queries()
+
+
+def check_hot_query_indexes():
+    """
+    EXPLAIN every hot query and assert each listed table is read through an
+    index. Run against a database with realistic row counts: on near-empty
+    tables the planner may prefer a full scan regardless of the indexes.
+    """
+    backend = get_backend()
+    conn = create_db_connection()
+    cursor = conn.cursor()
+    failures = []
     try:
-        conn = create_db_connection()
-        cursor = conn.cursor()
+        for name, (sql, params, tables) in HOT_QUERIES.items():
+            for table, detail in backend.unindexed_tables(cursor, sql, params, tables):
+                failures.append(f"{name}: full scan of {table} ({detail})")
+    finally:
+        cursor.close()
+        conn.close()
 
-        # Add this bills table creation along with your other table creations
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bills (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                request_id INT,
-                user_id INT,
-                space_id INT,
-                amount DECIMAL(10,2),
-                due_date DATETIME,
-                status VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (request_id) REFERENCES parking_requests(id),
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (space_id) REFERENCES parking_spaces(id)
-            )
-        """)
+    assert not failures, "Hot queries not using an index:\n" + "\n".join(failures)
+    return True
 
-        conn.commit()
+
+def initialize_database():
+    try:
+        old_version, new_version = run_migrations()
+        if new_version != old_version:
+            print(f"Database schema upgraded from version {old_version} to {new_version}")
         return True
 
     except Error as e:
         print(f"Error creating database tables: {e}")
         return False
-    finally:
-        if 'conn' in locals() and conn.is_connected():
-            cursor.close()
-            conn.close()
 
 
 def create_tables():
@@ -58,83 +559,7 @@ def create_tables():
         conn = create_db_connection()
         cursor = conn.cursor()
 
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                full_name VARCHAR(100),
-                user_type ENUM('USER', 'PROVIDER', 'ADMIN') NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Parking Spaces table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS parking_spaces (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                provider_id INT NOT NULL,
-                address VARCHAR(255) NOT NULL,
-                latitude DECIMAL(10, 8) NOT NULL,
-                longitude DECIMAL(11, 8) NOT NULL,
-                capacity INT NOT NULL,
-                rate_per_hour DECIMAL(10, 2) NOT NULL,
-                description TEXT,
-                status ENUM('ACTIVE', 'INACTIVE') DEFAULT 'ACTIVE',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (provider_id) REFERENCES users(id)
-            )
-        """)
-
-        # Parking Requests table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS parking_requests (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                space_id INT NOT NULL,
-                request_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                status ENUM('PENDING', 'ACCEPTED', 'DENIED') NOT NULL,
-                notification_shown BOOLEAN DEFAULT FALSE,
-                duration_hours FLOAT,
-                vehicle_number VARCHAR(20),
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (space_id) REFERENCES parking_spaces(id)
-            )
-        """)
-
-        # Bills table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bills (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                request_id INT,
-                user_id INT,
-                space_id INT,
-                amount DECIMAL(10,2),
-                due_date DATETIME,
-                status VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (request_id) REFERENCES parking_requests(id),
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (space_id) REFERENCES parking_spaces(id)
-            )
-        """)
-
-        # Payments table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                bill_id INT NOT NULL,
-                user_id INT NOT NULL,
-                amount DECIMAL(10, 2) NOT NULL,
-                payment_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                payment_method ENUM('CREDIT_CARD', 'DEBIT_CARD', 'UPI', 'NET_BANKING') NOT NULL,
-                transaction_id VARCHAR(100) UNIQUE,
-                status ENUM('SUCCESS', 'FAILED', 'PENDING') DEFAULT 'PENDING',
-                FOREIGN KEY (bill_id) REFERENCES bills(id),
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
+        create_schema(cursor)
 
         conn.commit()
         print("Tables created successfully!")
@@ -147,24 +572,6 @@ def create_tables():
             conn.close()
 
 
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-
-def verify_password(password, hashed):
-    """Verify a password against its hash"""
-    try:
-        return bcrypt.checkpw(
-            password.encode('utf-8'),
-            hashed.encode('utf-8')
-        )
-    except ValueError:
-        return False
-
-
 def register_user(username, password, full_name, user_type='USER'):
     """Register a new user"""
     try:
@@ -191,6 +598,18 @@ def register_user(username, password, full_name, user_type='USER'):
             conn.close()
 
 
+def _rehash_password(cursor, conn, user, password):
+    """Store the password at the current bcrypt cost; a failure here must not fail the login"""
+    try:
+        # Only replace the hash that was just verified, in case the password changed meanwhile
+        cursor.execute("""
+            UPDATE users SET password = %s WHERE id = %s AND password = %s
+        """, (hash_password(password), user['id'], user['password']))
+        conn.commit()
+    except Error as e:
+        print(f"Error upgrading password hash: {e}")
+
+
 def verify_user(username, password):
     """Verify user credentials and return user data if valid"""
     try:
@@ -198,12 +617,14 @@ def verify_user(username, password):
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
-            SELECT * FROM users WHERE username = %s
+            SELECT id, username, password, user_type, full_name FROM users WHERE username = %s
         """, (username,))
 
         user = cursor.fetchone()
 
         if user and verify_password(password, user['password']):
+            if needs_rehash(user['password']):
+                _rehash_password(cursor, conn, user, password)
             return {
                 'id': user['id'],
                 'username': user['username'],
@@ -234,6 +655,7 @@ def add_parking_space(provider_id, address, latitude, longitude, capacity, rate_
         """, (provider_id, address, latitude, longitude, capacity, rate_per_hour, description))
 
         conn.commit()
+        _space_catalog.invalidate([cursor.lastrowid])
         return True
     except Error as e:
         print(f"Error adding parking space: {e}")
@@ -244,16 +666,44 @@ def add_parking_space(provider_id, address, latitude, longitude, capacity, rate_
             conn.close()
 
 
-def get_all_parking_spaces():
+def add_parking_spaces(provider_id, spaces):
+    """
+    Insert many parking spaces in one transaction. spaces holds
+    (address, latitude, longitude, capacity, rate_per_hour, description)
+    tuples. Returns True, or False if the batch was rolled back.
+    """
+    try:
+        conn = create_db_connection()
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            INSERT INTO parking_spaces 
+            (provider_id, address, latitude, longitude, capacity, rate_per_hour, description)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [(provider_id,) + tuple(space) for space in spaces])
+
+        conn.commit()
+        _space_catalog.invalidate()
+        return True
+    except Error as e:
+        print(f"Error adding parking spaces: {e}")
+        return False
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+
+def _select_parking_spaces(where=None, params=()):
+    """Read spaces with their provider's name, optionally filtered by a WHERE clause; raises Error on failure"""
     try:
         conn = create_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("""
-            SELECT ps.*, u.full_name as provider_name
-            FROM parking_spaces ps
-            JOIN users u ON ps.provider_id = u.id
-        """)
+        query = PARKING_SPACES_SQL
+        if where:
+            query += f" WHERE {where}"
+        cursor.execute(query, params)
 
         spaces = cursor.fetchall()
         # Convert Decimal to float for latitude and longitude
@@ -261,9 +711,228 @@ def get_all_parking_spaces():
             space['latitude'] = float(space['latitude'])
             space['longitude'] = float(space['longitude'])
         return spaces
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+
+def _load_parking_spaces(space_ids):
+    """Catalog loader: the given spaces"""
+    return _select_parking_spaces(f"ps.id IN ({', '.join(['%s'] * len(space_ids))})", tuple(space_ids))
+
+
+# Spaces looked up by id, cached in memory one by one: writes below invalidate
+# the spaces they change. Area and list queries go to the database, where the
+# coordinate index does the filtering.
+_space_catalog = SpaceCatalog(_load_parking_spaces, **SPACE_CATALOG_CONFIG)
+
+
+def get_space_catalog_stats():
+    """Return hit/miss statistics for the parking space catalog"""
+    return _space_catalog.stats()
+
+
+def get_all_parking_spaces():
+    try:
+        return _select_parking_spaces()
     except Error as e:
         print(f"Error fetching parking spaces: {e}")
         return []
+
+
+def get_parking_space(space_id):
+    """Get one parking space with its provider's name, or None if it does not exist or the lookup fails"""
+    try:
+        return _space_catalog.get(space_id)
+    except Error as e:
+        print(f"Error fetching parking space: {e}")
+        return None
+
+
+def get_parking_spaces_in_bbox(min_lat, max_lat, min_lon, max_lon, provider_id=None):
+    """
+    Get parking spaces inside a latitude/longitude box, optionally for one
+    provider. Returns None if the query fails so callers can retry later.
+    """
+    where, params = bbox_where_clause((min_lat, max_lat, min_lon, max_lon), 'ps.latitude', 'ps.longitude')
+    if provider_id is not None:
+        where += " AND ps.provider_id = %s"
+        params += (provider_id,)
+    try:
+        return _select_parking_spaces(where, params)
+    except Error as e:
+        print(f"Error fetching parking spaces: {e}")
+        return None
+
+
+class SpaceFullError(Exception):
+    """Raised when a booking finds no free capacity left on the parking space"""
+
+
+class SpaceNotFoundError(Exception):
+    """Raised when a booking names a parking space that does not exist"""
+
+
+class PaymentRejectedError(Exception):
+    """Raised when a payment is not for one of the payer's PENDING bills, or not for its amount"""
+
+
+class BillRejectedError(Exception):
+    """Raised when a bill is for a request that is not COMPLETED, is already billed, or has no positive amount"""
+
+
+def _claim_slot(cursor, space_id):
+    """Take one unit of capacity in a single conditional UPDATE; False if the space is full"""
+    cursor.execute("""
+        UPDATE parking_spaces SET occupied = occupied + 1
+        WHERE id = %s AND occupied < capacity
+    """, (space_id,))
+    return cursor.rowcount == 1
+
+
+def _release_slot(cursor, space_id):
+    cursor.execute("""
+        UPDATE parking_spaces SET occupied = occupied - 1
+        WHERE id = %s AND occupied > 0
+    """, (space_id,))
+
+
+# A change_log id still not visible this long after a later one was allocated
+# belongs to a transaction taken as rolled back. Longer than a lock wait can last.
+CHANGE_SETTLE_SECONDS = 60
+
+
+def _next_version(cursor):
+    """
+    Allocate a change_log id as the version to stamp on the rows this
+    transaction writes. Unlike a counter row, the auto-increment holds no
+    lock until commit, so concurrent writers do not queue behind each other.
+    Versions can therefore commit out of order; get_changes_since only hands
+    out versions below the first one still in flight. Call this after the
+    checks that may roll back, or roll back with _abandon_version.
+    """
+    cursor.execute("INSERT INTO change_log (created_at) VALUES (%s)", (time.time(),))
+    return cursor.lastrowid
+
+
+def _abandon_version(conn, cursor, version):
+    """Roll back, then log version as used so change readers need not wait for it to settle"""
+    conn.rollback()
+    cursor.execute("INSERT INTO change_log (id, created_at) VALUES (%s, 0)", (version,))
+    conn.commit()
+
+
+def _settled_version(cursor, since_version):
+    """
+    The highest version V >= since_version such that every version up to V
+    is committed or abandoned. A missing id followed by a recently allocated
+    one may belong to a transaction still in flight, so V stops before it.
+    Takes a dictionary cursor.
+    """
+    cutoff = time.time() - CHANGE_SETTLE_SECONDS
+    cursor.execute("SELECT id, created_at FROM change_log WHERE id > %s ORDER BY id", (since_version,))
+    settled = since_version
+    for row in cursor.fetchall():
+        if row['id'] != settled + 1 and row['created_at'] > cutoff:
+            break
+        settled = row['id']
+    return settled
+
+
+def _publish_change(kind, user_id=None, provider_id=None, **fields):
+    """Push a change event to the affected user's and provider's dashboards (call after commit)"""
+    event = dict(type=kind, **fields)
+    if user_id is not None:
+        publish(user_topic(user_id), event)
+    if provider_id is not None:
+        publish(provider_topic(provider_id), event)
+
+
+def get_changes_since(since_version, user_id=None, provider_id=None):
+    """
+    Return {'version': V, 'requests': [...], 'bills': [...]} holding the
+    parking requests and bills changed after since_version, for one user or
+    for one provider's spaces. Pass since_version=None to get just the
+    current version as a starting point. Poll again with the returned V.
+    Returns None on a database error.
+
+    V is the settled version (see _settled_version), so a change committed
+    after a slower transaction that allocated an earlier version is returned
+    by a later poll, once that transaction finishes, rather than skipped.
+    """
+    if (user_id is None) == (provider_id is None):
+        raise ValueError("Pass exactly one of user_id or provider_id")
+
+    try:
+        conn = create_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        if since_version is None:
+            # Start from the newest version old enough to have settled
+            cursor.execute("SELECT id FROM change_log WHERE created_at <= %s ORDER BY id DESC LIMIT 1",
+                           (time.time() - CHANGE_SETTLE_SECONDS,))
+            row = cursor.fetchone()
+            version = _settled_version(cursor, row['id'] if row else 0)
+            return {'version': version, 'requests': [], 'bills': []}
+
+        version = _settled_version(cursor, since_version)
+        changes = {'version': version, 'requests': [], 'bills': []}
+        if since_version >= version:
+            return changes
+
+        window = (since_version, version)
+        if user_id is not None:
+            cursor.execute("""
+                SELECT pr.id, pr.vehicle_number, pr.status, pr.request_time, pr.version,
+                       ps.address, ps.rate_per_hour
+                FROM parking_requests pr
+                JOIN parking_spaces ps ON pr.space_id = ps.id
+                WHERE pr.user_id = %s AND pr.version > %s AND pr.version <= %s
+                ORDER BY pr.version
+            """, (user_id,) + window)
+            changes['requests'] = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT * FROM bills
+                WHERE user_id = %s AND version > %s AND version <= %s
+                ORDER BY version
+            """, (user_id,) + window)
+            changes['bills'] = cursor.fetchall()
+        else:
+            cursor.execute("""
+                SELECT 
+                    pr.id,
+                    u.full_name as user_name,
+                    pr.vehicle_number,
+                    pr.duration_hours,
+                    pr.status,
+                    pr.request_time,
+                    pr.version,
+                    ps.address as space_address,
+                    ps.rate_per_hour
+                FROM parking_requests pr
+                JOIN users u ON pr.user_id = u.id
+                JOIN parking_spaces ps ON pr.space_id = ps.id
+                WHERE pr.version > %s AND pr.version <= %s AND ps.provider_id = %s
+                ORDER BY pr.version
+            """, window + (provider_id,))
+            changes['requests'] = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT b.*
+                FROM bills b
+                JOIN parking_requests pr ON b.request_id = pr.id
+                JOIN parking_spaces ps ON pr.space_id = ps.id
+                WHERE b.version > %s AND b.version <= %s AND ps.provider_id = %s
+                ORDER BY b.version
+            """, window + (provider_id,))
+            changes['bills'] = cursor.fetchall()
+
+        return changes
+    except Error as e:
+        print(f"Error fetching changes: {e}")
+        return None
     finally:
         if 'conn' in locals() and conn.is_connected():
             cursor.close()
@@ -271,17 +940,41 @@ def get_all_parking_spaces():
 
 
 def create_parking_request(user_id, space_id, vehicle_number):
+    """
+    Book a space: claim a slot and insert the PENDING request in one
+    transaction. Returns the new request id, or False on a database error.
+    Raises SpaceFullError when the space has no free capacity, and
+    SpaceNotFoundError when there is no such space.
+    """
     try:
         conn = create_db_connection()
         cursor = conn.cursor()
 
+        # The row lock taken by the conditional UPDATE serializes concurrent
+        # bookers, so two users can never both take the last slot
+        if not _claim_slot(cursor, space_id):
+            # Zero rows updated: either full or no such space; only now pay for telling them apart
+            cursor.execute("SELECT 1 FROM parking_spaces WHERE id = %s", (space_id,))
+            exists = cursor.fetchone() is not None
+            conn.rollback()
+            if not exists:
+                raise SpaceNotFoundError(f"No parking space {space_id}")
+            raise SpaceFullError("This parking space is full")
+
+        version = _next_version(cursor)
         cursor.execute("""
-            INSERT INTO parking_requests (user_id, space_id, vehicle_number, status)
-            VALUES (%s, %s, %s, 'PENDING')
-        """, (user_id, space_id, vehicle_number))
+            INSERT INTO parking_requests (user_id, space_id, vehicle_number, status, version)
+            VALUES (%s, %s, %s, 'PENDING', %s)
+        """, (user_id, space_id, vehicle_number, version))
+        request_id = cursor.lastrowid
+
+        cursor.execute("SELECT provider_id FROM parking_spaces WHERE id = %s", (space_id,))
+        provider_id = cursor.fetchone()[0]
 
         conn.commit()
-        return True
+        _space_catalog.invalidate([space_id])
+        _publish_change('request', user_id, provider_id, id=request_id, status='PENDING')
+        return request_id
 
     except Error as e:
         print(f"Error creating parking request: {e}")
@@ -298,22 +991,7 @@ def get_provider_requests(provider_id):
         conn = create_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("""
-            SELECT 
-                pr.id,
-                u.full_name as user_name,
-                pr.vehicle_number,
-                pr.duration_hours,
-                pr.status,
-                pr.request_time,
-                ps.address as space_address,
-                ps.rate_per_hour
-            FROM parking_requests pr
-            JOIN users u ON pr.user_id = u.id
-            JOIN parking_spaces ps ON pr.space_id = ps.id
-            WHERE ps.provider_id = %s
-            ORDER BY pr.request_time DESC
-        """, (provider_id,))
+        cursor.execute(PROVIDER_REQUESTS_SQL + " ORDER BY pr.request_time DESC", (provider_id,))
 
         return cursor.fetchall()
     except Error as e:
@@ -325,19 +1003,108 @@ def get_provider_requests(provider_id):
             conn.close()
 
 
-def update_request_status(request_id, status):
-    """Update parking request status"""
+def get_provider_requests_page(provider_id, after=None, limit=50):
+    """
+    Get one page of a provider's parking requests, newest first. after is the
+    (request_time, id) cursor returned with the previous page, or None for the
+    first page. Returns (requests, next_cursor); next_cursor is None on the
+    last page. Returns ([], None) on a database error.
+    """
+    try:
+        conn = create_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # Keyset pagination: seek past the cursor instead of OFFSET, so every
+        # page costs the same however deep the provider scrolls
+        keyset = ""
+        params = [provider_id]
+        if after is not None:
+            request_time, request_id = after
+            keyset = PROVIDER_REQUESTS_KEYSET
+            params += [request_time, request_time, request_id]
+
+        cursor.execute(PROVIDER_REQUESTS_PAGE_SQL.format(keyset=keyset), params + [limit + 1])
+
+        # The extra row only tells whether another page exists
+        requests = cursor.fetchall()
+        if len(requests) <= limit:
+            return requests, None
+        requests = requests[:limit]
+        return requests, (requests[-1]['request_time'], requests[-1]['id'])
+    except Error as e:
+        print(f"Error fetching provider requests: {e}")
+        return [], None
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+
+def update_request_status(request_id, status, expected_status=None, user_id=None, provider_id=None):
+    """
+    Move a parking request to a new status, adjusting its space's occupancy
+    counter in the same transaction. Returns False if the request does not
+    exist, changed concurrently, or would need a slot the space no longer has.
+    With expected_status, the request must currently have that status. With
+    user_id or provider_id, it must be that user's booking or on one of that
+    provider's spaces; other requests are treated as missing.
+    """
     try:
         conn = create_db_connection()
         cursor = conn.cursor()
 
+        query = """
+            SELECT pr.status, pr.space_id, pr.user_id, ps.provider_id
+            FROM parking_requests pr
+            JOIN parking_spaces ps ON pr.space_id = ps.id
+            WHERE pr.id = %s
+        """
+        params = [request_id]
+        if user_id is not None:
+            query += " AND pr.user_id = %s"
+            params.append(user_id)
+        if provider_id is not None:
+            query += " AND ps.provider_id = %s"
+            params.append(provider_id)
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        if not row:
+            print(f"Error updating request: no request {request_id}")
+            return False
+        old_status, space_id, user_id, provider_id = row
+        if expected_status is not None and old_status != expected_status:
+            print(f"Error updating request: request {request_id} is {old_status}, not {expected_status}")
+            return False
+        if old_status == status:
+            return True
+
+        # Compare-and-set on the old status so a transition racing with this
+        # one cannot move the counter twice
+        version = _next_version(cursor)
         cursor.execute("""
             UPDATE parking_requests 
-            SET status = %s 
-            WHERE id = %s
-        """, (status, request_id))
+            SET status = %s, version = %s 
+            WHERE id = %s AND status = %s
+        """, (status, version, request_id, old_status))
+        if cursor.rowcount != 1:
+            _abandon_version(conn, cursor, version)
+            print(f"Error updating request: request {request_id} changed concurrently")
+            return False
+
+        was_occupying = old_status in OCCUPYING_STATUSES
+        now_occupying = status in OCCUPYING_STATUSES
+        if now_occupying and not was_occupying:
+            if not _claim_slot(cursor, space_id):
+                _abandon_version(conn, cursor, version)
+                print(f"Error updating request: space {space_id} is full")
+                return False
+        elif was_occupying and not now_occupying:
+            _release_slot(cursor, space_id)
 
         conn.commit()
+        if was_occupying != now_occupying:
+            _space_catalog.invalidate([space_id])
+        _publish_change('request', user_id, provider_id, id=request_id, status=status)
         return True
     except Error as e:
         print(f"Error updating request: {e}")
@@ -348,36 +1115,166 @@ def update_request_status(request_id, status):
             conn.close()
 
 
-def generate_bill(request_id, amount):
-    """Generate a bill for a parking request."""
+def update_pending_requests(request_ids, status, provider_id=None):
+    """
+    Accept or deny many PENDING requests in one transaction with a single
+    UPDATE ... WHERE id IN (...). Returns {request_id: outcome}, where outcome
+    is 'UPDATED', 'NOT_FOUND' (missing, or not one of provider_id's spaces) or
+    the status the request already had. Returns None on a database error.
+    """
+    if status not in ('ACCEPTED', 'DENIED'):
+        raise ValueError(f"Pending requests can only be accepted or denied, not {status}")
+    request_ids = list(dict.fromkeys(int(request_id) for request_id in request_ids))
+    if not request_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(request_ids))
+
+    try:
+        conn = create_db_connection()
+        cursor = conn.cursor()
+
+        # Optimistic: read the current statuses, then update only the rows
+        # still PENDING. If another transaction moved one of them in between,
+        # the row count comes up short and the whole batch is retried.
+        for attempt in range(3):
+            query = f"""
+                SELECT pr.id, pr.status, pr.space_id, pr.user_id, ps.provider_id
+                FROM parking_requests pr
+                JOIN parking_spaces ps ON pr.space_id = ps.id
+                WHERE pr.id IN ({placeholders})
+            """
+            params = list(request_ids)
+            if provider_id is not None:
+                query += " AND ps.provider_id = %s"
+                params.append(provider_id)
+            cursor.execute(query, params)
+            current = {row[0]: row[1:] for row in cursor.fetchall()}
+
+            outcomes = {request_id: current[request_id][0] if request_id in current else 'NOT_FOUND'
+                        for request_id in request_ids}
+            pending = [request_id for request_id, outcome in outcomes.items() if outcome == 'PENDING']
+            if not pending:
+                conn.rollback()
+                return outcomes
+
+            version = _next_version(cursor)
+            cursor.execute(f"""
+                UPDATE parking_requests 
+                SET status = %s, version = %s 
+                WHERE id IN ({', '.join(['%s'] * len(pending))}) AND status = 'PENDING'
+            """, [status, version] + pending)
+            if cursor.rowcount != len(pending):
+                _abandon_version(conn, cursor, version)
+                continue
+
+            # Denied requests give their slots back, one statement per space
+            released = {}
+            if status not in OCCUPYING_STATUSES:
+                for request_id in pending:
+                    space_id = current[request_id][1]
+                    released[space_id] = released.get(space_id, 0) + 1
+                cursor.executemany("""
+                    UPDATE parking_spaces
+                    SET occupied = CASE WHEN occupied > %s THEN occupied - %s ELSE 0 END
+                    WHERE id = %s
+                """, [(count, count, space_id) for space_id, count in released.items()])
+
+            conn.commit()
+            if released:
+                _space_catalog.invalidate(released)
+            for request_id in pending:
+                outcomes[request_id] = 'UPDATED'
+
+            # One event per affected dashboard, not per request
+            for user_id in {current[request_id][2] for request_id in pending}:
+                _publish_change('requests', user_id=user_id, status=status)
+            for owner_id in {current[request_id][3] for request_id in pending}:
+                _publish_change('requests', provider_id=owner_id, status=status)
+            return outcomes
+
+        print("Error updating requests: statuses kept changing concurrently")
+        return None
+    except Error as e:
+        print(f"Error updating requests: {e}")
+        return None
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+
+def generate_bill(request_id, amount, provider_id=None):
+    """
+    Generate a bill for a parking request; with provider_id, only for a
+    request on that provider's spaces. Returns True once billed, False when
+    there is no such request or on a database error. Raises BillRejectedError
+    when the request is not COMPLETED, already has a bill, or amount is not
+    a positive number.
+    """
+    try:
+        valid_amount = math.isfinite(float(amount)) and float(amount) > 0
+    except (TypeError, ValueError):
+        valid_amount = False
+    if not valid_amount:
+        raise BillRejectedError("The bill amount must be a positive number")
     try:
         conn = create_db_connection()  # Establish DB connection
         cursor = conn.cursor()
 
-        # Fetch user_id from parking_requests table
-        cursor.execute("SELECT user_id FROM parking_requests WHERE id = %s", (request_id,))
+        # Fetch user_id, space_id (and the provider to notify) from parking_requests table
+        query = """
+            SELECT pr.user_id, pr.space_id, ps.provider_id, pr.status
+            FROM parking_requests pr
+            JOIN parking_spaces ps ON pr.space_id = ps.id
+            WHERE pr.id = %s
+        """
+        params = [request_id]
+        if provider_id is not None:
+            query += " AND ps.provider_id = %s"
+            params.append(provider_id)
+        cursor.execute(query, params)
         result = cursor.fetchone()
 
         if not result:
             print("Error: No matching request found.")
             return False
 
-        user_id = result[0]  # Extract user_id
+        user_id, space_id, provider_id, status = result
+        if status != 'COMPLETED':
+            conn.rollback()
+            raise BillRejectedError(f"Only COMPLETED requests can be billed; this one is {status}")
 
-        # Insert the bill into the database with user_id
+        version = _next_version(cursor)
+        # Bumping the request's version takes its row lock, so two concurrent
+        # bills for the same request serialize here and the second sees the first
         cursor.execute("""
-            INSERT INTO bills (request_id, user_id, amount, status) 
-            VALUES (%s, %s, %s, 'PENDING')
-        """, (request_id, user_id, amount))
+            UPDATE parking_requests SET version = %s WHERE id = %s AND status = 'COMPLETED'
+        """, (version, request_id))
+        if cursor.rowcount != 1:
+            _abandon_version(conn, cursor, version)
+            raise BillRejectedError("Only COMPLETED requests can be billed")
+        cursor.execute("SELECT 1 FROM bills WHERE request_id = %s", (request_id,))
+        if cursor.fetchone():
+            _abandon_version(conn, cursor, version)
+            raise BillRejectedError("This request has already been billed")
+
+        # Insert the bill into the database with user_id; get_pending_bills joins on space_id
+        cursor.execute("""
+            INSERT INTO bills (request_id, user_id, space_id, amount, status, version) 
+            VALUES (%s, %s, %s, %s, 'PENDING', %s)
+        """, (request_id, user_id, space_id, amount, version))
 
         conn.commit()  # Save changes
-        cursor.close()
-        conn.close()  # Close connection
+        _publish_change('bill', user_id, provider_id, request_id=request_id, status='PENDING')
 
         return True
-    except Exception as e:
+    except Error as e:
         print(f"Error generating bill: {e}")  # Debugging output
         return False
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()  # Return connection to the pool
 
 
 def calculate_bill(request_id):
@@ -422,12 +1319,7 @@ def get_pending_bills(user_id):
         conn = create_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("""
-            SELECT b.*, ps.address, ps.rate_per_hour 
-            FROM bills b
-            JOIN parking_spaces ps ON b.space_id = ps.id
-            WHERE b.user_id = %s AND b.status = 'PENDING'
-        """, (user_id,))
+        cursor.execute(PENDING_BILLS_SQL, (user_id,))
 
         return cursor.fetchall()
     except Error as e:
@@ -440,11 +1332,36 @@ def get_pending_bills(user_id):
 
 
 def process_payment(bill_id, user_id, amount, payment_method):
-    """Process a payment for a bill"""
+    """
+    Pay one of user_id's PENDING bills in full. Returns True once paid, False
+    on a database error. Raises PaymentRejectedError when the bill is missing,
+    someone else's, already paid, or amount is not the billed amount.
+    """
     try:
         conn = create_db_connection()
         cursor = conn.cursor()
 
+        cursor.execute("SELECT amount FROM bills WHERE id = %s AND user_id = %s AND status = 'PENDING'",
+                       (bill_id, user_id))
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            raise PaymentRejectedError("No such pending bill for this user")
+        if round(float(row[0]), 2) != round(float(amount), 2):
+            conn.rollback()
+            raise PaymentRejectedError(f"Payment must be for the billed amount of {float(row[0]):.2f}")
+
+        # Conditional on PENDING so two concurrent payments cannot both settle the bill
+        version = _next_version(cursor)
+        cursor.execute("""
+            UPDATE bills 
+            SET status = 'PAID', version = %s 
+            WHERE id = %s AND user_id = %s AND status = 'PENDING'
+        """, (version, bill_id, user_id))
+        if cursor.rowcount != 1:
+            _abandon_version(conn, cursor, version)
+            raise PaymentRejectedError("This bill has already been paid")
+
         # Create payment record
         cursor.execute("""
             INSERT INTO payments 
@@ -452,14 +1369,17 @@ def process_payment(bill_id, user_id, amount, payment_method):
             VALUES (%s, %s, %s, %s, 'SUCCESS')
         """, (bill_id, user_id, amount, payment_method))
 
-        # Update bill status
         cursor.execute("""
-            UPDATE bills 
-            SET status = 'PAID' 
-            WHERE id = %s
+            SELECT ps.provider_id
+            FROM bills b
+            JOIN parking_requests pr ON b.request_id = pr.id
+            JOIN parking_spaces ps ON pr.space_id = ps.id
+            WHERE b.id = %s
         """, (bill_id,))
+        row = cursor.fetchone()
 
         conn.commit()
+        _publish_change('bill', user_id, row[0] if row else None, id=bill_id, status='PAID')
         return True
     except Error as e:
         print(f"Error processing payment: {e}")
@@ -474,12 +1394,14 @@ def mark_bill_as_paid(user_id):
     cursor = conn.cursor()
 
     try:
+        version = _next_version(cursor)
         cursor.execute("""
             UPDATE bills
-            SET status = 'PAID'
+            SET status = 'PAID', version = %s
             WHERE user_id = %s AND status = 'PENDING'
-        """, (user_id,))
+        """, (version, user_id))
         conn.commit()
+        _publish_change('bills', user_id, status='PAID')
     finally:
         cursor.close()
         conn.close()
@@ -488,4 +1410,9 @@ def mark_bill_as_paid(user_id):
 
 # Initialize database if this file is run directly
 if __name__ == "__main__":
+    import sys
+
     initialize_database()
+    if '--check-indexes' in sys.argv:
+        check_hot_query_indexes()
+        print("All hot queries use an index")
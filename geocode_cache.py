@@ -0,0 +1,250 @@
+import atexit
+import re
+import sqlite3
+import threading
+import time
+
+from geopy.geocoders import Nominatim
+
+from config import GEOCODE_CACHE_CONFIG, GEOCODER_CONFIG
+
+
+def normalize_address(address):
+    """Canonical cache key for an address: lowercase, single spaces, no stray punctuation"""
+    address = address.strip().lower()
+    address = re.sub(r"\s*,\s*", ", ", address)
+    address = re.sub(r"\s+", " ", address)
+    return address.strip(" ,.")
+
+
+class GeocodeCache:
+    """
+    Disk-backed geocoding cache with TTL expiry and LRU eviction.
+
+    A hit is a read only. Its new last_used time is kept in memory and
+    written in one batch once touch_batch entries have been hit, and before every eviction so
+    that the least recently used entries are the ones dropped. flush() writes
+    the rest; the shared geocoder calls it at exit.
+
+    Lookups that found nothing are cached for negative_ttl_seconds only, so a
+    transient geocoder failure is retried soon.
+
+    The row count is tracked in memory, and only when it passes max_entries
+    is the table counted (other processes may share the file). Eviction then
+    trims to 90% of max_entries, so the next count is many inserts away.
+    """
+
+    def __init__(self, path, ttl_seconds=30 * 24 * 3600, max_entries=10000, coordinate_precision=5,
+                 touch_batch=100, negative_ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.coordinate_precision = coordinate_precision
+        self.touch_batch = touch_batch
+
+        self._lock = threading.Lock()
+        self._touched = {}  # cache key -> last_used not yet written
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                cache_key TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                address TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_last_used ON geocode_cache (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def forward_key(self, address):
+        return "fwd:" + normalize_address(address)
+
+    def reverse_key(self, coordinates):
+        precision = self.coordinate_precision
+        return f"rev:{round(float(coordinates[0]), precision)},{round(float(coordinates[1]), precision)}"
+
+    def get(self, key):
+        """
+        Return (found, entry) where entry is a (latitude, longitude, address)
+        tuple. A found entry with all fields None records a lookup that had
+        no result, so it is not retried until negative_ttl_seconds have passed.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT latitude, longitude, address, created_at FROM geocode_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self._stats['misses'] += 1
+                return False, None
+
+            negative = row[0] is None and row[2] is None
+            if now - row[3] > (self.negative_ttl_seconds if negative else self.ttl_seconds):
+                self._touched.pop(key, None)
+                self._conn.execute("DELETE FROM geocode_cache WHERE cache_key = ?", (key,))
+                self._conn.commit()
+                self._count -= 1
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._write_touches()
+                self._conn.commit()
+            self._stats['hits'] += 1
+            return True, row[:3]
+
+    def put(self, key, latitude=None, longitude=None, address=None):
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute("""
+                INSERT OR REPLACE INTO geocode_cache
+                (cache_key, latitude, longitude, address, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, latitude, longitude, address, now, now))
+            # Puts follow misses, so the key is almost always new; an
+            # occasional replace overcounts until the next exact count
+            self._count += 1
+            self._evict()
+            self._conn.commit()
+
+    def flush(self):
+        """Write the last_used times of recent hits"""
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+
+    def _write_touches(self):
+        if self._touched:
+            self._conn.executemany("UPDATE geocode_cache SET last_used = ? WHERE cache_key = ?",
+                                   [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        if self._count <= self.max_entries:
+            return
+        self._count = self._conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        if self._count <= self.max_entries:
+            return
+        excess = self._count - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._write_touches()
+            self._conn.execute("""
+                DELETE FROM geocode_cache WHERE cache_key IN (
+                    SELECT cache_key FROM geocode_cache ORDER BY last_used LIMIT ?
+                )
+            """, (excess,))
+            self._count -= excess
+            self._stats['evictions'] += excess
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM geocode_cache")
+            self._conn.commit()
+            self._count = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current entry count"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class RateLimiter:
+    """Spaces out calls across threads so they start at least min_interval_seconds apart"""
+
+    def __init__(self, min_interval_seconds=1.0):
+        self.min_interval_seconds = min_interval_seconds
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        # Reserve the next slot under the lock, then sleep outside it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval_seconds
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CachedGeocoder:
+    """
+    Geocoder front end that answers repeat lookups from a GeocodeCache and
+    rate-limits the lookups that reach the geolocator. Safe to share between threads.
+    """
+
+    def __init__(self, geolocator, cache, rate_limiter=None):
+        self.geolocator = geolocator
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+
+    def geocode(self, address):
+        """Return (latitude, longitude) for an address, or None if it cannot be found"""
+        key = self.cache.forward_key(address)
+        found, entry = self.cache.get(key)
+        if found:
+            return (entry[0], entry[1]) if entry[0] is not None else None
+
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        location = self.geolocator.geocode(address)
+        if location:
+            self.cache.put(key, location.latitude, location.longitude, location.address)
+            return (location.latitude, location.longitude)
+        self.cache.put(key)
+        return None
+
+    def reverse(self, coordinates):
+        """Return the address at (latitude, longitude), or None if there is none"""
+        key = self.cache.reverse_key(coordinates)
+        found, entry = self.cache.get(key)
+        if found:
+            return entry[2]
+
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        location = self.geolocator.reverse(f"{coordinates[0]}, {coordinates[1]}")
+        if location:
+            self.cache.put(key, location.latitude, location.longitude, location.address)
+            return location.address
+        self.cache.put(key)
+        return None
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    """Return the shared cached Nominatim geocoder"""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                cache = GeocodeCache(**GEOCODE_CACHE_CONFIG)
+                # Write the last_used times of hits since the last batch
+                atexit.register(cache.flush)
+                _geocoder = CachedGeocoder(
+                    Nominatim(user_agent="parking_system"),
+                    cache,
+                    RateLimiter(**GEOCODER_CONFIG)
+                )
+    return _geocoder
+
+
+def get_geocode_cache_stats():
+    """Return hit/miss statistics for the shared geocoding cache"""
+    return get_geocoder().cache.stats()
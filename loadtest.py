@@ -0,0 +1,360 @@
+"""
+Load generator for the data layer: simulated drivers and providers run the
+booking lifecycle concurrently, and latency and errors are reported per
+operation.
+
+    python loadtest.py [--users 20] [--providers 3] [--think-time 0.5] [--duration 60]
+                       [--backend sqlite|mysql] [--sqlite-path loadtest.sqlite3]
+
+Each simulated user loops through:
+    verify_user -> search -> create_parking_request -> (provider accepts) ->
+    update_request_status ACTIVE -> COMPLETED -> generate_bill -> process_payment
+Each step is followed by an exponentially distributed think time with mean
+--think-time. Each provider accepts or denies the requests for its spaces.
+Test accounts and spaces are created on first run and reused afterwards.
+The MySQL backend writes to the database in DB_CONFIG, so point that at a
+scratch database.
+
+A booking refused because the space is full is counted as "rejected", not
+as an error. Latency percentiles cover successful calls only, so fast
+failures do not flatter them.
+"""
+import argparse
+import math
+import queue
+import random
+import threading
+import time
+
+import database
+from config import DB_BACKEND, PASSWORD_CONFIG
+from database import (
+    SEARCH_PARKING_SPACES_SQL,
+    PaymentRejectedError,
+    SpaceFullError,
+    add_parking_spaces,
+    create_db_connection,
+    create_parking_request,
+    generate_bill,
+    get_all_parking_spaces,
+    process_payment,
+    register_user,
+    update_request_status,
+    verify_user
+)
+from spatial_index import bbox_where_clause, bounding_box, within_radius_batch
+from storage import SQLiteBackend, create_backend
+
+# Spaces are scattered around this point (Pune), searches land near them
+CENTER = (18.5204, 73.8567)
+SPREAD_DEG = 0.01
+PASSWORD = 'loadtest-password'
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.latencies_ms = []  # successful calls only
+        self.errors = 0
+        self.rejected = 0
+
+
+class LoadStats:
+    """Latency samples and outcome counts per operation name, shared by all simulated clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def _stats(self, name):
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        return stats
+
+    def timed(self, name, func, *args, ok=lambda result: bool(result)):
+        """Call func(*args) and record its outcome, and its latency if it succeeded; a result failing ok() counts as an error"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = func(*args)
+            if ok(result):
+                outcome = 'ok'
+            return result
+        except (SpaceFullError, PaymentRejectedError):
+            outcome = 'rejected'
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                stats = self._stats(name)
+                stats.calls += 1
+                if outcome == 'ok':
+                    stats.latencies_ms.append(elapsed_ms)
+                elif outcome == 'error':
+                    stats.errors += 1
+                elif outcome == 'rejected':
+                    stats.rejected += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def search(center, radius_km=0.5):
+    """The query and distance filter map_utils.search_parking_spaces runs, without the map"""
+    where, params = bbox_where_clause(bounding_box(center, radius_km))
+    try:
+        conn = create_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(SEARCH_PARKING_SPACES_SQL.format(where=where), params)
+        spaces = cursor.fetchall()
+    except database.Error as e:
+        print(f"Error searching parking spaces: {e}")
+        return None
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+    if not spaces:
+        return []
+    _, inside = within_radius_batch(center, [float(s[2]) for s in spaces], [float(s[3]) for s in spaces], radius_km)
+    return [space for space, keep in zip(spaces, inside) if keep]
+
+
+def find_bill_id(request_id):
+    """Untimed helper: generate_bill does not return the new bill's id"""
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(id) FROM bills WHERE request_id = %s", (request_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return row[0] if row else None
+
+
+def ensure_account(username, user_type):
+    """Return the id of a load-test account, registering it on first use"""
+    user = verify_user(username, PASSWORD)
+    if user is None:
+        register_user(username, PASSWORD, username, user_type)
+        user = verify_user(username, PASSWORD)
+    if user is None:
+        raise SystemExit(f"Could not create or log in load-test account {username}")
+    return user['id']
+
+
+def set_up(args, rng):
+    """Create the accounts and spaces; returns (usernames, provider ids, space id -> provider id)"""
+    usernames = [f"load_user_{i}" for i in range(args.users)]
+    for username in usernames:
+        ensure_account(username, 'USER')
+    provider_ids = [ensure_account(f"load_provider_{i}", 'PROVIDER') for i in range(args.providers)]
+
+    existing = {}
+    for space in get_all_parking_spaces():
+        existing.setdefault(space['provider_id'], []).append(space['id'])
+    for provider_id in provider_ids:
+        missing = args.spaces_per_provider - len(existing.get(provider_id, []))
+        if missing > 0:
+            add_parking_spaces(provider_id, [
+                (f"Load test space {provider_id}-{i}",
+                 CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+                 CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+                 args.capacity, 20.0, "load test")
+                for i in range(missing)
+            ])
+
+    space_providers = {space['id']: space['provider_id'] for space in get_all_parking_spaces()
+                       if space['provider_id'] in provider_ids}
+    release_leftover_requests(space_providers)
+    return usernames, provider_ids, space_providers
+
+
+def release_leftover_requests(space_ids):
+    """Close bookings an earlier run stopped mid-way, so they do not hold slots forever"""
+    if not space_ids:
+        return
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, status FROM parking_requests
+            WHERE space_id IN ({', '.join(['%s'] * len(space_ids))})
+            AND status IN ('PENDING', 'ACCEPTED', 'ACTIVE')
+        """, tuple(space_ids))
+        leftovers = cursor.fetchall()
+        cursor.close()
+    for request_id, status in leftovers:
+        update_request_status(request_id, 'COMPLETED' if status == 'ACTIVE' else 'DENIED')
+
+
+class LoadTest:
+    def __init__(self, args, usernames, provider_ids, space_providers):
+        self.args = args
+        self.usernames = usernames
+        self.space_providers = space_providers
+        self.stats = LoadStats()
+        self.stop = threading.Event()
+        self.inboxes = {provider_id: queue.Queue() for provider_id in provider_ids}
+
+    def think(self, rng):
+        if self.args.think_time > 0:
+            self.stop.wait(rng.expovariate(1 / self.args.think_time))
+        return not self.stop.is_set()
+
+    def wait_for(self, event):
+        """Wait for a provider's decision, giving up at the timeout or when the run ends"""
+        deadline = time.monotonic() + self.args.decision_timeout
+        while not self.stop.is_set() and time.monotonic() < deadline:
+            if event.wait(0.1):
+                return True
+        return False
+
+    def user_loop(self, index):
+        rng = random.Random(self.args.seed * 1000 + index)
+        username = self.usernames[index]
+        timed = self.stats.timed
+        while not self.stop.is_set():
+            try:
+                user = timed('verify_user', verify_user, username, PASSWORD)
+                if not user or not self.think(rng):
+                    continue
+
+                center = (CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+                          CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+                spaces = timed('search', search, center, ok=lambda result: result is not None)
+                spaces = [space for space in spaces or () if space[0] in self.space_providers]
+                if not spaces or not self.think(rng):
+                    continue
+
+                space = rng.choice(spaces)
+                try:
+                    request_id = timed('create_parking_request', create_parking_request,
+                                       user['id'], space[0], f"LOAD-{index}")
+                except SpaceFullError:
+                    continue
+                if not request_id:
+                    continue
+
+                # Hand the request to the space's provider and wait for a decision
+                decision = {'event': threading.Event()}
+                self.inboxes[self.space_providers[space[0]]].put((request_id, decision))
+                if not self.wait_for(decision['event']) or decision['status'] != 'ACCEPTED':
+                    continue
+                if not self.think(rng):
+                    continue
+
+                if not timed('update_request_status ACTIVE', update_request_status, request_id, 'ACTIVE'):
+                    continue
+                if not self.think(rng):
+                    continue
+                if not timed('update_request_status COMPLETED', update_request_status, request_id, 'COMPLETED'):
+                    continue
+
+                amount = round(float(space[5]) * rng.uniform(0.5, 3), 2)
+                if not timed('generate_bill', generate_bill, request_id, amount) or not self.think(rng):
+                    continue
+                bill_id = find_bill_id(request_id)
+                if bill_id is not None:
+                    try:
+                        timed('process_payment', process_payment, bill_id, user['id'], amount, 'UPI')
+                    except PaymentRejectedError:
+                        pass
+                self.think(rng)
+            except Exception as e:
+                print(f"Simulated user {username} failed: {e}")
+                self.stop.wait(1)
+
+    def provider_loop(self, provider_id, index):
+        rng = random.Random(self.args.seed * 1000 + 500 + index)
+        inbox = self.inboxes[provider_id]
+        while not self.stop.is_set():
+            try:
+                request_id, decision = inbox.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.think(rng)
+            status = 'DENIED' if rng.random() < self.args.deny_rate else 'ACCEPTED'
+            if not self.stats.timed(f'update_request_status {status}', update_request_status, request_id, status):
+                status = 'FAILED'
+            decision['status'] = status
+            decision['event'].set()
+
+    def run(self):
+        threads = [threading.Thread(target=self.provider_loop, args=(provider_id, i), daemon=True)
+                   for i, provider_id in enumerate(self.inboxes)]
+        threads += [threading.Thread(target=self.user_loop, args=(i,), daemon=True)
+                    for i in range(len(self.usernames))]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            self.stop.wait(self.args.duration)
+        except KeyboardInterrupt:
+            pass
+        self.stop.set()
+        elapsed = time.perf_counter() - started
+        for thread in threads:
+            thread.join(timeout=5)
+        return elapsed
+
+    def report(self, elapsed):
+        payments = self.stats.operations.get('process_payment', OperationStats())
+        print(f"\n{len(self.usernames)} users, {len(self.inboxes)} providers, think time "
+              f"{self.args.think_time}s, {elapsed:.1f}s, "
+              f"{payments.calls - payments.errors - payments.rejected} paid bookings\n")
+        print(f"{'operation':<34} {'calls':>7} {'ok/s':>7} {'errors':>7} {'err %':>6} {'rejected':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        total_calls = total_errors = 0
+        for name, stats in sorted(self.stats.operations.items()):
+            latencies = sorted(stats.latencies_ms)
+            calls = stats.calls
+            ok = len(latencies)
+            total_calls += calls
+            total_errors += stats.errors
+            print(f"{name:<34} {calls:>7} {ok / elapsed:>7.1f} {stats.errors:>7} "
+                  f"{100 * stats.errors / calls if calls else 0:>6.1f} {stats.rejected:>8} "
+                  f"{percentile(latencies, 0.50):>8.1f} {percentile(latencies, 0.95):>8.1f} "
+                  f"{percentile(latencies, 0.99):>8.1f} {latencies[-1] if latencies else 0:>8.1f}")
+        print(f"\n{total_calls / elapsed:.1f} operations/s overall, "
+              f"{100 * total_errors / total_calls if total_calls else 0:.2f}% errors")
+        pool = database.get_pool_stats()
+        print(f"Connection pool: {pool}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the booking lifecycle with concurrent simulated users")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--providers', type=int, default=3)
+    parser.add_argument('--spaces-per-provider', type=int, default=5)
+    parser.add_argument('--capacity', type=int, default=4, help="slots per space created for the test")
+    parser.add_argument('--think-time', type=float, default=0.5, help="mean seconds between a client's steps")
+    parser.add_argument('--duration', type=float, default=60, help="seconds to run")
+    parser.add_argument('--deny-rate', type=float, default=0.1)
+    parser.add_argument('--decision-timeout', type=float, default=10)
+    parser.add_argument('--backend', choices=('sqlite', 'mysql'), default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default='loadtest.sqlite3')
+    parser.add_argument('--bcrypt-rounds', type=int, default=PASSWORD_CONFIG['bcrypt_rounds'])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    PASSWORD_CONFIG['bcrypt_rounds'] = args.bcrypt_rounds
+    database.use_backend(SQLiteBackend(args.sqlite_path) if args.backend == 'sqlite' else create_backend('mysql'))
+    if not database.initialize_database():
+        raise SystemExit("Could not initialize the database")
+
+    print(f"Setting up {args.users} users and {args.providers} providers on {args.backend}...")
+    usernames, provider_ids, space_providers = set_up(args, random.Random(args.seed))
+    if not space_providers:
+        raise SystemExit("No load-test parking spaces available")
+
+    test = LoadTest(args, usernames, provider_ids, space_providers)
+    test.report(test.run())
+
+
+if __name__ == "__main__":
+    main()
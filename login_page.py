@@ -1,6 +1,8 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox
+from background import BackgroundExecutor
 from database import verify_user
+from sessions import create_session, save_token
 
 
 class LoginPage:
@@ -10,6 +12,8 @@ class LoginPage:
         self.register_callback = register_callback
 
         self.create_widgets()
+        # bcrypt takes a noticeable fraction of a second: keep it off the Tk thread
+        self.executor = BackgroundExecutor(self.frame, max_workers=1, on_busy_change=self.show_busy)
 
     def create_widgets(self):
         # Create main frame
@@ -41,12 +45,12 @@ class LoginPage:
         self.password_entry.grid(row=2, column=1, pady=5)
 
         # Login button
-        login_button = ttk.Button(
+        self.login_button = ttk.Button(
             self.frame,
             text="Login",
             command=self.login
         )
-        login_button.grid(row=3, column=0, columnspan=2, pady=20)
+        self.login_button.grid(row=3, column=0, columnspan=2, pady=20)
 
         # Register link
         register_link = ttk.Button(
@@ -65,5 +69,32 @@ class LoginPage:
             messagebox.showerror("Error", "Please enter both username and password")
             return
 
+        self.executor.submit(
+            'login',
+            self.authenticate,
+            username,
+            password,
+            on_success=self.on_login,
+            on_error=lambda e: messagebox.showerror("Error", f"Login failed: {e}")
+        )
+
+    @staticmethod
+    def authenticate(username, password):
+        """Check the credentials and start a session; runs on a worker thread"""
         user_data = verify_user(username, password)
+        if user_data:
+            # Next start resumes this session instead of checking the password again
+            user_data['token'] = create_session(user_data)
+            save_token(user_data['token'])
+        return user_data
+
+    def on_login(self, user_data):
+        if user_data:
+            # The dashboard replaces this page
+            self.executor.shutdown()
         self.login_callback(user_data)
+
+    def show_busy(self, busy):
+        """Block repeat submits while a login is being checked"""
+        self.login_button.config(text="Logging in..." if busy else "Login",
+                                 state='disabled' if busy else 'normal')
@@ -1,10 +1,30 @@
+import importlib
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database import initialize_database
 from login_page import LoginPage
 from register_page import RegisterPage
-from user_dashboard import UserDashboard
-from provider_dashboard import ProviderDashboard
+from sessions import forget_token, load_token, revoke_session, validate_token
+
+# The dashboards pull in the map widget, tile loading and geocoding stacks.
+# They are imported on demand so the login screen only needs tkinter and the
+# auth path; preload_dashboards() warms them up while the user is logging in.
+DASHBOARD_MODULES = ('user_dashboard', 'provider_dashboard')
+
+
+def preload_dashboards():
+    """Import the dashboard modules on a background thread"""
+    def load():
+        for name in DASHBOARD_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                # The real import on login will surface the error
+                print(f"Background import of {name} failed: {e}")
+
+    threading.Thread(target=load, name="dashboard-preload", daemon=True).start()
 
 
 class ParkingSystem:
@@ -33,8 +53,11 @@ class ParkingSystem:
         self.main_container = ttk.Frame(self.root)
         self.main_container.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
 
-        # Initialize the login page
-        self.show_login_page()
+        # Resume the remembered session, or ask for credentials
+        self.resume_session()
+
+        # Load the map and geocoding stacks once the login page is up
+        self.root.after_idle(preload_dashboards)
 
     def configure_styles(self):
         """Configure ttk styles"""
@@ -73,6 +96,17 @@ class ParkingSystem:
             self.show_register_page
         )
 
+    def resume_session(self):
+        """Log straight in with a saved session token; fall back to the login page"""
+        token = load_token()
+        user_data = validate_token(token) if token else None
+        if user_data:
+            user_data['token'] = token
+            self.login_callback(user_data)
+        else:
+            forget_token()
+            self.show_login_page()
+
     def show_register_page(self):
         """Display the registration page"""
         # Clear the main container
@@ -93,6 +127,7 @@ class ParkingSystem:
             widget.destroy()
 
         # Create user dashboard
+        from user_dashboard import UserDashboard
         self.current_dashboard = UserDashboard(
             self.main_container,
             user_data,
@@ -106,6 +141,7 @@ class ParkingSystem:
             widget.destroy()
 
         # Create provider dashboard
+        from provider_dashboard import ProviderDashboard
         self.current_dashboard = ProviderDashboard(
             self.main_container,
             user_data,
@@ -139,6 +175,8 @@ class ParkingSystem:
     def logout_callback(self):
         """Handle logout"""
         if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
+            revoke_session(load_token())
+            forget_token()
             self.show_login_page()
 
     def handle_error(self, error_message):
@@ -146,20 +184,10 @@ class ParkingSystem:
         messagebox.showerror("Error", error_message)
 
 
-    def unpark_vehicle(request_id):
-        bill_details = calculate_bill(request_id)
-        if bill_details:
-            return jsonify({
-                'status': 'success',
-                'amount': bill_details['amount'],
-                'duration': bill_details['duration'],
-                'message': f'Your bill amount is ${bill_details["amount"]} for {bill_details["duration"]} hours'
-            })
-        return jsonify({'status': 'error', 'message': 'Error calculating bill'})
-
-
 def main():
-    # Initialize database
+    started = time.perf_counter()
+
+    # Initialize database (a single version check unless a migration is pending)
     try:
         if not initialize_database():
             messagebox.showerror("Error", "Failed to initialize database")
@@ -168,6 +196,8 @@ def main():
         messagebox.showerror("Error", f"Database initialization error: {str(e)}")
         return
 
+    schema_ready = time.perf_counter()
+
     # Create main window
     root = tk.Tk()
 
@@ -180,6 +210,14 @@ def main():
     # Create application
     app = ParkingSystem(root)
 
+    def report_first_window():
+        now = time.perf_counter()
+        print(f"Startup: schema check {(schema_ready - started) * 1000:.0f} ms, "
+              f"time to first window {(now - started) * 1000:.0f} ms")
+
+    # Runs once the login page has been laid out and drawn
+    root.after_idle(report_first_window)
+
     # Start the application
     try:
         root.mainloop()
@@ -1,16 +1,17 @@
 import tkintermapview
 from tkinter import messagebox
-from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut
 import math
-from database import create_db_connection
+from database import SEARCH_PARKING_SPACES_SQL, create_db_connection
+from geocode_cache import get_geocoder
+from spatial_index import bounding_box, bbox_where_clause, haversine_km, within_radius_batch
 
 
 class ParkingMap:
     def __init__(self):
         self.markers = {}
         self.circles = {}
-        self.geolocator = Nominatim(user_agent="parking_system")
+        self.geocoder = get_geocoder()
 
     def create_map_widget(self, parent):
         """Create and return a map widget"""
@@ -33,10 +34,7 @@ class ParkingMap:
     def get_coordinates(self, address):
         """Get coordinates for an address using geocoding"""
         try:
-            location = self.geolocator.geocode(address)
-            if location:
-                return (location.latitude, location.longitude)
-            return None
+            return self.geocoder.geocode(address)
 
         except GeocoderTimedOut:
             messagebox.showerror("Error", "Geocoding service timed out. Please try again.")
@@ -100,27 +98,29 @@ class ParkingMap:
         Check if point2 is within radius_km of point1
         """
         try:
-            lat1, lon1 = math.radians(point1[0]), math.radians(point1[1])
-            lat2, lon2 = math.radians(point2[0]), math.radians(point2[1])
-
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-
-            a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-            c = 2 * math.asin(math.sqrt(a))
-
-            # Earth's radius in kilometers
-            r = 6371
-
-            # Calculate distance
-            distance = c * r
-
-            return distance <= radius_km
+            return haversine_km(point1, point2) <= radius_km
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to calculate distance: {str(e)}")
             return False
 
+    def spaces_within_radius(self, coordinates, spaces, radius_km=0.5, lat_index=2, lon_index=3):
+        """
+        Filter space rows to those within radius_km of coordinates in one
+        vectorized pass. Returns (spaces, distances) for the matching rows.
+        """
+        if not spaces:
+            return [], []
+
+        distances, mask = within_radius_batch(
+            coordinates,
+            [space[lat_index] for space in spaces],
+            [space[lon_index] for space in spaces],
+            radius_km
+        )
+        matches = mask.nonzero()[0]
+        return [spaces[i] for i in matches], distances[matches]
+
     def search_parking_spaces(self, map_widget, search_entry, update_spaces_list_callback):
         """Search for parking spaces near the entered location"""
         try:
@@ -143,39 +143,36 @@ class ParkingMap:
             map_widget.set_position(coordinates[0], coordinates[1])
             map_widget.set_zoom(14)
 
-            # Search for parking spaces in database
+            # Search for parking spaces in database, reading only rows inside
+            # the bounding box of the search radius (served by the location index)
+            radius_km = 0.5
+            where, params = bbox_where_clause(bounding_box(coordinates, radius_km))
+
             conn = create_db_connection()
             cursor = conn.cursor()
 
-            cursor.execute("""
-                SELECT id, address, latitude, longitude, capacity, rate_per_hour,
-                       (SELECT COUNT(*) FROM parking_requests 
-                        WHERE space_id = parking_spaces.id 
-                        AND status IN ('PENDING', 'ACCEPTED')) as occupied
-                FROM parking_spaces
-            """)
+            cursor.execute(SEARCH_PARKING_SPACES_SQL.format(where=where), params)
 
             spaces = cursor.fetchall()
-            nearby_spaces = []
 
-            # Filter spaces within radius
-            for space in spaces:
+            # Exact distance check on the bounding-box candidates
+            nearby_spaces, _ = self.spaces_within_radius(coordinates, spaces, radius_km)
+
+            for space in nearby_spaces:
                 space_coords = (space[2], space[3])
-                if self.is_within_radius(coordinates, space_coords):
-                    nearby_spaces.append(space)
 
-                    # Add marker for each nearby space
-                    available = space[4] - space[6]
-                    marker_text = f"""Address: {space[1]}
+                # Add marker for each nearby space
+                available = space[4] - space[6]
+                marker_text = f"""Address: {space[1]}
 Rate: ${space[5]}/hour
 Available: {available}/{space[4]} spots"""
 
-                    self.add_parking_marker(
-                        map_widget,
-                        space_coords,
-                        marker_text,
-                        available > 0
-                    )
+                self.add_parking_marker(
+                    map_widget,
+                    space_coords,
+                    marker_text,
+                    available > 0
+                )
 
             # Update spaces list using callback
             update_spaces_list_callback(nearby_spaces)
@@ -235,8 +232,7 @@ Available: {available}/{space[4]} spots"""
     def get_address_from_coordinates(self, coordinates):
         """Get address from coordinates using reverse geocoding"""
         try:
-            location = self.geolocator.reverse(f"{coordinates[0]}, {coordinates[1]}")
-            return location.address if location else None
+            return self.geocoder.reverse(coordinates)
 
         except GeocoderTimedOut:
             messagebox.showerror("Error", "Geocoding service timed out. Please try again.")
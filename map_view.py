@@ -2,7 +2,13 @@ import tkinter as tk
 from tkinter import ttk
 import tkintermapview
 
+from marker_clustering import MarkerClusterIndex
+
 class MapView(ttk.Frame):
+    # Above this many markers, low zoom levels show cluster bubbles instead
+    CLUSTER_THRESHOLD = 200
+    ZOOM_POLL_MS = 250
+
     def __init__(self, parent, width=800, height=600):
         super().__init__(parent)
         self.map_widget = tkintermapview.TkinterMapView(
@@ -14,16 +20,108 @@ class MapView(ttk.Frame):
         self.map_widget.pack(fill="both", expand=True)
         self.markers = {}
 
+        self._cluster_index = None
+        self._cluster_labels = {}
+        self._cluster_zoom = None
+        self._watching_zoom = False
+
     def set_position(self, latitude, longitude, zoom=13):
-        self.map_widget.set_position(latitude, longitude, zoom)
+        self.map_widget.set_position(latitude, longitude)
+        self.map_widget.set_zoom(zoom)
 
-    def add_marker(self, latitude, longitude, text, marker_id=None):
-        marker = self.map_widget.set_marker(latitude, longitude, text)
-        if marker_id:
+    def add_marker(self, latitude, longitude, text, marker_id=None, **marker_options):
+        if marker_id is not None and marker_id in self.markers:
+            self.markers[marker_id].delete()
+        marker = self.map_widget.set_marker(latitude, longitude, text, **marker_options)
+        if marker_id is not None:
             self.markers[marker_id] = marker
         return marker
 
+    def remove_marker(self, marker_id):
+        marker = self.markers.pop(marker_id, None)
+        if marker is not None:
+            marker.delete()
+
+    def sync_markers(self, wanted):
+        """
+        Bring the keyed markers in line with wanted, a dict of
+        marker_id -> (latitude, longitude, text[, marker_options]). Only markers
+        that were added, removed, moved or re-labelled touch the canvas.
+        Returns (created, updated, removed) counts.
+        """
+        removed = [marker_id for marker_id in self.markers if marker_id not in wanted]
+        for marker_id in removed:
+            self.remove_marker(marker_id)
+
+        created = updated = 0
+        for marker_id, (latitude, longitude, text, *options) in wanted.items():
+            marker = self.markers.get(marker_id)
+            if marker is None:
+                self.add_marker(latitude, longitude, text, marker_id, **(options[0] if options else {}))
+                created += 1
+                continue
+
+            changed = False
+            if marker.position != (latitude, longitude):
+                marker.set_position(latitude, longitude)
+                changed = True
+            if marker.text != text:
+                marker.set_text(text)
+                changed = True
+            updated += changed
+
+        return created, updated, len(removed)
+
+    def set_markers(self, wanted):
+        """
+        Show wanted (marker_id -> (latitude, longitude, text)). Large sets are
+        clustered by zoom level; clusters are recomputed only when the
+        positions change, and re-drawn when the zoom level changes.
+        """
+        if len(wanted) <= self.CLUSTER_THRESHOLD:
+            self._cluster_index = None
+            self.sync_markers(wanted)
+            return
+
+        points = {marker_id: (item[0], item[1]) for marker_id, item in wanted.items()}
+        if self._cluster_index is None or self._cluster_index.points != points:
+            self._cluster_index = MarkerClusterIndex(points)
+        self._cluster_labels = {marker_id: item[2] for marker_id, item in wanted.items()}
+        self._render_clusters()
+
+        if not self._watching_zoom:
+            self._watching_zoom = True
+            self.after(self.ZOOM_POLL_MS, self._watch_zoom)
+
+    def _render_clusters(self):
+        zoom = round(self.map_widget.zoom)
+        self._cluster_zoom = zoom
+
+        wanted = {}
+        for cluster in self._cluster_index.clusters(zoom):
+            latitude, longitude = cluster.position
+            if cluster.point_id is not None:
+                wanted[cluster.point_id] = (latitude, longitude, self._cluster_labels[cluster.point_id])
+            else:
+                wanted[('cluster', zoom, cluster.key)] = (
+                    latitude,
+                    longitude,
+                    f"{cluster.count} spaces",
+                    {'marker_color_circle': 'white', 'marker_color_outside': 'orange'}
+                )
+        self.sync_markers(wanted)
+
+    def _watch_zoom(self):
+        # tkintermapview has no zoom event, so poll the (cheap) zoom attribute
+        if self._cluster_index is None:
+            self._watching_zoom = False
+            return
+        if round(self.map_widget.zoom) != self._cluster_zoom:
+            self._render_clusters()
+        self.after(self.ZOOM_POLL_MS, self._watch_zoom)
+
     def clear_markers(self):
+        self._cluster_index = None
         for marker in self.markers.values():
             marker.delete()
         self.markers.clear()
@@ -0,0 +1,74 @@
+from spatial_index import project
+
+# Grid cells per 256px map tile at every zoom level (a 64px clustering radius)
+CELLS_PER_TILE = 4
+
+class Cluster:
+    """Points that share a grid cell at one zoom level"""
+
+    __slots__ = ('key', 'count', 'sum_lat', 'sum_lon', 'point_id')
+
+    def __init__(self, key, count, sum_lat, sum_lon, point_id=None):
+        self.key = key
+        self.count = count
+        self.sum_lat = sum_lat
+        self.sum_lon = sum_lon
+        self.point_id = point_id  # set only for single-point clusters
+
+    @property
+    def position(self):
+        return self.sum_lat / self.count, self.sum_lon / self.count
+
+
+class MarkerClusterIndex:
+    """
+    Grid clusters for every zoom level, built once per dataset. Cells at zoom z
+    are exactly four cells of zoom z + 1, so each level is built by merging the
+    level below it rather than by re-scanning the points.
+    """
+
+    def __init__(self, points, min_zoom=0, max_zoom=16):
+        """points: dict of point_id -> (latitude, longitude)"""
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.points = points
+        self.levels = {}
+
+        scale = 2 ** max_zoom * CELLS_PER_TILE
+        finest = {}
+        for point_id, (latitude, longitude) in points.items():
+            x, y = project(latitude, longitude)
+            key = (int(x * scale), int(y * scale))
+            cluster = finest.get(key)
+            if cluster is None:
+                finest[key] = Cluster(key, 1, latitude, longitude, point_id)
+            else:
+                cluster.count += 1
+                cluster.sum_lat += latitude
+                cluster.sum_lon += longitude
+                cluster.point_id = None
+        self.levels[max_zoom] = finest
+
+        for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+            parents = {}
+            for (cx, cy), child in self.levels[zoom + 1].items():
+                key = (cx >> 1, cy >> 1)
+                parent = parents.get(key)
+                if parent is None:
+                    parents[key] = Cluster(key, child.count, child.sum_lat, child.sum_lon, child.point_id)
+                else:
+                    parent.count += child.count
+                    parent.sum_lat += child.sum_lat
+                    parent.sum_lon += child.sum_lon
+                    parent.point_id = None
+            self.levels[zoom] = parents
+
+    def clusters(self, zoom):
+        """
+        Clusters to draw at a zoom level. Past max_zoom every point is returned
+        on its own so overlapping spaces can still be told apart.
+        """
+        zoom = int(round(zoom))
+        if zoom > self.max_zoom:
+            return [Cluster(point_id, 1, lat, lon, point_id) for point_id, (lat, lon) in self.points.items()]
+        return list(self.levels[max(zoom, self.min_zoom)].values())
@@ -0,0 +1,284 @@
+"""
+Push notifications for request and bill status changes.
+
+The broker is a small TCP pub/sub hub that speaks newline-delimited JSON.
+The data layer publishes an event on a user's or provider's topic after
+each commit. Dashboards subscribe to their own topic and fetch the delta
+(get_changes_since) only when an event arrives, so an idle client makes
+no database queries.
+
+Run a shared broker with `python notifications.py`. With
+NOTIFY_CONFIG['embedded_broker'] on, the first client that finds no
+broker starts one on a daemon thread instead. The default, 'auto', does
+that only when the database is on this machine too: clients of a shared
+database need a shared broker, or they would never hear of each other's
+changes.
+
+Publishing never waits on the network: events are queued and sent by a
+background thread. The broker likewise queues events per subscriber and
+disconnects a subscriber that falls too far behind.
+"""
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from config import DB_BACKEND, DB_CONFIG, NOTIFY_CONFIG
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def user_topic(user_id):
+    return f"user:{user_id}"
+
+
+def provider_topic(provider_id):
+    return f"provider:{provider_id}"
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        # fan_out only queues; this connection's own writer thread sends
+        self.outbox = queue.Queue(maxsize=self.server.max_pending)
+        self.closed = False
+        threading.Thread(target=self._write, daemon=True, name='notification-writer').start()
+
+    def handle(self):
+        broker = self.server
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message.get('op') == 'sub':
+                    broker.subscribe(self, message.get('topics', []))
+                elif message.get('op') == 'pub':
+                    broker.fan_out(message['topic'], message.get('event', {}))
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            broker.unsubscribe(self)
+            self.closed = True
+
+    def send(self, data):
+        """Queue data for this subscriber; False if it is too far behind to take more"""
+        try:
+            self.outbox.put_nowait(data)
+            return True
+        except queue.Full:
+            return False
+
+    def disconnect(self):
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write(self):
+        while not self.closed:
+            try:
+                data = self.outbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.wfile.write(data)
+            except OSError:
+                self.disconnect()
+                return
+
+
+class NotificationBroker(socketserver.ThreadingTCPServer):
+    """Fans each published event out to the connections subscribed to its topic"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host, port, max_pending=None):
+        super().__init__((host, port), _BrokerHandler)
+        self.max_pending = max_pending or NOTIFY_CONFIG['subscriber_queue']
+        self.lock = threading.Lock()
+        self._subscribers = {}  # topic -> set of handlers
+
+    def subscribe(self, handler, topics):
+        with self.lock:
+            for topic in topics:
+                self._subscribers.setdefault(topic, set()).add(handler)
+
+    def unsubscribe(self, handler):
+        with self.lock:
+            for handlers in self._subscribers.values():
+                handlers.discard(handler)
+
+    def fan_out(self, topic, event):
+        data = (json.dumps({'topic': topic, 'event': event}) + "\n").encode()
+        with self.lock:
+            handlers = list(self._subscribers.get(topic, ()))
+        for handler in handlers:
+            if not handler.send(data):
+                # Too slow to keep up: drop it rather than buffer without bound.
+                # It reconnects and catches up with a poll.
+                self.unsubscribe(handler)
+                handler.disconnect()
+
+
+_embedded_broker = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_broker():
+    """Serve the broker on a daemon thread unless another process already holds the port"""
+    global _embedded_broker
+    with _embedded_lock:
+        if _embedded_broker is None:
+            try:
+                _embedded_broker = NotificationBroker(NOTIFY_CONFIG['host'], NOTIFY_CONFIG['port'])
+            except OSError:
+                return None
+            threading.Thread(target=_embedded_broker.serve_forever, daemon=True,
+                             name='notification-broker').start()
+    return _embedded_broker
+
+
+def _embedded_broker_allowed():
+    setting = NOTIFY_CONFIG['embedded_broker']
+    if setting == 'auto':
+        # A broker on this machine only reaches clients of a database on this machine
+        return DB_BACKEND == 'sqlite' or DB_CONFIG['host'] in LOCAL_HOSTS
+    return bool(setting)
+
+
+def _connect():
+    address = (NOTIFY_CONFIG['host'], NOTIFY_CONFIG['port'])
+    try:
+        return socket.create_connection(address, timeout=NOTIFY_CONFIG['connect_timeout'])
+    except OSError:
+        if not _embedded_broker_allowed() or start_embedded_broker() is None:
+            raise
+        return socket.create_connection(address, timeout=NOTIFY_CONFIG['connect_timeout'])
+
+
+_outbox = queue.Queue(maxsize=NOTIFY_CONFIG['publish_queue'])
+_publisher_thread = None
+_publisher_lock = threading.Lock()
+
+
+def publish(topic, event):
+    """
+    Queue event for everyone subscribed to topic and return at once; a
+    background thread sends it. Best effort: a missing or slow broker must
+    never hold up or fail the database write that triggered the event, so
+    the event is dropped (returning False) when the queue is full.
+    """
+    global _publisher_thread
+    data = (json.dumps({'op': 'pub', 'topic': topic, 'event': event}, default=str) + "\n").encode()
+    with _publisher_lock:
+        if _publisher_thread is None:
+            _publisher_thread = threading.Thread(target=_send_published, daemon=True,
+                                                 name='notification-publisher')
+            _publisher_thread.start()
+    try:
+        _outbox.put_nowait(data)
+        return True
+    except queue.Full:
+        return False
+
+
+def _send_published():
+    sock = None
+    retry_at = 0.0
+    while True:
+        data = _outbox.get()
+        if sock is None and time.monotonic() < retry_at:
+            continue  # broker recently unreachable: drop rather than wait on every event
+        for attempt in range(2):
+            try:
+                if sock is None:
+                    sock = _connect()
+                sock.sendall(data)
+                break
+            except OSError:
+                if sock is not None:
+                    sock.close()
+                sock = None
+        else:
+            retry_at = time.monotonic() + NOTIFY_CONFIG['connect_timeout']
+
+
+class NotificationListener:
+    """
+    Subscribes to topics on a background thread and calls on_event(topic, event)
+    on the Tk thread. Reconnects on its own; `connected` tells callers whether
+    they need to fall back to polling.
+    """
+
+    def __init__(self, widget, topics, on_event, poll_ms=100):
+        self.widget = widget
+        self.topics = list(topics)
+        self.on_event = on_event
+        self.poll_ms = poll_ms
+        self.connected = False
+
+        self._events = queue.Queue()
+        self._running = True
+        self._socket = None
+        threading.Thread(target=self._listen, daemon=True, name='notification-listener').start()
+        self._deliver()
+
+    def stop(self):
+        self._running = False
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+
+    def _listen(self):
+        backoff = 0.5
+        while self._running:
+            try:
+                self._socket = _connect()
+                self._socket.settimeout(None)
+                self._socket.sendall((json.dumps({'op': 'sub', 'topics': self.topics}) + "\n").encode())
+                self.connected = True
+                backoff = 0.5
+                # Events missed while disconnected are recovered by the caller's catch-up poll
+                self._events.put(('connected', {}))
+                for line in self._socket.makefile('rb'):
+                    message = json.loads(line)
+                    self._events.put((message['topic'], message['event']))
+            except (OSError, ValueError, KeyError):
+                pass
+            finally:
+                self.connected = False
+            if self._running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+
+    def _deliver(self):
+        # Drain on the Tk thread; stop once the owning widget is gone
+        if not self._running or not self.widget.winfo_exists():
+            self.stop()
+            return
+        while True:
+            try:
+                topic, event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self.on_event(topic, event)
+        self.widget.after(self.poll_ms, self._deliver)
+
+
+def main():
+    broker = NotificationBroker(NOTIFY_CONFIG['host'], NOTIFY_CONFIG['port'])
+    print(f"Notification broker listening on {NOTIFY_CONFIG['host']}:{NOTIFY_CONFIG['port']}")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.server_close()
+
+
+if __name__ == "__main__":
+    main()
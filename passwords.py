@@ -0,0 +1,89 @@
+"""
+bcrypt password hashing on a bounded pool of worker threads.
+
+bcrypt is deliberately slow. Hashes and checks run on
+PASSWORD_CONFIG['hash_workers'] threads, so a login flood keeps at most that
+many cores busy with bcrypt and leaves the rest to queries and the API. At
+most max_pending jobs are queued at once, and further callers wait for a
+free slot, so the flood cannot queue without limit either.
+
+Threads rather than processes: bcrypt releases the GIL while it hashes, so
+threads run in parallel without pickling arguments to another process or
+needing a __main__ guard in every script that logs in. bench_login.py
+measures the pool against hashing inline. Callers still block until their
+hash is done; the Tk app calls verify_user through its BackgroundExecutor.
+
+The cost factor is PASSWORD_CONFIG['bcrypt_rounds']. Hashes made at another
+cost still verify. needs_rehash() reports them, and verify_user upgrades
+them on the next successful login.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import PASSWORD_CONFIG
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(PASSWORD_CONFIG['max_pending'])
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        return False
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=PASSWORD_CONFIG['hash_workers'],
+                                           thread_name_prefix="bcrypt")
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the hashing threads; the next hash starts a fresh pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _run(func, *args):
+    if not PASSWORD_CONFIG['hash_workers']:
+        return func(*args)
+    with _pending:
+        return _get_pool().submit(func, *args).result()
+
+
+def hash_password(password, rounds=None):
+    """Hash a password with bcrypt at the configured cost"""
+    return _run(_hashpw, password.encode('utf-8'), rounds or PASSWORD_CONFIG['bcrypt_rounds'])
+
+
+def verify_password(password, hashed):
+    """Verify a password against its hash"""
+    return _run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed):
+    """Return the cost factor of a bcrypt hash such as $2b$12$..., or None if it is not one"""
+    parts = hashed.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed, rounds=None):
+    """True when a hash was made at a different cost than the current policy"""
+    return hash_rounds(hashed) != (rounds or PASSWORD_CONFIG['bcrypt_rounds'])
@@ -1,14 +1,31 @@
+import math
 import tkinter as tk
-from tkinter import ttk, messagebox
-from geopy.geocoders import Nominatim
-from database import add_parking_space, get_all_parking_spaces, update_request_status, generate_bill, get_provider_requests
-from map_view import MapView
+from tkinter import ttk, messagebox, filedialog
+from background import BackgroundExecutor
+from geocode_cache import get_geocoder
 from database import (
+    BillRejectedError,
     add_parking_space,
-    get_all_parking_spaces,
-    update_request_status,
-    generate_bill
+    generate_bill,
+    get_changes_since,
+    get_parking_spaces_in_bbox,
+    get_provider_requests_page,
+    update_pending_requests,
+    update_request_status
 )
+from map_view import MapView
+from notifications import NotificationListener, provider_topic
+from viewport_loader import ViewportLoader
+from space_import import import_parking_spaces
+
+
+# Parking requests fetched per page as the requests list is scrolled
+REQUESTS_PAGE_SIZE = 50
+
+# Polling interval while the notification broker is unreachable
+CHANGE_POLL_MS = 5000
+# Safety poll while connected, in case a notification is lost
+CONNECTED_POLL_MS = 60000
 
 
 class ProviderDashboard:
@@ -16,9 +33,18 @@ class ProviderDashboard:
         self.parent = parent
         self.user_data = user_data
         self.logout_callback = logout_callback
-        self.geolocator = Nominatim(user_agent="parking_app")
+        self.geocoder = get_geocoder()
+        self.executor = BackgroundExecutor(self.parent, on_busy_change=self.show_loading)
         self.create_widgets()
         self.load_requests()
+
+        # Status changes are pushed; the list fetches deltas only when notified
+        self.notifications = NotificationListener(
+            self.frame,
+            [provider_topic(self.user_data['id'])],
+            lambda topic, event: self.refresh_requests()
+        )
+        self.frame.after(CHANGE_POLL_MS, self.poll_request_changes)
         self.load_parking_spaces()
 
     def create_widgets(self):
@@ -37,6 +63,10 @@ class ProviderDashboard:
         )
         header.grid(row=0, column=0, columnspan=2, pady=20)
 
+        # Shown while background queries are running
+        self.loading_label = ttk.Label(self.frame, text="", foreground="gray")
+        self.loading_label.grid(row=0, column=0, sticky="w", pady=20, padx=10)
+
         # Left Side - Add Parking Space Section
         left_frame = ttk.Frame(self.frame)
         left_frame.grid(row=1, column=0, sticky="nsew", padx=10)
@@ -71,7 +101,11 @@ class ProviderDashboard:
 
         # Add Space Button
         add_button = ttk.Button(add_space_frame, text="Add Space", command=self.add_space)
-        add_button.grid(row=4, column=0, columnspan=2, pady=10)
+        add_button.grid(row=4, column=0, pady=10)
+
+        # Bulk import from a CSV/JSON file
+        import_button = ttk.Button(add_space_frame, text="Import Spaces...", command=self.import_spaces)
+        import_button.grid(row=4, column=1, pady=10)
 
         # Map Frame
         self.map_frame = ttk.LabelFrame(left_frame, text="Parking Spaces Map")
@@ -84,6 +118,15 @@ class ProviderDashboard:
         # Set default position (Bangalore coordinates - change as needed)
         self.map_view.set_position(12.9716, 77.5946)
 
+        # Only this provider's spaces in the visible area are loaded
+        self.viewport_loader = ViewportLoader(
+            self.map_view,
+            self.executor,
+            lambda *bbox: get_parking_spaces_in_bbox(*bbox, provider_id=self.user_data['id']),
+            self.show_parking_spaces
+        )
+        self.viewport_loader.start()
+
         # Right Side - Requests and Actions
         right_frame = ttk.Frame(self.frame)
         right_frame.grid(row=1, column=1, sticky="nsew", padx=10)
@@ -93,10 +136,13 @@ class ProviderDashboard:
         requests_frame.pack(fill="both", expand=True)
 
         # Requests Treeview
+        tree_frame = ttk.Frame(requests_frame)
+        tree_frame.pack(fill="both", expand=True, pady=5)
         self.requests_tree = ttk.Treeview(
-            requests_frame,
+            tree_frame,
             columns=("ID", "User", "Vehicle", "Duration", "Status"),
             show="headings",
+            selectmode="extended",  # Ctrl/Shift-click to accept or deny several at once
             height=10
         )
 
@@ -114,7 +160,16 @@ class ProviderDashboard:
         self.requests_tree.column("Duration", width=100)
         self.requests_tree.column("Status", width=100)
 
-        self.requests_tree.pack(fill="both", expand=True, pady=5)
+        # Requests are loaded a page at a time as the list is scrolled
+        self.requests_cursor = None
+        self.requests_head = None
+        self.requests_loading = False
+        self.changes_version = None
+        requests_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.requests_tree.yview)
+        self.requests_tree.configure(yscrollcommand=lambda first, last: self.on_requests_scrolled(
+            requests_scrollbar, first, last))
+        requests_scrollbar.pack(side="right", fill="y")
+        self.requests_tree.pack(side="left", fill="both", expand=True)
 
         # Request Action Buttons
         btn_frame = ttk.Frame(requests_frame)
@@ -122,13 +177,13 @@ class ProviderDashboard:
 
         ttk.Button(
             btn_frame,
-            text="Accept Request",
+            text="Accept Selected",
             command=self.accept_request
         ).pack(side="left", padx=5)
 
         ttk.Button(
             btn_frame,
-            text="Deny Request",
+            text="Deny Selected",
             command=self.deny_request
         ).pack(side="left", padx=5)
 
@@ -146,6 +201,11 @@ class ProviderDashboard:
         )
         logout_btn.grid(row=0, column=1, sticky="e", pady=20, padx=10)
 
+    def show_loading(self, busy):
+        """Toggle the loading indicator while background work is pending"""
+        if hasattr(self, 'loading_label'):
+            self.loading_label.config(text="Loading..." if busy else "")
+
     def add_space(self):
         """Add a new parking space"""
         address = self.address_var.get().strip()
@@ -162,94 +222,189 @@ class ProviderDashboard:
 
         description = self.description_var.get().strip()
 
-        # Geocode address
-        try:
-            location = self.geolocator.geocode(address)
+        def geocode_and_add():
+            # Runs on a worker thread: geocode address, then add to database
+            try:
+                location = self.geocoder.geocode(address)
+            except Exception as e:
+                raise Exception(f"Geocoding error: {str(e)}")
             if location is None:
-                messagebox.showerror("Error", "Could not find location")
-                return
-        except Exception as e:
-            messagebox.showerror("Error", f"Geocoding error: {str(e)}")
-            return
+                raise Exception("Could not find location")
 
-        # Add to database
-        if add_parking_space(
+            latitude, longitude = location
+            added = add_parking_space(
                 self.user_data['id'],
                 address,
-                location.latitude,
-                location.longitude,
+                latitude,
+                longitude,
                 capacity,
                 rate,
                 description
-        ):
+            )
+            return added, latitude, longitude
+
+        def on_added(result):
+            added, latitude, longitude = result
+            if not added:
+                messagebox.showerror("Error", "Failed to add parking space")
+                return
+
             messagebox.showinfo("Success", "Parking space added successfully!")
             self.clear_space_fields()
 
-            # Add marker to map
-            self.map_view.add_marker(
-                location.latitude,
-                location.longitude,
-                f"Address: {address}\nRate: ${rate}/hr\nCapacity: {capacity}"
-            )
-
-            # Center map on new marker
-            self.map_view.set_position(location.latitude, location.longitude)
+            # Center map on new space
+            self.map_view.set_position(latitude, longitude)
 
-            # Reload parking spaces
+            # Reload parking spaces; the new space's marker comes in with the diff
             self.load_parking_spaces()
-        else:
-            messagebox.showerror("Error", "Failed to add parking space")
+
+        self.executor.submit(
+            None,
+            geocode_and_add,
+            on_success=on_added,
+            on_error=lambda e: messagebox.showerror("Error", str(e))
+        )
+
+    def import_spaces(self):
+        """Bulk import parking spaces from a CSV or JSON file"""
+        path = filedialog.askopenfilename(
+            title="Import Parking Spaces",
+            filetypes=[("Spreadsheet or JSON", "*.csv *.json *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        def on_imported(report):
+            message = report.summary()
+            if report.errors:
+                shown = report.errors[:10]
+                message += "\n\n" + "\n".join(f"Row {row}: {error}" for row, error in shown)
+                if len(report.errors) > len(shown):
+                    message += f"\n... and {len(report.errors) - len(shown)} more"
+            messagebox.showinfo("Import Complete", message)
+            if report.inserted:
+                self.load_parking_spaces()
+
+        self.executor.submit(
+            None,
+            import_parking_spaces,
+            self.user_data['id'],
+            path,
+            geocoder=self.geocoder,
+            on_success=on_imported,
+            on_error=lambda e: messagebox.showerror("Error", f"Import failed: {e}")
+        )
 
     def load_parking_spaces(self):
-        """Load and display all parking spaces on the map"""
-        # Clear existing markers
-        self.map_view.clear_markers()
+        """Reload this provider's parking spaces in the current map area"""
+        self.viewport_loader.refresh()
 
-        # Load spaces from database
-        spaces = get_all_parking_spaces()
+    def show_parking_spaces(self, spaces):
+        # Markers keyed by space id; only changed ones are redrawn
+        markers = {}
         for space in spaces:
-            if space['provider_id'] == self.user_data['id']:
-                # Add marker to map
-                self.map_view.add_marker(
-                    space['latitude'],
-                    space['longitude'],
-                    f"Address: {space['address']}\nRate: ${space['rate_per_hour']}/hr\nCapacity: {space['capacity']}"
-                )
+            markers[space['id']] = (
+                space['latitude'],
+                space['longitude'],
+                f"Address: {space['address']}\nRate: ${space['rate_per_hour']}/hr\nCapacity: {space['capacity']}"
+            )
+
+        self.map_view.set_markers(markers)
 
     def load_requests(self):
-        """Load parking requests from database"""
+        """Reload parking requests from the first (newest) page"""
+        self.requests_loading = True
+        self.executor.submit(
+            'requests',
+            self.fetch_first_requests_page,
+            on_success=lambda page: self.show_requests(*page),
+            on_error=self.on_requests_error
+        )
+
+    def fetch_first_requests_page(self):
+        """Read the change version, then the newest page (runs on a worker thread)"""
+        # Version first: anything changed while the page is read is picked up by the next poll
+        changes = get_changes_since(None, provider_id=self.user_data['id'])
+        requests, next_cursor = get_provider_requests_page(self.user_data['id'], limit=REQUESTS_PAGE_SIZE)
+        return (changes['version'] if changes else None), requests, next_cursor
+
+    def refresh_requests(self):
+        """Fetch only the requests changed since the last load or refresh"""
+        if self.changes_version is None:
+            self.load_requests()
+            return
+        self.executor.submit(
+            'request_changes',
+            get_changes_since,
+            self.changes_version,
+            provider_id=self.user_data['id'],
+            on_success=self.apply_request_changes
+        )
+
+    def poll_request_changes(self, waited_ms=0):
+        if not self.frame.winfo_exists():
+            return
+        waited_ms += CHANGE_POLL_MS
+        if (not self.notifications.connected or waited_ms >= CONNECTED_POLL_MS) and not self.requests_loading:
+            self.refresh_requests()
+            waited_ms = 0
+        self.frame.after(CHANGE_POLL_MS, self.poll_request_changes, waited_ms)
+
+    def apply_request_changes(self, changes):
+        """Update changed rows in place and add new requests at the top"""
+        if changes is None:
+            return
+        self.changes_version = changes['version']
+
+        new_pending = 0
+        for request in changes['requests']:
+            iid = str(request['id'])
+            if self.requests_tree.exists(iid):
+                self.requests_tree.item(iid, values=self.request_values(request), tags=self.request_tags(request))
+            elif self.requests_head is None or (request['request_time'], request['id']) > self.requests_head:
+                # Newer than anything listed; older rows arrive fresh with their page
+                self.requests_tree.insert("", 0, iid=iid, values=self.request_values(request),
+                                          tags=self.request_tags(request))
+                self.requests_head = (request['request_time'], request['id'])
+                new_pending += request['status'] == 'PENDING'
+
+        if new_pending:
+            messagebox.showinfo("New Requests", f"You have {new_pending} new pending parking request(s)")
+
+    def load_more_requests(self):
+        """Append the next page of older requests, if there is one"""
+        if self.requests_loading or self.requests_cursor is None:
+            return
+        self.requests_loading = True
+        self.executor.submit(
+            'requests',
+            get_provider_requests_page,
+            self.user_data['id'],
+            after=self.requests_cursor,
+            limit=REQUESTS_PAGE_SIZE,
+            on_success=lambda page: self.append_requests(*page),
+            on_error=self.on_requests_error
+        )
+
+    def on_requests_error(self, error):
+        # Let the next scroll or poll try again instead of waiting on a page that never comes
+        self.requests_loading = False
+        messagebox.showerror("Error", f"Failed to load parking requests: {error}")
+
+    def on_requests_scrolled(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # Fetch the next page as the user nears the bottom of what is loaded
+        if float(last) >= 0.9:
+            self.load_more_requests()
+
+    def show_requests(self, version, requests, next_cursor):
         # Clear existing items
         for item in self.requests_tree.get_children():
             self.requests_tree.delete(item)
 
-        # Load requests from database
-        requests = get_provider_requests(self.user_data['id'])
-
-        # Update the treeview with requests
-        for request in requests:
-            status_color = {
-                'PENDING': 'orange',
-                'ACCEPTED': 'green',
-                'DENIED': 'red'
-            }.get(request['status'], 'black')
-
-            self.requests_tree.insert(
-                "",
-                "end",
-                values=(
-                    request['id'],
-                    request['user_name'],
-                    request['vehicle_number'],
-                    f"{request['duration_hours']} hrs",
-                    request['status']
-                ),
-                tags=(status_color,)
-            )
-
-        # Configure tag colors
-        self.requests_tree.tag_configure('orange', foreground='orange')
-        self.requests_tree.tag_configure('green', foreground='green')
-        self.requests_tree.tag_configure('red', foreground='red')
+        self.changes_version = version
+        self.requests_head = (requests[0]['request_time'], requests[0]['id']) if requests else None
+        self.append_requests(requests, next_cursor)
 
         # If there are pending requests, show a notification
         pending_requests = [r for r in requests if r['status'] == 'PENDING']
@@ -259,47 +414,98 @@ class ProviderDashboard:
                 f"You have {len(pending_requests)} pending parking request(s)"
             )
 
-    def accept_request(self):
-        """Accept selected parking request"""
-        selected_item = self.requests_tree.selection()
-        if not selected_item:
-            messagebox.showwarning("Warning", "Please select a request")
-            return
+    def append_requests(self, requests, next_cursor):
+        self.requests_cursor = next_cursor
+        self.requests_loading = False
 
-        request_id = self.requests_tree.item(selected_item[0])['values'][0]
+        # Update the treeview with requests, keyed by request id for in-place updates
+        for request in requests:
+            iid = str(request['id'])
+            if not self.requests_tree.exists(iid):
+                self.requests_tree.insert(
+                    "",
+                    "end",
+                    iid=iid,
+                    values=self.request_values(request),
+                    tags=self.request_tags(request)
+                )
 
-        # Check if request is already processed
-        current_status = self.requests_tree.item(selected_item[0])['values'][4]
-        if current_status != 'PENDING':
-            messagebox.showinfo("Info", f"Request is already {current_status}")
-            return
+        # Configure tag colors
+        self.requests_tree.tag_configure('orange', foreground='orange')
+        self.requests_tree.tag_configure('green', foreground='green')
+        self.requests_tree.tag_configure('red', foreground='red')
 
-        if update_request_status(request_id, 'ACCEPTED'):
-            messagebox.showinfo("Success", "Request accepted")
-            self.load_requests()  # Refresh the list
-        else:
-            messagebox.showerror("Error", "Failed to accept request")
+    @staticmethod
+    def request_values(request):
+        return (
+            request['id'],
+            request['user_name'],
+            request['vehicle_number'],
+            f"{request['duration_hours']} hrs",
+            request['status']
+        )
+
+    @staticmethod
+    def request_tags(request):
+        status_color = {
+            'PENDING': 'orange',
+            'ACCEPTED': 'green',
+            'DENIED': 'red'
+        }.get(request['status'], 'black')
+        return (status_color,)
+
+    def accept_request(self):
+        """Accept the selected parking requests"""
+        self.decide_selected_requests('ACCEPTED', 'accepted')
 
     def deny_request(self):
-        """Deny selected parking request"""
-        selected_item = self.requests_tree.selection()
-        if not selected_item:
+        """Deny the selected parking requests"""
+        self.decide_selected_requests('DENIED', 'denied')
+
+    def decide_selected_requests(self, status, verb):
+        """Apply status to every selected PENDING request in one batch, then refresh once"""
+        selected_items = self.requests_tree.selection()
+        if not selected_items:
             messagebox.showwarning("Warning", "Please select a request")
             return
 
-        request_id = self.requests_tree.item(selected_item[0])['values'][0]
-
-        # Check if request is already processed
-        current_status = self.requests_tree.item(selected_item[0])['values'][4]
-        if current_status != 'PENDING':
-            messagebox.showinfo("Info", f"Request is already {current_status}")
+        # Skip requests that are already processed
+        rows = [self.requests_tree.item(item)['values'] for item in selected_items]
+        request_ids = [row[0] for row in rows if row[4] == 'PENDING']
+        if not request_ids:
+            if len(rows) == 1:
+                messagebox.showinfo("Info", f"Request is already {rows[0][4]}")
+            else:
+                messagebox.showinfo("Info", "None of the selected requests are pending")
             return
 
-        if update_request_status(request_id, 'DENIED'):
-            messagebox.showinfo("Success", "Request denied")
-            self.load_requests()  # Refresh the list
-        else:
-            messagebox.showerror("Error", "Failed to deny request")
+        def on_updated(outcomes):
+            if outcomes is None:
+                messagebox.showerror("Error", "Failed to update requests")
+                return
+
+            updated = [request_id for request_id, outcome in outcomes.items() if outcome == 'UPDATED']
+            skipped = [f"#{request_id}: {outcome.replace('_', ' ').lower()}"
+                       for request_id, outcome in outcomes.items() if outcome != 'UPDATED']
+            if len(outcomes) == 1 and updated:
+                message = f"Request {verb}"
+            else:
+                message = f"{len(updated)} of {len(outcomes)} requests {verb}"
+            if skipped:
+                message += "\n\nNot changed:\n" + "\n".join(skipped)
+            messagebox.showinfo("Success" if updated else "Info", message)
+
+            if updated:
+                self.refresh_requests()  # One refresh for the whole batch
+
+        self.executor.submit(
+            None,
+            update_pending_requests,
+            request_ids,
+            status,
+            provider_id=self.user_data['id'],
+            on_success=on_updated
+        )
 
     def handle_unpark_payment(self, request_id):
         try:
@@ -315,21 +521,16 @@ class ProviderDashboard:
             # Show payment confirmation
             if messagebox.askyesno("Payment Confirmation",
                                    f"Confirm payment of ₹{amount} for {duration} hours?"):
-                # Update request status
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    UPDATE parking_requests 
-                    SET status = 'COMPLETED', amount_paid = %s 
-                    WHERE id = %s
-                """, (amount, request_id))
+                def on_completed(updated):
+                    if not updated:
+                        messagebox.showerror("Error", "Failed to process payment")
+                        return
+                    messagebox.showinfo("Success", "Payment received and recorded!")
+                    self.refresh_requests()
 
-                self.conn.commit()
-
-                # Show success message
-                messagebox.showinfo("Success", "Payment received and recorded!")
-
-                # Refresh the requests list
-                self.load_requests()
+                # Completing the request frees its slot on the space
+                self.executor.submit(None, update_request_status, request_id, 'COMPLETED',
+                                     on_success=on_completed)
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to process payment: {str(e)}")
@@ -356,18 +557,28 @@ class ProviderDashboard:
         def submit_bill():
             try:
                 amount = float(amount_var.get())
+            except ValueError:
+                amount = None
+            if amount is None or not math.isfinite(amount) or amount <= 0:
+                messagebox.showerror("Error", "Please enter a valid amount")
+                return
 
-                # Debugging output
-                print(f"Generating bill for Request ID: {request_id}, Amount: {amount}")
-
-                if generate_bill(request_id, amount):
+            def on_generated(generated):
+                if generated:
                     messagebox.showinfo("Success", "Bill generated successfully")
                     dialog.destroy()
-                    self.load_requests()
+                    self.refresh_requests()
                 else:
                     messagebox.showerror("Error", "Failed to generate bill")
-            except ValueError:
-                messagebox.showerror("Error", "Please enter a valid amount")
+
+            def on_error(e):
+                if isinstance(e, BillRejectedError):
+                    messagebox.showwarning("Cannot Bill", str(e))
+                else:
+                    messagebox.showerror("Error", f"Failed to generate bill: {e}")
+
+            self.executor.submit(None, generate_bill, request_id, amount,
+                                 on_success=on_generated, on_error=on_error)
 
         ttk.Button(dialog, text="Generate", command=submit_bill).pack(pady=20)
 
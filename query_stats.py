@@ -0,0 +1,263 @@
+"""
+Query instrumentation for the data layer.
+
+Every statement run through a pooled connection's cursor is timed and
+recorded under (calling function, normalized SQL). Each record holds a
+latency histogram, row and error counts. The time spent waiting to check a
+connection out of the pool is recorded per calling function as well.
+Statements slower than QUERY_STATS_CONFIG['slow_query_ms'] are written to
+the slow-query log.
+
+    from query_stats import dump_query_stats
+    dump_query_stats()            # table sorted by total time
+"""
+import atexit
+import bisect
+import logging
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from config import QUERY_STATS_CONFIG
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BUCKET_BOUNDS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Frames that belong to the plumbing between a data-access function and the driver
+_PLUMBING = {
+    ('query_stats', None),
+    ('contextlib', None),
+    ('database', 'create_db_connection'),
+    ('database', 'get_connection'),
+    ('database', '__getattr__'),
+}
+
+slow_query_logger = logging.getLogger('parking.slow_queries')
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets: constant memory, percentiles accurate to a bucket"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS_MS[index], self.max_ms) if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms
+        }
+
+
+class StatementStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class QueryStats:
+    """Thread-safe registry of statement and connection-acquire statistics"""
+
+    def __init__(self, slow_query_ms=200):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._statements = {}  # (tag, sql) -> StatementStats
+        self._acquires = {}    # tag -> LatencyHistogram
+
+    def record_statement(self, tag, sql, elapsed_ms, rows=0, error=None):
+        with self._lock:
+            stats = self._statements.get((tag, sql))
+            if stats is None:
+                stats = self._statements[(tag, sql)] = StatementStats()
+            stats.latency.add(elapsed_ms)
+            stats.rows += rows
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = str(error)
+
+        if elapsed_ms >= self.slow_query_ms:
+            # Parameters are left out: they can hold password hashes and payment details
+            slow_query_logger.warning("%.1f ms in %s%s: %s", elapsed_ms, tag,
+                                      " (failed)" if error is not None else "", sql)
+
+    def add_rows(self, tag, sql, rows):
+        with self._lock:
+            stats = self._statements.get((tag, sql))
+            if stats is not None:
+                stats.rows += rows
+
+    def record_acquire(self, tag, elapsed_ms):
+        with self._lock:
+            histogram = self._acquires.get(tag)
+            if histogram is None:
+                histogram = self._acquires[tag] = LatencyHistogram()
+            histogram.add(elapsed_ms)
+
+    def snapshot(self):
+        """Return {'statements': [...], 'acquires': [...]} as plain dicts"""
+        with self._lock:
+            statements = [
+                dict(tag=tag, sql=sql, rows=stats.rows, errors=stats.errors,
+                     last_error=stats.last_error, **stats.latency.summary())
+                for (tag, sql), stats in self._statements.items()
+            ]
+            acquires = [dict(tag=tag, **histogram.summary()) for tag, histogram in self._acquires.items()]
+        return {'statements': statements, 'acquires': acquires}
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._acquires.clear()
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Collapse whitespace and IN (...) lists so one statement shape gets one record"""
+    sql = re.sub(r"\s+", " ", sql).strip()
+    sql = re.sub(r"IN \((?:%s|\?)(?:, ?(?:%s|\?))*\)", "IN (...)", sql)
+    return sql
+
+
+def caller_tag(depth=2):
+    """Return 'module.function' for the nearest caller outside the database plumbing"""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?').rpartition('.')[2]
+        function = frame.f_code.co_name
+        if (module, None) not in _PLUMBING and (module, function) not in _PLUMBING:
+            return f"{module}.{function}"
+        frame = frame.f_back
+    return '?'
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times execute/executemany and counts the rows fetched"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._last = None  # (tag, sql) of the statement whose rows are being fetched
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count_rows(1)
+            yield row
+
+    def _run(self, method, sql, params, rows):
+        tag, normalized = caller_tag(3), normalize_sql(sql)
+        self._last = (tag, normalized)
+        started = time.perf_counter()
+        try:
+            result = method(sql, params)
+        except Exception as e:
+            self._stats.record_statement(tag, normalized, (time.perf_counter() - started) * 1000, error=e)
+            raise
+        if rows is None:
+            # DML reports affected rows; SELECT rows are counted as they are fetched
+            rows = max(self._cursor.rowcount, 0) if self._cursor.description is None else 0
+        self._stats.record_statement(tag, normalized, (time.perf_counter() - started) * 1000, rows)
+        return result
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params, None)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        return self._run(self._cursor.executemany, sql, seq_of_params, len(seq_of_params))
+
+    def _count_rows(self, rows):
+        if self._last is not None and rows:
+            self._stats.add_rows(*self._last, rows)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._count_rows(row is not None)
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._count_rows(len(rows))
+        return rows
+
+
+_query_stats = QueryStats(QUERY_STATS_CONFIG['slow_query_ms'])
+
+
+def get_query_stats():
+    """Return the shared QueryStats, or None when instrumentation is switched off"""
+    return _query_stats if QUERY_STATS_CONFIG['enabled'] else None
+
+
+def reset_query_stats():
+    _query_stats.reset()
+
+
+def dump_query_stats(file=None, sort_by='total_ms', limit=None):
+    """Print per-statement and connection-acquire statistics, slowest first"""
+    file = file or sys.stdout
+    snapshot = _query_stats.snapshot()
+    statements = sorted(snapshot['statements'], key=lambda s: s[sort_by], reverse=True)[:limit]
+
+    print(f"{'function':<40} {'calls':>7} {'errors':>6} {'rows':>8} {'avg ms':>8} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7} {'max ms':>8} {'total ms':>10}", file=file)
+    for s in statements:
+        print(f"{s['tag'][:40]:<40} {s['count']:>7} {s['errors']:>6} {s['rows']:>8} {s['avg_ms']:>8.2f} "
+              f"{s['p50_ms']:>7.2f} {s['p95_ms']:>7.2f} {s['p99_ms']:>7.2f} {s['max_ms']:>8.2f} "
+              f"{s['total_ms']:>10.1f}", file=file)
+        print(f"    {s['sql'][:110]}", file=file)
+        if s['last_error']:
+            print(f"    last error: {s['last_error']}", file=file)
+
+    acquires = sorted(snapshot['acquires'], key=lambda s: s['total_ms'], reverse=True)
+    if acquires:
+        print(f"\n{'connection acquire by function':<40} {'count':>7} {'avg ms':>8} {'p95':>7} {'max ms':>8}", file=file)
+        for s in acquires:
+            print(f"{s['tag'][:40]:<40} {s['count']:>7} {s['avg_ms']:>8.2f} {s['p95_ms']:>7.2f} "
+                  f"{s['max_ms']:>8.2f}", file=file)
+
+
+if QUERY_STATS_CONFIG['slow_query_log'] and not slow_query_logger.handlers:
+    _handler = logging.FileHandler(QUERY_STATS_CONFIG['slow_query_log'], delay=True)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.propagate = False
+
+if QUERY_STATS_CONFIG['enabled'] and QUERY_STATS_CONFIG['dump_at_exit']:
+    atexit.register(dump_query_stats)
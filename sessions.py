@@ -0,0 +1,243 @@
+"""
+Login sessions with signed tokens.
+
+A credential login (verify_user, which runs bcrypt) creates a session. The
+client gets back a token of the form
+
+    <session id>.<expiry>.<HMAC-SHA256 signature>
+
+Presenting the token again takes an HMAC check plus one lookup in the
+session store, which is microseconds where bcrypt takes hundreds of
+milliseconds. Forged or expired tokens are rejected before the store is
+consulted. Logging out deletes the session, so a revoked token stops working
+even though its signature is still valid.
+
+SESSION_CONFIG['store'] picks the store. 'memory' is per process, LRU-evicted
+at max_sessions. 'sqlite' is a file shared by every process on the host (API
+workers, desktop restarts). Expired sessions are purged from either store as
+new ones are created.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from config import SESSION_CONFIG
+
+# Fields of the verify_user result kept in a session
+SESSION_USER_FIELDS = ('id', 'username', 'user_type', 'full_name')
+
+_PURGE_INTERVAL_SECONDS = 60
+
+
+class MemorySessionStore:
+    """Sessions in a dict, least recently used evicted first once max_sessions is reached"""
+
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session id -> (user, expires_at)
+        self._last_purge = time.monotonic()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session_id, user, expires_at):
+        with self._lock:
+            self._sessions[session_id] = (user, expires_at)
+            if (len(self._sessions) > self.max_sessions
+                    or time.monotonic() - self._last_purge > _PURGE_INTERVAL_SECONDS):
+                self._purge()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _purge(self):
+        now = time.time()
+        for session_id in [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        self._last_purge = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file, so every process on the host sees the same logins"""
+
+    def __init__(self, path='sessions.sqlite3', max_sessions=10000):
+        self.path = path
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    user TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT user, expires_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, session_id, user, expires_at):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO sessions (id, user, expires_at) VALUES (?, ?, ?)",
+                         (session_id, json.dumps(user), expires_at))
+            if time.monotonic() - self._last_purge > _PURGE_INTERVAL_SECONDS:
+                self._purge(conn)
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _purge(self, conn):
+        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        # Over the cap: drop the sessions closest to expiry
+        conn.execute("""
+            DELETE FROM sessions WHERE id IN (
+                SELECT id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_sessions,))
+        self._last_purge = time.monotonic()
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+_store = None
+_secret = None
+_lock = threading.Lock()
+
+
+def get_session_store():
+    """Return the session store selected by SESSION_CONFIG, creating it on first use"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                if SESSION_CONFIG['store'] == 'sqlite':
+                    _store = SQLiteSessionStore(SESSION_CONFIG['path'], SESSION_CONFIG['max_sessions'])
+                else:
+                    _store = MemorySessionStore(SESSION_CONFIG['max_sessions'])
+    return _store
+
+
+def _get_secret():
+    """
+    Signing key from SESSION_CONFIG['secret_file'], created on first use and
+    shared by all processes. The key is written to a temporary file and
+    hard-linked into place, so a concurrent reader never sees a partial key.
+    """
+    global _secret
+    if _secret is None:
+        path = SESSION_CONFIG['secret_file']
+        if not os.path.exists(path):
+            # mkstemp creates the file with mode 0600
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.session-secret-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(secrets.token_bytes(32))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.link(temp_path, path)
+            except FileExistsError:
+                pass  # another process created it first; use theirs
+            finally:
+                os.unlink(temp_path)
+        with open(path, 'rb') as f:
+            secret = f.read()
+        if len(secret) < 32:
+            raise RuntimeError(f"Session secret in {path} is shorter than 32 bytes; delete it to generate a new one")
+        _secret = secret
+    return _secret
+
+
+def _sign(payload):
+    digest = hmac.new(_get_secret(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def create_session(user, ttl_seconds=None):
+    """Start a session for a user returned by verify_user and return its token"""
+    session_id = secrets.token_urlsafe(18)
+    expires_at = int(time.time() + (ttl_seconds or SESSION_CONFIG['ttl_seconds']))
+    get_session_store().put(session_id, {field: user[field] for field in SESSION_USER_FIELDS}, expires_at)
+    payload = f"{session_id}.{expires_at}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def validate_token(token):
+    """Return the user dict for a live session token, or None"""
+    try:
+        session_id, expires_at, signature = token.split('.')
+        if int(expires_at) <= time.time():
+            return None
+    except (AttributeError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _sign(f"{session_id}.{expires_at}")):
+        return None
+
+    session = get_session_store().get(session_id)
+    if session is None or session[1] <= time.time():
+        return None
+    return dict(session[0])
+
+
+def revoke_session(token):
+    """End the session behind a token (logout); unknown tokens are ignored"""
+    if isinstance(token, str) and token.count('.') == 2:
+        get_session_store().delete(token.split('.')[0])
+
+
+def save_token(token):
+    """Remember the desktop app's session token so the next start can skip the login form"""
+    path = SESSION_CONFIG['token_file']
+    if path:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+
+
+def load_token():
+    path = SESSION_CONFIG['token_file']
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except (TypeError, OSError):
+        return None
+
+
+def forget_token():
+    path = SESSION_CONFIG['token_file']
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+
+class SpaceCatalog:
+    """
+    In-memory read-through cache of parking spaces keyed by space id, for
+    by-id lookups. Area queries belong in SQL, where the coordinate index
+    filters rows instead of scanning every cached space.
+
+    Each space is loaded on its first lookup and again once it is older than
+    ttl_seconds, which also picks up writes made by other processes. Writes
+    made in this process invalidate just the spaces they touch.
+    """
+
+    def __init__(self, load, ttl_seconds=300):
+        """
+        load(space_ids) returns a list of space dicts (with an 'id' key) for
+        the given ids. It runs without the catalog lock, so a slow load never
+        holds up lookups of other spaces.
+        """
+        self.load = load
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._spaces = {}  # space id -> (loaded_at, space)
+        # Bumped by every invalidation, so a load that raced one is not cached
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'rows_loaded': 0, 'invalidations': 0, 'expirations': 0}
+
+    def get(self, space_id):
+        """Return a copy of one space, or None if there is no such space"""
+        space_id = int(space_id)
+        with self._lock:
+            entry = self._spaces.get(space_id)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl_seconds:
+                    self._stats['hits'] += 1
+                    return dict(entry[1])
+                del self._spaces[space_id]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        # Unknown ids are not cached: the space may be added by another process
+        loaded = self.load([space_id])
+        space = loaded[0] if loaded else None
+        with self._lock:
+            self._stats['rows_loaded'] += len(loaded)
+            if space is not None and generation == self._generation:
+                self._spaces[space_id] = (time.monotonic(), space)
+        return dict(space) if space is not None else None
+
+    def invalidate(self, space_ids=None):
+        """Forget changed spaces, or every space when space_ids is None"""
+        with self._lock:
+            self._stats['invalidations'] += 1
+            self._generation += 1
+            if space_ids is None:
+                self._spaces = {}
+            else:
+                for space_id in space_ids:
+                    self._spaces.pop(int(space_id), None)
+
+    def stats(self):
+        """Return hit/miss and reload counters and the number of cached spaces"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['spaces'] = len(self._spaces)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,224 @@
+"""
+Bulk import of parking spaces from a CSV or JSON file.
+
+CSV and JSON Lines files are read as a stream and processed in chunks; a
+.json list is loaded whole, so prefer .jsonl for very large files. Within a
+chunk, rows
+without coordinates are geocoded concurrently through the shared cached,
+rate-limited geocoder. The chunk is then inserted with one executemany in a
+single transaction. A chunk the database rejects is retried row by row so
+that every bad row gets its own error.
+
+    python space_import.py PROVIDER_ID spaces.csv
+
+CSV files need a header row. JSON files hold a list of objects, and .jsonl
+files hold one object per line. The fields are address, capacity and
+rate_per_hour, plus optional latitude, longitude and description.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SPACE_IMPORT_CONFIG
+from database import add_parking_space, add_parking_spaces
+from geocode_cache import get_geocoder
+
+
+class ImportReport:
+    """Running totals for one import, with the errors keyed by source row number"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.inserted = 0
+        self.geocoded = 0
+        self.errors = []  # (row_number, message)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def summary(self):
+        return (f"{self.inserted} of {self.rows_read} spaces imported in {self.elapsed:.1f}s "
+                f"({self.rows_per_second:.0f} rows/s, {self.geocoded} geocoded, "
+                f"{len(self.errors)} errors)")
+
+
+def read_rows(path):
+    """
+    Yield (row_number, record) for each record in a CSV, JSON or JSON Lines
+    file. JSON Lines records are yielded as the raw line and decoded by
+    parse_row, so a malformed line is reported as that row's error.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if extension == '.csv':
+            # Row 1 is the header
+            for row_number, row in enumerate(csv.DictReader(f), start=2):
+                yield row_number, row
+        elif extension == '.jsonl':
+            for row_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield row_number, line
+        elif extension == '.json':
+            records = json.load(f)
+            if not isinstance(records, list):
+                raise ValueError("JSON import file must contain a list of parking spaces")
+            for row_number, record in enumerate(records, start=1):
+                yield row_number, record
+        else:
+            raise ValueError(f"Unsupported import file type: {extension or path}")
+
+
+def parse_row(row):
+    """
+    Validate one record and return (address, latitude, longitude, capacity,
+    rate_per_hour, description). latitude and longitude are None when the
+    row has no coordinates. Raises ValueError for an invalid row.
+    """
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(row, dict):
+        raise ValueError("record is not an object")
+
+    def field(name):
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        return None if value in (None, '') else value
+
+    address = field('address')
+    if not address:
+        raise ValueError("address is required")
+
+    # Parse through float either way so CSV text and JSON numbers agree
+    try:
+        capacity = float(field('capacity'))
+        rate = float(field('rate_per_hour'))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("capacity and rate_per_hour must be numbers")
+    if not (math.isfinite(capacity) and math.isfinite(rate)):
+        raise ValueError("capacity and rate_per_hour must be finite numbers")
+    if not capacity.is_integer():
+        raise ValueError("capacity must be a whole number")
+    capacity = int(capacity)
+    if capacity <= 0 or rate < 0:
+        raise ValueError("capacity must be positive and rate_per_hour not negative")
+
+    latitude, longitude = field('latitude'), field('longitude')
+    if (latitude is None) != (longitude is None):
+        raise ValueError("latitude and longitude must be given together")
+    if latitude is not None:
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("latitude and longitude must be numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("coordinates out of range")
+
+    return address, latitude, longitude, capacity, rate, field('description') or ''
+
+
+def _geocode_chunk(pool, geocoder, chunk, report):
+    """Fill in missing coordinates in place; rows that cannot be located become errors"""
+    # One lookup per distinct address, even if it repeats within the chunk
+    lookups = {}
+    for _, space in chunk:
+        if space[1] is None and space[0] not in lookups:
+            lookups[space[0]] = pool.submit(geocoder.geocode, space[0])
+
+    located = []
+    for row_number, space in chunk:
+        if space[1] is None:
+            try:
+                coordinates = lookups[space[0]].result()
+            except Exception as e:
+                report.add_error(row_number, f"geocoding failed: {e}")
+                continue
+            if coordinates is None:
+                report.add_error(row_number, "address could not be located")
+                continue
+            space = (space[0],) + tuple(coordinates) + space[3:]
+            report.geocoded += 1
+        located.append((row_number, space))
+    return located
+
+
+def _insert_chunk(provider_id, chunk, report):
+    if not chunk:
+        return
+    if add_parking_spaces(provider_id, [space for _, space in chunk]):
+        report.inserted += len(chunk)
+        return
+
+    # The batch was rolled back: retry row by row to find the offending rows
+    for row_number, space in chunk:
+        if add_parking_space(provider_id, *space):
+            report.inserted += 1
+        else:
+            report.add_error(row_number, "rejected by the database")
+
+
+def import_parking_spaces(provider_id, path, geocoder=None, chunk_size=None, workers=None, progress=None):
+    """
+    Import every parking space in the file for provider_id and return an
+    ImportReport. progress(report) is called after each chunk is committed,
+    on the calling thread.
+    """
+    geocoder = geocoder or get_geocoder()
+    chunk_size = chunk_size or SPACE_IMPORT_CONFIG['chunk_size']
+    workers = workers or SPACE_IMPORT_CONFIG['geocode_workers']
+    report = ImportReport()
+
+    def flush(chunk):
+        _insert_chunk(provider_id, _geocode_chunk(pool, geocoder, chunk, report), report)
+        report.elapsed = time.perf_counter() - report.started
+        if progress:
+            progress(report)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geocode') as pool:
+        chunk = []
+        for row_number, row in read_rows(path):
+            report.rows_read += 1
+            try:
+                chunk.append((row_number, parse_row(row)))
+            except ValueError as e:
+                report.add_error(row_number, str(e))
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        flush(chunk)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import parking spaces from a CSV or JSON file")
+    parser.add_argument('provider_id', type=int)
+    parser.add_argument('path')
+    parser.add_argument('--chunk-size', type=int, default=SPACE_IMPORT_CONFIG['chunk_size'])
+    parser.add_argument('--workers', type=int, default=SPACE_IMPORT_CONFIG['geocode_workers'])
+    args = parser.parse_args()
+
+    report = import_parking_spaces(
+        args.provider_id, args.path, chunk_size=args.chunk_size, workers=args.workers,
+        progress=lambda r: print(f"  {r.rows_read} rows read, {r.inserted} inserted, {r.rows_per_second:.0f} rows/s")
+    )
+    for row_number, message in report.errors:
+        print(f"Row {row_number}: {message}")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import math
+
+# Earth's radius in kilometers
+EARTH_RADIUS_KM = 6371
+
+# Web Mercator cannot represent the poles
+MAX_LATITUDE = 85.05112878
+
+# Widen boxes slightly so rounding never drops a point on the circle's edge
+BBOX_MARGIN = 1e-6
+
+
+def haversine_km(point1, point2):
+    """Great-circle distance in kilometers between two (lat, lon) points"""
+    lat1, lon1 = math.radians(point1[0]), math.radians(point1[1])
+    lat2, lon2 = math.radians(point2[0]), math.radians(point2[1])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_batch(center, latitudes, longitudes):
+    """
+    Distances in kilometers from center to every (latitude, longitude) pair.
+    Accepts any sequences of numbers (including Decimal) and returns a float64 array.
+    """
+    # Imported here so the data layer can use this module without loading NumPy
+    import numpy as np
+
+    lats = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lons = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lat0 = math.radians(float(center[0]))
+    lon0 = math.radians(float(center[1]))
+
+    a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    # Clip guards against a > 1 from floating point error for antipodal points
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def within_radius_batch(center, latitudes, longitudes, radius_km):
+    """Return (distances, mask) where mask marks points within radius_km of center"""
+    distances = haversine_batch(center, latitudes, longitudes)
+    return distances, distances <= radius_km
+
+
+def project(latitude, longitude):
+    """Project a coordinate onto the unit Web Mercator square (x, y in [0, 1))"""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = (longitude + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def unproject(x, y):
+    """Inverse of project: unit Web Mercator square back to (latitude, longitude)"""
+    longitude = x * 360.0 - 180.0
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return latitude, longitude
+
+
+def bounding_box(center, radius_km):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing every point within
+    radius_km of center. Longitude bounds are None when the circle touches a
+    pole or crosses the antimeridian, meaning no longitude filter applies.
+    """
+    lat, lon = float(center[0]), float(center[1])
+    angular = radius_km / EARTH_RADIUS_KM
+
+    dlat = math.degrees(angular) + BBOX_MARGIN
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, None, None
+
+    # Widest longitude span of the circle, reached off the centre latitude
+    dlon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat))))) + BBOX_MARGIN
+    min_lon = lon - dlon
+    max_lon = lon + dlon
+
+    if min_lon < -180.0 or max_lon > 180.0:
+        return min_lat, max_lat, None, None
+
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def bbox_where_clause(bbox, lat_column='latitude', lon_column='longitude'):
+    """Build an index-friendly SQL range predicate and its parameters for a bounding box"""
+    min_lat, max_lat, min_lon, max_lon = bbox
+    clause = f"{lat_column} BETWEEN %s AND %s"
+    params = [min_lat, max_lat]
+    if min_lon is not None:
+        clause += f" AND {lon_column} BETWEEN %s AND %s"
+        params += [min_lon, max_lon]
+    return clause, tuple(params)
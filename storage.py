@@ -0,0 +1,518 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+from config import DB_CONFIG, DB_BACKEND, SQLITE_CONFIG
+
+try:
+    import mysql.connector
+    from mysql.connector import errorcode
+    MYSQL_ERRORS = (mysql.connector.Error,)
+except ImportError:
+    # MySQL support is optional; the SQLite backend needs only the standard library
+    mysql = None
+    MYSQL_ERRORS = ()
+
+# Catch this in data-access code so the same except clause works on every backend
+Error = MYSQL_ERRORS + (sqlite3.Error,)
+
+
+class StorageBackend:
+    """
+    Database engine behind the data-access functions in database.py. Backends
+    hand out DB-API connections that accept MySQL-style %s placeholders and
+    cursor(dictionary=True), and own the dialect-specific SQL (DDL, upserts,
+    index introspection, query plans).
+    """
+
+    name = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def create_schema(self, cursor):
+        """Issue the CREATE TABLE statements for every table"""
+        raise NotImplementedError
+
+    def create_schema_version_table(self, cursor):
+        raise NotImplementedError
+
+    def set_schema_version(self, cursor, version):
+        raise NotImplementedError
+
+    def create_change_log_table(self, cursor):
+        """Create change_log: an auto-increment id per write transaction and when it was allocated"""
+        raise NotImplementedError
+
+    def is_missing_table(self, error):
+        """True if error reports that a queried table does not exist"""
+        raise NotImplementedError
+
+    def ensure_column(self, cursor, table, column, definition):
+        """Add a column unless the table already has it"""
+        raise NotImplementedError
+
+    def set_request_statuses(self, cursor, statuses):
+        """Restrict parking_requests.status to exactly these values"""
+        raise NotImplementedError
+
+    def ensure_index(self, cursor, table, index_name, columns):
+        """Create an index unless the table already has one with this name"""
+        raise NotImplementedError
+
+    def unindexed_tables(self, cursor, sql, params, tables):
+        """Return (table, detail) pairs for tables in `tables` the plan for sql reads by full scan"""
+        raise NotImplementedError
+
+
+class MySQLBackend(StorageBackend):
+    name = 'mysql'
+
+    def __init__(self, **connect_args):
+        if mysql is None:
+            raise Exception("The MySQL backend needs mysql-connector-python installed")
+        self.connect_args = connect_args or DB_CONFIG
+
+    def connect(self):
+        try:
+            return mysql.connector.connect(**self.connect_args)
+        except mysql.connector.Error as e:
+            raise Exception(f"Error connecting to database: {e}")
+
+    def create_schema(self, cursor):
+        """Issue the CREATE TABLE statements for every table"""
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                full_name VARCHAR(100),
+                user_type ENUM('USER', 'PROVIDER', 'ADMIN') NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Parking Spaces table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS parking_spaces (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                provider_id INT NOT NULL,
+                address VARCHAR(255) NOT NULL,
+                latitude DECIMAL(10, 8) NOT NULL,
+                longitude DECIMAL(11, 8) NOT NULL,
+                capacity INT NOT NULL,
+                rate_per_hour DECIMAL(10, 2) NOT NULL,
+                description TEXT,
+                status ENUM('ACTIVE', 'INACTIVE') DEFAULT 'ACTIVE',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (provider_id) REFERENCES users(id)
+            )
+        """)
+
+        # Parking Requests table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS parking_requests (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                space_id INT NOT NULL,
+                request_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                status ENUM('PENDING', 'ACCEPTED', 'DENIED') NOT NULL,
+                notification_shown BOOLEAN DEFAULT FALSE,
+                duration_hours FLOAT,
+                vehicle_number VARCHAR(20),
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (space_id) REFERENCES parking_spaces(id)
+            )
+        """)
+
+        # Bills table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bills (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                request_id INT,
+                user_id INT,
+                space_id INT,
+                amount DECIMAL(10,2),
+                due_date DATETIME,
+                status VARCHAR(20),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (request_id) REFERENCES parking_requests(id),
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (space_id) REFERENCES parking_spaces(id)
+            )
+        """)
+
+        # Payments table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS payments (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                bill_id INT NOT NULL,
+                user_id INT NOT NULL,
+                amount DECIMAL(10, 2) NOT NULL,
+                payment_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                payment_method ENUM('CREDIT_CARD', 'DEBIT_CARD', 'UPI', 'NET_BANKING') NOT NULL,
+                transaction_id VARCHAR(100) UNIQUE,
+                status ENUM('SUCCESS', 'FAILED', 'PENDING') DEFAULT 'PENDING',
+                FOREIGN KEY (bill_id) REFERENCES bills(id),
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+
+    def create_schema_version_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id TINYINT PRIMARY KEY,
+                version INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+
+    def set_schema_version(self, cursor, version):
+        cursor.execute("""
+            INSERT INTO schema_version (id, version) VALUES (1, %s)
+            ON DUPLICATE KEY UPDATE version = VALUES(version)
+        """, (version,))
+
+    def create_change_log_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                created_at DOUBLE NOT NULL
+            )
+        """)
+
+    def is_missing_table(self, error):
+        return getattr(error, 'errno', None) == errorcode.ER_NO_SUCH_TABLE
+
+    def ensure_column(self, cursor, table, column, definition):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def set_request_statuses(self, cursor, statuses):
+        values = ', '.join(f"'{status}'" for status in statuses)
+        cursor.execute(f"ALTER TABLE parking_requests MODIFY status ENUM({values}) NOT NULL")
+
+    def ensure_index(self, cursor, table, index_name, columns):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, index_name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({', '.join(columns)})")
+
+    def unindexed_tables(self, cursor, sql, params, tables):
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = [column[0] for column in cursor.description]
+        scans = []
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            if row['table'] in tables and not row['key']:
+                scans.append((row['table'], f"type={row['type']}"))
+        return scans
+
+
+# Give SQLite rows the same Python types mysql-connector returns
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+for declared_type in ('TIMESTAMP', 'DATETIME'):
+    sqlite3.register_converter(declared_type, lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts %s placeholders and can return dict rows"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(sql):
+        return sql.replace('%s', '?')
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._translate(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(self._translate(sql), seq_of_params)
+        return self
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [self._row(row) for row in rows]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def connection(self):
+        """The underlying sqlite3 connection (DB-API extension)"""
+        return self._cursor.connection
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with the subset of the mysql-connector API the app uses"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._closed = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def is_connected(self):
+        if self._closed:
+            return False
+        try:
+            self._connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._closed = True
+        self._connection.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    File-backed SQLite stand-in for MySQL, so benchmarks and load tests run
+    without a database server. Each pooled connection is used by one thread
+    at a time, so connections may cross threads.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path='parking.sqlite3', busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+
+    def connect(self):
+        try:
+            connection = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                timeout=self.busy_timeout_ms / 1000,
+                detect_types=sqlite3.PARSE_DECLTYPES
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            return SQLiteConnection(connection)
+        except sqlite3.Error as e:
+            raise Exception(f"Error connecting to database: {e}")
+
+    def create_schema(self, cursor):
+        """Issue the CREATE TABLE statements for every table"""
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                full_name VARCHAR(100),
+                user_type TEXT NOT NULL CHECK (user_type IN ('USER', 'PROVIDER', 'ADMIN')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Parking Spaces table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS parking_spaces (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider_id INT NOT NULL REFERENCES users(id),
+                address VARCHAR(255) NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                capacity INT NOT NULL,
+                rate_per_hour REAL NOT NULL,
+                description TEXT,
+                status TEXT DEFAULT 'ACTIVE' CHECK (status IN ('ACTIVE', 'INACTIVE')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Parking Requests table
+        cursor.execute(self._parking_requests_ddl('parking_requests', ('PENDING', 'ACCEPTED', 'DENIED')))
+
+        # Bills table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bills (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id INT REFERENCES parking_requests(id),
+                user_id INT REFERENCES users(id),
+                space_id INT REFERENCES parking_spaces(id),
+                amount REAL,
+                due_date DATETIME,
+                status VARCHAR(20),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Payments table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS payments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bill_id INT NOT NULL REFERENCES bills(id),
+                user_id INT NOT NULL REFERENCES users(id),
+                amount REAL NOT NULL,
+                payment_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                payment_method TEXT NOT NULL
+                    CHECK (payment_method IN ('CREDIT_CARD', 'DEBIT_CARD', 'UPI', 'NET_BANKING')),
+                transaction_id VARCHAR(100) UNIQUE,
+                status TEXT DEFAULT 'PENDING' CHECK (status IN ('SUCCESS', 'FAILED', 'PENDING'))
+            )
+        """)
+
+    def create_schema_version_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id INTEGER PRIMARY KEY,
+                version INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def set_schema_version(self, cursor, version):
+        cursor.execute("""
+            INSERT INTO schema_version (id, version) VALUES (1, %s)
+            ON CONFLICT (id) DO UPDATE SET version = excluded.version, updated_at = CURRENT_TIMESTAMP
+        """, (version,))
+
+    def create_change_log_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def is_missing_table(self, error):
+        return isinstance(error, sqlite3.OperationalError) and 'no such table' in str(error)
+
+    def ensure_column(self, cursor, table, column, definition):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @staticmethod
+    def _parking_requests_ddl(table, statuses):
+        values = ', '.join(f"'{status}'" for status in statuses)
+        return f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INT NOT NULL REFERENCES users(id),
+                space_id INT NOT NULL REFERENCES parking_spaces(id),
+                request_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                status TEXT NOT NULL CHECK (status IN ({values})),
+                notification_shown BOOLEAN DEFAULT FALSE,
+                duration_hours FLOAT,
+                vehicle_number VARCHAR(20)
+            )
+        """
+
+    def set_request_statuses(self, cursor, statuses):
+        # SQLite cannot alter a CHECK constraint, so rebuild the table
+        # (https://www.sqlite.org/lang_altertable.html#otheralter). Indexes go
+        # with the old table; migrations re-create them with ensure_index.
+        cursor.execute("PRAGMA table_info(parking_requests)")
+        current = cursor.fetchall()
+        columns = ', '.join(row[1] for row in current)
+
+        connection = cursor.connection
+        if connection.in_transaction:
+            connection.commit()
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("DROP TABLE IF EXISTS parking_requests_rebuild")
+            cursor.execute(self._parking_requests_ddl('parking_requests_rebuild', statuses))
+            # Keep columns later migrations added, so re-running this step loses nothing
+            cursor.execute("PRAGMA table_info(parking_requests_rebuild)")
+            rebuilt = {row[1] for row in cursor.fetchall()}
+            for _, name, declared_type, not_null, default, _ in current:
+                if name not in rebuilt:
+                    definition = f"{name} {declared_type}"
+                    if not_null:
+                        definition += " NOT NULL"
+                    if default is not None:
+                        definition += f" DEFAULT {default}"
+                    cursor.execute(f"ALTER TABLE parking_requests_rebuild ADD COLUMN {definition}")
+            cursor.execute(f"INSERT INTO parking_requests_rebuild ({columns}) SELECT {columns} FROM parking_requests")
+            cursor.execute("DROP TABLE parking_requests")
+            cursor.execute("ALTER TABLE parking_requests_rebuild RENAME TO parking_requests")
+            cursor.execute("COMMIT")
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.execute("PRAGMA foreign_keys = ON")
+
+    def ensure_index(self, cursor, table, index_name, columns):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+
+    def unindexed_tables(self, cursor, sql, params, tables):
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        scans = []
+        for row in cursor.fetchall():
+            detail = row[-1]
+            words = detail.split()
+            # Full scans read "SCAN <table>" with no "USING ... INDEX"
+            if len(words) >= 2 and words[0] == 'SCAN' and words[1] in tables and 'INDEX' not in words:
+                scans.append((words[1], detail))
+        return scans
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': lambda: SQLiteBackend(**SQLITE_CONFIG)
+}
+
+
+def create_backend(name=DB_BACKEND):
+    """Build the backend registered under name (config.DB_BACKEND by default)"""
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise Exception(f"Unknown storage backend: {name}")
+    return factory()
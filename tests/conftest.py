@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import sessions
+from config import DB_CONFIG, PASSWORD_CONFIG, SESSION_CONFIG
+from storage import SQLiteBackend, mysql, MySQLBackend
+
+# MySQL runs against a scratch database that is dropped afterwards, never DB_CONFIG's own
+MYSQL_TEST_DATABASE = os.environ.get('PARKING_TEST_MYSQL_DATABASE', f"{DB_CONFIG['database']}_test")
+
+
+def _mysql_backend():
+    """A MySQLBackend on a fresh scratch database, or a skip when no server is reachable"""
+    if mysql is None:
+        pytest.skip("mysql-connector-python is not installed")
+    server_args = {key: value for key, value in DB_CONFIG.items() if key != 'database'}
+    try:
+        conn = mysql.connector.connect(connection_timeout=2, **server_args)
+    except mysql.connector.Error as e:
+        pytest.skip(f"No MySQL server: {e}")
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{MYSQL_TEST_DATABASE}`")
+    cursor.execute(f"CREATE DATABASE `{MYSQL_TEST_DATABASE}`")
+    cursor.close()
+    conn.close()
+    return MySQLBackend(database=MYSQL_TEST_DATABASE, **server_args)
+
+
+def _drop_mysql_database():
+    server_args = {key: value for key, value in DB_CONFIG.items() if key != 'database'}
+    conn = mysql.connector.connect(**server_args)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{MYSQL_TEST_DATABASE}`")
+    cursor.close()
+    conn.close()
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def backend(request, tmp_path, monkeypatch):
+    """Point the data layer at an empty database on each backend in turn"""
+    if request.param == 'sqlite':
+        backend = SQLiteBackend(str(tmp_path / 'parking.sqlite3'))
+    else:
+        backend = _mysql_backend()
+
+    # Cheap hashes: these tests are about storage, not password cost
+    monkeypatch.setitem(PASSWORD_CONFIG, 'bcrypt_rounds', 4)
+    monkeypatch.setitem(PASSWORD_CONFIG, 'hash_workers', 0)
+    database.use_backend(backend)
+    database._space_catalog.invalidate()
+    yield backend
+    database.use_backend(None)
+    database._space_catalog.invalidate()
+    if request.param == 'mysql':
+        _drop_mysql_database()
+
+
+@pytest.fixture
+def migrated(backend):
+    assert database.initialize_database()
+    return backend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def session_store(request, tmp_path, monkeypatch):
+    """Sessions in each store in turn, with the store file and signing key under tmp_path"""
+    monkeypatch.setitem(SESSION_CONFIG, 'store', request.param)
+    monkeypatch.setitem(SESSION_CONFIG, 'path', str(tmp_path / 'sessions.sqlite3'))
+    monkeypatch.setitem(SESSION_CONFIG, 'secret_file', str(tmp_path / 'session.key'))
+    monkeypatch.setitem(SESSION_CONFIG, 'token_file', None)
+    monkeypatch.setattr(sessions, '_store', None)
+    monkeypatch.setattr(sessions, '_secret', None)
+    return request.param
@@ -0,0 +1,114 @@
+"""
+HTTP API rules that do not depend on the transport: authentication,
+provider-only routes and billing, driven through ParkingAPI.dispatch.
+
+    python -m pytest tests
+"""
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+import database
+from api_server import HTTPError, ParkingAPI
+
+
+@pytest.fixture
+def api(migrated, session_store):
+    api = ParkingAPI(max_concurrency=4, db_threads=2)
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def accounts(migrated):
+    """Logins for a driver, a second driver, the space's provider and another provider, plus the space id"""
+    database.register_user('driver', 'secret', 'Driver')
+    database.register_user('other', 'secret', 'Other')
+    database.register_user('provider', 'secret', 'Provider', 'PROVIDER')
+    database.register_user('rival', 'secret', 'Rival', 'PROVIDER')
+    provider_id = database.verify_user('provider', 'secret')['id']
+    assert database.add_parking_space(provider_id, '1 Main St', 18.52, 73.85, 2, 20.0, '')
+    return database.get_all_parking_spaces()[0]['id']
+
+
+def _call(api, method, path, body=None, token=None, query=None):
+    headers = {'authorization': f"Bearer {token}"} if token else {}
+    return asyncio.run(api.dispatch(method, path, query or {}, body or {}, headers))
+
+
+def _status(api, *args, **kwargs):
+    with pytest.raises(HTTPError) as error:
+        _call(api, *args, **kwargs)
+    return error.value.status
+
+
+def _login(api, username):
+    status, user = _call(api, 'POST', '/login', {'username': username, 'password': 'secret'})
+    assert status == HTTPStatus.OK
+    return user['token']
+
+
+# Authentication
+
+def test_routes_need_a_live_session(api, accounts):
+    assert _status(api, 'GET', f'/spaces/{accounts}') == HTTPStatus.UNAUTHORIZED
+    assert _status(api, 'GET', f'/spaces/{accounts}', token='forged.123.sig') == HTTPStatus.UNAUTHORIZED
+    token = _login(api, 'driver')
+    assert _call(api, 'GET', f'/spaces/{accounts}', token=token)[0] == HTTPStatus.OK
+
+
+def test_token_may_be_sent_in_the_body(api, accounts):
+    token = _login(api, 'driver')
+    status, user = _call(api, 'POST', '/session', {'token': token})
+    assert status == HTTPStatus.OK and user['username'] == 'driver' and 'token' not in user
+
+
+def test_wrong_password_is_rejected(api, accounts):
+    assert _status(api, 'POST', '/login', {'username': 'driver', 'password': 'nope'}) == HTTPStatus.UNAUTHORIZED
+    assert _status(api, 'POST', '/login', {'username': 'driver'}) == HTTPStatus.BAD_REQUEST
+
+
+def test_logout_revokes_the_token(api, accounts):
+    token = _login(api, 'driver')
+    assert _call(api, 'POST', '/logout', token=token)[0] == HTTPStatus.OK
+    assert _status(api, 'POST', '/session', token=token) == HTTPStatus.UNAUTHORIZED
+
+
+# Authorization
+
+def test_drivers_cannot_decide_or_bill_requests(api, accounts):
+    driver = _login(api, 'driver')
+    _, created = _call(api, 'POST', '/requests', {'space_id': accounts, 'vehicle_number': 'MH12AB1234'}, driver)
+    assert _status(api, 'POST', f"/requests/{created['id']}/accept", token=driver) == HTTPStatus.FORBIDDEN
+    assert _status(api, 'POST', f"/requests/{created['id']}/bill", {'amount': 10}, driver) == HTTPStatus.FORBIDDEN
+    # Another provider's spaces are invisible
+    rival = _login(api, 'rival')
+    assert _status(api, 'POST', f"/requests/{created['id']}/accept", token=rival) == HTTPStatus.NOT_FOUND
+
+
+def test_users_only_list_their_own_bills(api, accounts):
+    driver = _login(api, 'driver')
+    _, me = _call(api, 'POST', '/session', token=driver)
+    assert _call(api, 'GET', f"/users/{me['id']}/bills", token=driver) == (HTTPStatus.OK, {'bills': []})
+    other = _login(api, 'other')
+    assert _status(api, 'GET', f"/users/{me['id']}/bills", token=other) == HTTPStatus.FORBIDDEN
+
+
+# Billing
+
+def test_only_completed_requests_are_billed_once(api, accounts):
+    driver, provider = _login(api, 'driver'), _login(api, 'provider')
+    _, created = _call(api, 'POST', '/requests', {'space_id': accounts, 'vehicle_number': 'MH12AB1234'}, driver)
+    request_path = f"/requests/{created['id']}"
+    _call(api, 'POST', f"{request_path}/accept", token=provider)
+    assert _status(api, 'POST', f"{request_path}/bill", {'amount': 40}, provider) == HTTPStatus.CONFLICT
+
+    _call(api, 'POST', f"{request_path}/park", token=driver)
+    _call(api, 'POST', f"{request_path}/unpark", token=driver)
+    for amount in ('nan', 'inf', 0, -5, 'lots'):
+        assert _status(api, 'POST', f"{request_path}/bill", {'amount': amount}, provider) == HTTPStatus.BAD_REQUEST
+    assert _status(api, 'POST', f"{request_path}/bill", {'amount': 40}, _login(api, 'rival')) == HTTPStatus.NOT_FOUND
+
+    assert _call(api, 'POST', f"{request_path}/bill", {'amount': 40}, provider)[0] == HTTPStatus.CREATED
+    assert _status(api, 'POST', f"{request_path}/bill", {'amount': 40}, provider) == HTTPStatus.CONFLICT
@@ -0,0 +1,89 @@
+"""
+Session tokens: signature checks, expiry and revocation, on both stores.
+
+    python -m pytest tests
+"""
+import os
+import time
+import types
+
+import pytest
+
+import sessions
+from config import SESSION_CONFIG
+
+USER = {'id': 7, 'username': 'driver', 'user_type': 'USER', 'full_name': 'Driver', 'password_hash': 'x'}
+
+
+def _later(monkeypatch, seconds):
+    """Move the sessions module's clock forward"""
+    now = time.time() + seconds
+    monkeypatch.setattr(sessions, 'time', types.SimpleNamespace(time=lambda: now, monotonic=time.monotonic))
+
+
+def test_token_resolves_to_the_session_user(session_store):
+    token = sessions.create_session(USER)
+    assert sessions.validate_token(token) == {'id': 7, 'username': 'driver', 'user_type': 'USER',
+                                              'full_name': 'Driver'}
+
+
+def test_expired_token_is_rejected(session_store, monkeypatch):
+    token = sessions.create_session(USER, ttl_seconds=60)
+    _later(monkeypatch, 30)
+    assert sessions.validate_token(token)
+    _later(monkeypatch, 61)
+    assert sessions.validate_token(token) is None
+
+
+def test_revoked_token_is_rejected(session_store):
+    token = sessions.create_session(USER)
+    other = sessions.create_session(USER)
+    sessions.revoke_session(token)
+    assert sessions.validate_token(token) is None
+    assert sessions.validate_token(other)
+    # Revoking garbage or an already revoked token is harmless
+    sessions.revoke_session(token)
+    sessions.revoke_session('not-a-token')
+
+
+@pytest.mark.parametrize('tamper', [
+    lambda sid, exp, sig: f"{sid}.{int(exp) + 3600}.{sig}",    # extended expiry
+    lambda sid, exp, sig: f"{sid[::-1]}.{exp}.{sig}",          # someone else's session id
+    lambda sid, exp, sig: f"{sid}.{exp}.{'B' if sig[0] == 'A' else 'A'}{sig[1:]}",  # altered signature
+    lambda sid, exp, sig: f"{sid}.{exp}",                      # missing signature
+    lambda sid, exp, sig: f"{sid}.soon.{sig}",                 # non-numeric expiry
+])
+def test_tampered_token_is_rejected(session_store, tamper):
+    token = sessions.create_session(USER)
+    assert sessions.validate_token(tamper(*token.split('.'))) is None
+
+
+def test_non_string_token_is_rejected(session_store):
+    assert sessions.validate_token(None) is None
+    assert sessions.validate_token(12345) is None
+
+
+def test_sqlite_sessions_are_shared_between_processes(session_store, monkeypatch):
+    if session_store != 'sqlite':
+        pytest.skip("memory sessions are per process")
+    token = sessions.create_session(USER)
+    # A second process: same files, fresh module state
+    monkeypatch.setattr(sessions, '_store', None)
+    monkeypatch.setattr(sessions, '_secret', None)
+    assert sessions.validate_token(token)['id'] == 7
+
+
+def test_signing_key_is_created_once_and_private(session_store):
+    key = sessions._get_secret()
+    path = SESSION_CONFIG['secret_file']
+    assert len(key) == 32
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    sessions._secret = None
+    assert sessions._get_secret() == key
+
+
+def test_short_signing_key_is_refused(session_store):
+    with open(SESSION_CONFIG['secret_file'], 'wb') as f:
+        f.write(b'too short')
+    with pytest.raises(RuntimeError):
+        sessions.create_session(USER)
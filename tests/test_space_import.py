@@ -0,0 +1,110 @@
+"""
+Bulk import: row validation and the per-row error report.
+
+    python -m pytest tests
+"""
+import json
+
+import pytest
+
+import database
+from space_import import import_parking_spaces, parse_row
+
+
+class FakeGeocoder:
+    """Resolves only the addresses it was given; no network"""
+
+    def __init__(self, known=None):
+        self.known = known or {}
+
+    def geocode(self, address):
+        return self.known.get(address)
+
+
+@pytest.fixture
+def provider_id(migrated):
+    database.register_user('provider', 'secret', 'Provider', 'PROVIDER')
+    return database.verify_user('provider', 'secret')['id']
+
+
+def _import(provider_id, path, geocoder=None):
+    return import_parking_spaces(provider_id, str(path), geocoder=geocoder or FakeGeocoder(),
+                                 chunk_size=2, workers=1)
+
+
+# parse_row
+
+def test_parse_row_accepts_csv_text_and_json_numbers():
+    csv_row = {'address': ' 1 Main St ', 'capacity': '2.0', 'rate_per_hour': '20.5',
+               'latitude': '18.52', 'longitude': '73.85', 'description': ''}
+    json_row = {'address': '1 Main St', 'capacity': 2, 'rate_per_hour': 20.5, 'latitude': 18.52, 'longitude': 73.85}
+    expected = ('1 Main St', 18.52, 73.85, 2, 20.5, '')
+    assert parse_row(csv_row) == expected
+    assert parse_row(json_row) == expected
+    assert parse_row(json.dumps(json_row)) == expected
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'capacity': 1, 'rate_per_hour': 1}, "address is required"),
+    ({'address': 'a', 'capacity': 'two', 'rate_per_hour': 1}, "must be numbers"),
+    ({'address': 'a', 'capacity': 1, 'rate_per_hour': 'nan'}, "finite"),
+    ({'address': 'a', 'capacity': 'inf', 'rate_per_hour': 1}, "finite"),
+    ({'address': 'a', 'capacity': 2.5, 'rate_per_hour': 1}, "whole number"),
+    ({'address': 'a', 'capacity': '2.5', 'rate_per_hour': 1}, "whole number"),
+    ({'address': 'a', 'capacity': 0, 'rate_per_hour': 1}, "positive"),
+    ({'address': 'a', 'capacity': 1, 'rate_per_hour': -1}, "not negative"),
+    ({'address': 'a', 'capacity': 1, 'rate_per_hour': 1, 'latitude': 1}, "together"),
+    ({'address': 'a', 'capacity': 1, 'rate_per_hour': 1, 'latitude': 91, 'longitude': 0}, "out of range"),
+    ({'address': 'a', 'capacity': 1, 'rate_per_hour': 1, 'latitude': 'nan', 'longitude': 0}, "out of range"),
+    ('{"address": "a", ', "invalid JSON"),
+    ('[1, 2]', "not an object"),
+])
+def test_parse_row_rejects(row, message):
+    with pytest.raises(ValueError, match=message):
+        parse_row(row)
+
+
+# import_parking_spaces
+
+def test_malformed_jsonl_line_is_reported_and_the_rest_imported(provider_id, tmp_path):
+    path = tmp_path / 'spaces.jsonl'
+    path.write_text(
+        '{"address": "1 Main St", "capacity": 2, "rate_per_hour": 10, "latitude": 18.5, "longitude": 73.8}\n'
+        '{"address": "2 Main St", "capacity": \n'
+        '\n'
+        '{"address": "3 Main St", "capacity": 1, "rate_per_hour": "nan", "latitude": 18.5, "longitude": 73.8}\n'
+        '{"address": "4 Main St", "capacity": 1, "rate_per_hour": 5, "latitude": 18.5, "longitude": 73.8}\n',
+        encoding='utf-8'
+    )
+    report = _import(provider_id, path)
+    assert report.rows_read == 4
+    assert report.inserted == 2
+    assert [row_number for row_number, _ in report.errors] == [2, 4]
+    assert "invalid JSON" in report.errors[0][1]
+    assert sorted(s['address'] for s in database.get_all_parking_spaces()) == ['1 Main St', '4 Main St']
+
+
+def test_csv_rows_without_coordinates_are_geocoded(provider_id, tmp_path):
+    path = tmp_path / 'spaces.csv'
+    path.write_text('address,capacity,rate_per_hour\n'
+                    '1 Main St,2,10\n'
+                    'Nowhere,1,10\n'
+                    '1 Main St,3,12\n', encoding='utf-8')
+    report = _import(provider_id, path, FakeGeocoder({'1 Main St': (18.52, 73.85)}))
+    assert (report.inserted, report.geocoded) == (2, 2)
+    # Row 1 is the header
+    assert report.errors == [(3, "address could not be located")]
+
+
+def test_json_file_must_hold_a_list(provider_id, tmp_path):
+    path = tmp_path / 'spaces.json'
+    path.write_text('{"address": "1 Main St"}', encoding='utf-8')
+    with pytest.raises(ValueError, match="list"):
+        _import(provider_id, path)
+
+
+def test_unsupported_file_type(provider_id, tmp_path):
+    path = tmp_path / 'spaces.xlsx'
+    path.write_text('', encoding='utf-8')
+    with pytest.raises(ValueError, match="Unsupported"):
+        _import(provider_id, path)
@@ -0,0 +1,201 @@
+"""
+Data-layer behaviour every storage backend must share: SQLite always, MySQL
+when a server is reachable with config.DB_CONFIG's credentials.
+
+    python -m pytest tests
+"""
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import database
+from database import SpaceFullError, SpaceNotFoundError
+from storage import SQLiteCursor
+
+
+def _query(sql, params=()):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def _execute(sql, params=()):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        conn.commit()
+        cursor.close()
+
+
+def _occupied(space_id):
+    return _query("SELECT occupied FROM parking_spaces WHERE id = %s", (space_id,))[0][0]
+
+
+@pytest.fixture
+def space(migrated):
+    """A one-slot space, its provider's id and a registered user's id"""
+    database.register_user('provider', 'secret', 'Provider', 'PROVIDER')
+    database.register_user('driver', 'secret', 'Driver')
+    provider_id = database.verify_user('provider', 'secret')['id']
+    user_id = database.verify_user('driver', 'secret')['id']
+    assert database.add_parking_space(provider_id, '1 Main St', 18.52, 73.85, 1, Decimal('20.50'), 'Corner lot')
+    space_id = _query("SELECT id FROM parking_spaces WHERE provider_id = %s", (provider_id,))[0][0]
+    return space_id, provider_id, user_id
+
+
+# Migrations
+
+def test_migrations_reach_latest_version(backend):
+    assert database.initialize_database()
+    assert database.run_migrations() == (database.SCHEMA_VERSION, database.SCHEMA_VERSION)
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        assert database.get_schema_version(cursor) == database.SCHEMA_VERSION
+        cursor.close()
+
+
+def test_migrations_can_be_reapplied(migrated):
+    # Every step must be safe to re-run, e.g. after a crash before the version was recorded
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        database.get_backend().set_schema_version(cursor, 1)
+        conn.commit()
+        cursor.close()
+    assert database.run_migrations() == (1, database.SCHEMA_VERSION)
+
+
+def test_fresh_database_has_no_version(backend):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        assert database.get_schema_version(cursor) == 0
+        cursor.close()
+
+
+# Booking and occupancy
+
+def test_booking_claims_and_denial_releases_a_slot(space):
+    space_id, provider_id, user_id = space
+    request_id = database.create_parking_request(user_id, space_id, 'MH12AB1234')
+    assert request_id
+    assert _occupied(space_id) == 1
+
+    with pytest.raises(SpaceFullError):
+        database.create_parking_request(user_id, space_id, 'MH12CD5678')
+    assert _occupied(space_id) == 1
+
+    assert database.update_pending_requests([request_id], 'DENIED', provider_id) == {request_id: 'UPDATED'}
+    assert _occupied(space_id) == 0
+
+
+def test_booking_an_unknown_space_is_not_found(space):
+    space_id, _, user_id = space
+    with pytest.raises(SpaceNotFoundError):
+        database.create_parking_request(user_id, space_id + 1000, 'MH12AB1234')
+    assert _query("SELECT COUNT(*) FROM parking_requests") == [(0,)]
+
+
+def test_request_lifecycle_holds_the_slot_until_completed(space):
+    space_id, provider_id, user_id = space
+    request_id = database.create_parking_request(user_id, space_id, 'MH12AB1234')
+
+    assert database.update_pending_requests([request_id], 'ACCEPTED', provider_id) == {request_id: 'UPDATED'}
+    assert database.update_request_status(request_id, 'ACTIVE', expected_status='ACCEPTED')
+    assert _occupied(space_id) == 1
+    assert not database.update_request_status(request_id, 'ACTIVE', expected_status='ACCEPTED')
+
+    assert database.update_request_status(request_id, 'COMPLETED', expected_status='ACTIVE', user_id=user_id)
+    assert _occupied(space_id) == 0
+    assert database.get_parking_space(space_id)['occupied'] == 0
+
+
+def test_decisions_are_scoped_to_the_provider(space):
+    space_id, provider_id, user_id = space
+    request_id = database.create_parking_request(user_id, space_id, 'MH12AB1234')
+    assert database.update_pending_requests([request_id], 'ACCEPTED', provider_id + 1000) == {request_id: 'NOT_FOUND'}
+    assert database.update_pending_requests([request_id], 'ACCEPTED', provider_id) == {request_id: 'UPDATED'}
+    assert database.update_pending_requests([request_id], 'DENIED', provider_id) == {request_id: 'ACCEPTED'}
+
+
+def test_spaces_in_bbox(space):
+    space_id, provider_id, _ = space
+    assert [s['id'] for s in database.get_parking_spaces_in_bbox(18.5, 18.6, 73.8, 73.9)] == [space_id]
+    assert database.get_parking_spaces_in_bbox(18.5, 18.6, 73.8, 73.9, provider_id + 1000) == []
+    assert database.get_parking_spaces_in_bbox(19.0, 19.1, 73.8, 73.9) == []
+
+
+# Change feed
+
+def test_change_feed_returns_each_change_once(space):
+    space_id, provider_id, user_id = space
+    start = database.get_changes_since(None, user_id=user_id)['version']
+    request_id = database.create_parking_request(user_id, space_id, 'MH12AB1234')
+
+    changes = database.get_changes_since(start, user_id=user_id)
+    assert [row['id'] for row in changes['requests']] == [request_id]
+    assert database.get_changes_since(start, provider_id=provider_id)['requests'][0]['id'] == request_id
+    assert database.get_changes_since(changes['version'], user_id=user_id)['requests'] == []
+
+
+def test_change_feed_waits_for_a_version_still_in_flight(space):
+    space_id, _, user_id = space
+    request_id = database.create_parking_request(user_id, space_id, 'MH12AB1234')
+    version = _query("SELECT version FROM parking_requests WHERE id = %s", (request_id,))[0][0]
+    start = database.get_changes_since(None, user_id=user_id)['version']
+    assert start == version
+
+    # A later transaction commits while the one holding version + 1 is still open
+    _execute("INSERT INTO change_log (id, created_at) VALUES (%s, %s)", (version + 2, time.time()))
+    _execute("UPDATE parking_requests SET version = %s WHERE id = %s", (version + 2, request_id))
+    changes = database.get_changes_since(start, user_id=user_id)
+    assert changes == {'version': start, 'requests': [], 'bills': []}
+
+    # Once it commits, both are handed out
+    _execute("INSERT INTO change_log (id, created_at) VALUES (%s, %s)", (version + 1, time.time()))
+    changes = database.get_changes_since(start, user_id=user_id)
+    assert changes['version'] == version + 2
+    assert [row['id'] for row in changes['requests']] == [request_id]
+
+
+def test_change_feed_skips_versions_abandoned_long_ago(space):
+    space_id, _, user_id = space
+    start = database.get_changes_since(None, user_id=user_id)['version']
+    _execute("INSERT INTO change_log (id, created_at) VALUES (%s, %s)",
+             (start + 2, time.time() - database.CHANGE_SETTLE_SECONDS - 1))
+    assert database.get_changes_since(start, user_id=user_id)['version'] == start + 2
+
+
+# The %s placeholder shim: the same SQL and cursor options work on every backend
+
+def test_placeholders_and_dictionary_rows(space):
+    space_id, provider_id, _ = space
+    with database.get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, address, rate_per_hour, created_at FROM parking_spaces "
+                       "WHERE id = %s AND provider_id = %s", (space_id, provider_id))
+        row = cursor.fetchone()
+        cursor.close()
+    assert row['id'] == space_id and row['address'] == '1 Main St'
+    # Decimal parameters round-trip; TIMESTAMP columns come back as datetimes
+    assert float(row['rate_per_hour']) == 20.5
+    assert isinstance(row['created_at'], datetime)
+
+
+def test_executemany_with_placeholders(space):
+    space_id, provider_id, _ = space
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE parking_spaces SET description = %s WHERE id = %s",
+                           [('first', space_id), ('second', space_id)])
+        conn.commit()
+        cursor.close()
+    assert _query("SELECT description FROM parking_spaces WHERE id = %s", (space_id,)) == [('second',)]
+
+
+def test_sqlite_cursor_translates_placeholders():
+    assert SQLiteCursor._translate("SELECT * FROM t WHERE a = %s AND b IN (%s, %s)") == \
+        "SELECT * FROM t WHERE a = ? AND b IN (?, ?)"
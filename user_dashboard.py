@@ -1,17 +1,31 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-import mysql
-
+from background import BackgroundExecutor
 from map_view import MapView
+from notifications import NotificationListener, user_topic
+from storage import Error
+from viewport_loader import ViewportLoader
 from database import (  # Import functions from database.py
     create_db_connection,
-    get_all_parking_spaces,
+    get_connection,
+    get_parking_spaces_in_bbox,
+    get_parking_space,
     create_parking_request,
+    update_request_status,
     get_pending_bills,
-    process_payment
+    get_changes_since,
+    SpaceFullError,
+    SpaceNotFoundError,
+    CURRENT_BOOKING_SQL,
+    OCCUPYING_STATUSES
 )
 
+# Polling interval while the notification broker is unreachable
+CHANGE_POLL_MS = 5000
+# Safety poll while connected, in case a notification is lost
+CONNECTED_POLL_MS = 60000
+
 
 class UserDashboard:
     def __init__(self, parent, user_data, logout_callback):
@@ -19,26 +33,18 @@ class UserDashboard:
         self.user_data = user_data
         self.logout_callback = logout_callback
         self.selected_space = None
+        self.bills = []
+        self.current_request_id = None
+        self.changes_version = None
+        self.executor = BackgroundExecutor(self.parent, on_busy_change=self.show_loading)
         self.create_widgets()
         self.load_pending_bills()
-        self.bills = []
-        self.load_parking_spaces()
-        self.show_payment_window()
-        bills = self.load_bills_from_db()  # however you load them
-        self.show_payment_window(bills)
-
-    def load_pending_bills(self):
-        bills = get_pending_bills(self.user_data['id'])
-        if bills:
-            # If there are pending bills, show them
-            total_amount = sum(bill['amount'] for bill in bills)
-            message = f"You have {len(bills)} pending bills totaling ₹{total_amount}.\nWould you like to pay now?"
-            if messagebox.askyesno("Pending Bills", message):
-                self.show_payment_window(bills)  # This call now correctly passes 'bills'
+        self.check_current_booking()
+        self.start_status_checker()
 
     def create_widgets(self):
-        # Create main container
-        main_container = ttk.Frame(self.parent)
+        # Create main container; it lives as long as the dashboard does
+        self.main_container = main_container = ttk.Frame(self.parent)
         main_container.pack(fill="both", expand=True, padx=10, pady=5)
 
         # Header frame
@@ -52,6 +58,10 @@ class UserDashboard:
             font=("Helvetica", 12)
         ).pack(side="left")
 
+        # Shown while background queries are running
+        self.loading_label = ttk.Label(header_frame, text="", foreground="gray")
+        self.loading_label.pack(side="left", padx=10)
+
         # My Bookings button
         ttk.Button(
             header_frame,
@@ -88,11 +98,40 @@ class UserDashboard:
         self.vehicle_type.set("Car")
         self.vehicle_type.pack(side="left", padx=5)
 
-        ttk.Button(
+        # Enabled once a parking space is selected
+        self.submit_btn = ttk.Button(
             vehicle_frame,
             text="Submit Request",
-            command=self.submit_request
-        ).pack(side="left", padx=5)
+            command=self.submit_request,
+            state="disabled"
+        )
+        self.submit_btn.pack(side="left", padx=5)
+
+        self.selected_space_label = ttk.Label(search_frame, text="No space selected")
+        self.selected_space_label.pack(fill="x", padx=5, pady=(0, 5))
+
+        # Current booking with its park/unpark actions
+        booking_frame = ttk.LabelFrame(main_container, text="Current Booking")
+        booking_frame.pack(fill="x", pady=(0, 10))
+
+        self.status_label = ttk.Label(booking_frame, text="No active booking")
+        self.status_label.pack(side="left", padx=5, pady=5)
+
+        self.unpark_button = ttk.Button(
+            booking_frame,
+            text="Unpark",
+            command=self.unpark_vehicle,
+            state="disabled"
+        )
+        self.unpark_button.pack(side="right", padx=5)
+
+        self.park_button = ttk.Button(
+            booking_frame,
+            text="Park",
+            command=self.park_vehicle,
+            state="disabled"
+        )
+        self.park_button.pack(side="right", padx=5)
 
         # Available spaces frame
         spaces_frame = ttk.Frame(main_container)
@@ -114,82 +153,70 @@ class UserDashboard:
         # Pack Treeview and scrollbar
         self.spaces_tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
+        self.spaces_tree.bind("<<TreeviewSelect>>", self.on_space_select)
 
         # Initialize map view
         self.map_view = MapView(main_container)
         self.map_view.pack(fill="both", expand=True)
 
-        # Load initial parking spaces
-        self.load_parking_spaces()
-
-    def load_parking_spaces(self):
-        try:
-            # Clear existing items
-            for item in self.spaces_tree.get_children():
-                self.spaces_tree.delete(item)
-
-            # Clear existing markers on map
-            self.map_view.clear_markers()
+        # Default position (Pune); spaces are loaded for whatever area is in view
+        self.map_view.set_position(18.5204, 73.8567)
+        self.viewport_loader = ViewportLoader(
+            self.map_view,
+            self.executor,
+            get_parking_spaces_in_bbox,
+            self.show_parking_spaces
+        )
+        self.viewport_loader.start()  # also loads the initial view
 
-            # Get spaces from database
-            conn = create_db_connection()
-            cursor = conn.cursor()
+    def show_loading(self, busy):
+        """Toggle the loading indicator while background work is pending"""
+        if hasattr(self, 'loading_label'):
+            self.loading_label.config(text="Loading..." if busy else "")
 
-            # Simple query without any truncation
-            cursor.execute("""
-                SELECT 
-                    ps.id,
-                    ps.address,
-                    ps.rate_per_hour,
-                    ps.capacity,
-                    ps.latitude,
-                    ps.longitude,
-                    u.full_name as provider_name
-                FROM parking_spaces ps
-                JOIN users u ON ps.provider_id = u.id
-            """)
-
-            spaces = cursor.fetchall()
-
-            # Add spaces to tree and map with full data
-            for space in spaces:
-                space_id, address, rate, capacity, lat, lng, provider = space
-
-                # Insert into tree view without truncation
-                self.spaces_tree.insert(
-                    "",
-                    "end",
-                    values=(
-                        address,  # Full address without truncation
-                        f"₹{rate}/hr",
-                        capacity,
-                        provider
-                    ),
-                    tags=(space_id,)
-                )
+    def load_parking_spaces(self):
+        """Reload the parking spaces in the current map area in the background"""
+        self.viewport_loader.refresh()
 
-                # Add marker to map if coordinates are valid
-                if lat and lng:
-                    self.map_view.add_marker(
-                        float(lat),
-                        float(lng),
-                        f"{address}\nRate: ₹{rate}/hr\nCapacity: {capacity}"
-                    )
-
-            # If spaces were found, center map on first space
-            if spaces:
-                first_space = spaces[0]
-                self.map_view.set_position(
-                    float(first_space[4]),  # latitude
-                    float(first_space[5])  # longitude
+    def show_parking_spaces(self, spaces):
+        # Clear existing items
+        for item in self.spaces_tree.get_children():
+            self.spaces_tree.delete(item)
+
+        # Markers keyed by space id; only changed ones are redrawn
+        markers = {}
+
+        # Add spaces to tree and map with full data
+        for space in spaces:
+            space_id = space['id']
+            address = space['address']
+            rate = space['rate_per_hour']
+            capacity = space['capacity']
+            lat, lng = space['latitude'], space['longitude']
+            provider = space['provider_name']
+
+            # Insert into tree view without truncation
+            self.spaces_tree.insert(
+                "",
+                "end",
+                values=(
+                    address,  # Full address without truncation
+                    f"₹{rate}/hr",
+                    capacity,
+                    provider
+                ),
+                tags=(space_id,)
+            )
+
+            # Add marker to map if coordinates are valid
+            if lat and lng:
+                markers[space_id] = (
+                    float(lat),
+                    float(lng),
+                    f"{address}\nRate: ₹{rate}/hr\nAvailable: {capacity - space['occupied']}/{capacity}"
                 )
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load parking spaces: {str(e)}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+        self.map_view.set_markers(markers)
 
     def on_space_select(self, event):
         selected_items = self.spaces_tree.selection()
@@ -198,167 +225,173 @@ class UserDashboard:
             item = self.spaces_tree.item(selected_items[0])
             space_id = item['tags'][0]  # Get space_id from tags
 
-            try:
-                # Fetch detailed information about the selected space
-                conn = create_db_connection()
-                cursor = conn.cursor()
-
-                cursor.execute("""
-                    SELECT 
-                        ps.address,
-                        ps.rate_per_hour,
-                        ps.capacity,
-                        ps.latitude,
-                        ps.longitude,
-                        u.full_name as provider_name
-                    FROM parking_spaces ps
-                    JOIN users u ON ps.provider_id = u.id
-                    WHERE ps.id = %s
-                """, (space_id,))
-
-                space_details = cursor.fetchone()
-
-                if space_details:
-                    address, rate, capacity, lat, lng, provider = space_details
-
-                    # Update selected space label with more details
-                    details_text = f"Selected: {address}\nRate: ₹{rate}/hr\nCapacity: {capacity}\nProvider: {provider}"
-                    self.selected_space_label.config(text=details_text)
-
-                    # Center map on selected space
-                    if lat and lng:
-                        self.map_view.set_position(float(lat), float(lng))
-
-                    # Enable submit button
-                    self.submit_btn.config(state="normal")
-
-                    # Store selected space info
-                    self.selected_space = {
-                        'id': space_id,
-                        'address': address,
-                        'rate': rate,
-                        'capacity': capacity,
-                        'provider': provider
-                    }
-
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to get space details: {str(e)}")
-            finally:
-                if 'conn' in locals() and conn.is_connected():
-                    cursor.close()
-                    conn.close()
+            # Fetch detailed information about the selected space; a newer
+            # selection supersedes any lookup still in flight
+            self.executor.submit(
+                'space_details',
+                self.fetch_space_details,
+                space_id,
+                on_success=lambda details: self.show_space_details(space_id, details),
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to get space details: {str(e)}")
+            )
         else:
+            self.executor.cancel('space_details')
             self.selected_space = None
             self.selected_space_label.config(text="No space selected")
             self.submit_btn.config(state="disabled")
 
+    def fetch_space_details(self, space_id):
+        """Look up one parking space in the shared catalog (runs on a worker thread)"""
+        space = get_parking_space(space_id)
+        if space is None:
+            return None
+        return (
+            space['address'],
+            space['rate_per_hour'],
+            space['capacity'],
+            space['latitude'],
+            space['longitude'],
+            space['provider_name']
+        )
+
+    def show_space_details(self, space_id, space_details):
+        if space_details:
+            address, rate, capacity, lat, lng, provider = space_details
+
+            # Update selected space label with more details
+            details_text = f"Selected: {address}\nRate: ₹{rate}/hr\nCapacity: {capacity}\nProvider: {provider}"
+            self.selected_space_label.config(text=details_text)
+
+            # Center map on selected space
+            if lat and lng:
+                self.map_view.set_position(float(lat), float(lng))
+
+            # Enable submit button
+            self.submit_btn.config(state="normal")
+
+            # Store selected space info
+            self.selected_space = {
+                'id': space_id,
+                'address': address,
+                'rate': rate,
+                'capacity': capacity,
+                'provider': provider
+            }
+
     def submit_request(self):
         vehicle_number = self.vehicle_number.get().strip()
         if not vehicle_number:
             messagebox.showerror("Error", "Please enter vehicle number")
             return
 
-        try:
-            selected_items = self.spaces_tree.selection()
-            if not selected_items:
-                messagebox.showerror("Error", "Please select a parking space")
-                return
-
-            space_id = self.spaces_tree.item(selected_items[0])['tags'][0]
-
-            conn = create_db_connection()
-            cursor = conn.cursor()
-
-            # Insert the request with PENDING status
-            cursor.execute("""
-                INSERT INTO parking_requests 
-                (user_id, space_id, vehicle_number, status) 
-                VALUES (%s, %s, %s, 'PENDING')
-            """, (self.user_data['id'], space_id, vehicle_number))
+        selected_items = self.spaces_tree.selection()
+        if not selected_items:
+            messagebox.showerror("Error", "Please select a parking space")
+            return
 
-            conn.commit()
-            request_id = cursor.lastrowid
+        space_id = self.spaces_tree.item(selected_items[0])['tags'][0]
 
-            if request_id:
-                self.current_request_id = request_id
-                messagebox.showinfo("Request Submitted",
-                                    f"Your parking request has been submitted!\n\n"
-                                    f"Vehicle Number: {vehicle_number}\n"
-                                    f"Status: Waiting for provider approval\n\n"
-                                    f"Check 'My Bookings' for status updates.")
+        def on_error(e):
+            if isinstance(e, SpaceFullError):
+                messagebox.showwarning("Space Full", "This parking space has no free spots left.")
+                self.load_parking_spaces()
+            elif isinstance(e, SpaceNotFoundError):
+                messagebox.showwarning("Space Removed", "This parking space is no longer listed.")
+                self.load_parking_spaces()
+            else:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+        # Claims a slot and inserts the PENDING request atomically
+        self.executor.submit(
+            'submit_request',
+            create_parking_request,
+            self.user_data['id'],
+            space_id,
+            vehicle_number,
+            on_success=lambda request_id: self.on_request_submitted(request_id, vehicle_number),
+            on_error=on_error
+        )
 
-                self.vehicle_number.delete(0, 'end')
-                self.check_current_booking()  # Add this method to check current booking status
+    def on_request_submitted(self, request_id, vehicle_number):
+        if request_id:
+            self.current_request_id = request_id
+            messagebox.showinfo("Request Submitted",
+                                f"Your parking request has been submitted!\n\n"
+                                f"Vehicle Number: {vehicle_number}\n"
+                                f"Status: Waiting for provider approval\n\n"
+                                f"Check 'My Bookings' for status updates.")
 
-            else:
-                messagebox.showerror("Error", "Failed to submit parking request")
+            self.vehicle_number.delete(0, 'end')
+            self.check_current_booking()  # Add this method to check current booking status
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+        else:
+            messagebox.showerror("Error", "Failed to submit parking request")
 
     def check_current_booking(self):
-        try:
-            conn = create_db_connection()
+        self.executor.submit(
+            'current_booking',
+            self.fetch_current_booking,
+            on_success=self.show_current_booking,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to check current booking: {str(e)}")
+        )
+
+    def fetch_current_booking(self):
+        """Query the user's latest open booking (runs on a worker thread)"""
+        with get_connection() as conn:
             cursor = conn.cursor()
 
-            cursor.execute("""
-                SELECT 
-                    parking_requests.id,
-                    vehicle_number,
-                    parking_requests.status,
-                    address,
-                    rate_per_hour
-                FROM parking_requests
-                JOIN parking_spaces ON space_id = parking_spaces.id
-                WHERE user_id = %s 
-                AND parking_requests.status IN ('PENDING', 'APPROVED', 'ACTIVE')
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (self.user_data['id'],))
+            cursor.execute(CURRENT_BOOKING_SQL, (self.user_data['id'],))
 
             booking = cursor.fetchone()
+            cursor.close()
+            return booking
 
-            if booking:
-                request_id, vehicle_number, status, address, rate = booking
-                self.current_request_id = request_id
-
-                status_text = f"Current Booking:\nVehicle: {vehicle_number}\nStatus: {status}\nLocation: {address}"
-                self.status_label.config(text=status_text)
-
-                # **Ensure buttons update correctly**
-                if status == 'APPROVED':
-                    self.park_button.config(state='normal')  # Enable Park button
-                    self.unpark_button.config(state='disabled')
-                elif status == 'ACTIVE':
-                    self.park_button.config(state='disabled')
-                    self.unpark_button.config(state='normal')
-                else:  # PENDING
-                    self.park_button.config(state='disabled')
-                    self.unpark_button.config(state='disabled')
-            else:
-                self.current_request_id = None
-                self.status_label.config(text="No active booking")
+    def show_current_booking(self, booking):
+        if booking:
+            request_id, vehicle_number, status, address, rate = booking
+            self.current_request_id = request_id
+
+            status_text = f"Current Booking:\nVehicle: {vehicle_number}\nStatus: {status}\nLocation: {address}"
+            self.status_label.config(text=status_text)
+
+            # **Ensure buttons update correctly**
+            if status == 'ACCEPTED':
+                self.park_button.config(state='normal')  # Enable Park button
+                self.unpark_button.config(state='disabled')
+            elif status == 'ACTIVE':
+                self.park_button.config(state='disabled')
+                self.unpark_button.config(state='normal')
+            else:  # PENDING
                 self.park_button.config(state='disabled')
                 self.unpark_button.config(state='disabled')
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to check current booking: {str(e)}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+        else:
+            self.current_request_id = None
+            self.status_label.config(text="No active booking")
+            self.park_button.config(state='disabled')
+            self.unpark_button.config(state='disabled')
 
     def load_bookings(self, tree):
-        # Clear existing items
-        for item in tree.get_children():
-            tree.delete(item)
+        def show_bookings(bookings):
+            # Clear existing items
+            for item in tree.get_children():
+                tree.delete(item)
+
+            for booking in bookings:
+                tree.insert("", "end", values=booking)
+
+        def show_error(e):
+            if isinstance(e, Error):
+                messagebox.showerror("Database Error", f"Failed to load bookings: {e}")
+                print(f"SQL Error: {e}")
+            else:
+                messagebox.showerror("Error", f"Unexpected error: {e}")
+                print(f"Unexpected Error: {e}")
 
-        try:
-            conn = create_db_connection()
+        self.executor.submit('bookings', self.fetch_bookings, on_success=show_bookings, on_error=show_error)
+
+    def fetch_bookings(self):
+        """Query the user's booking history (runs on a worker thread)"""
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             query = """
@@ -379,21 +412,9 @@ class UserDashboard:
             cursor.execute(query, (user_id,))
 
             bookings = cursor.fetchall()
-            for booking in bookings:
-                tree.insert("", "end", values=booking)
+            cursor.close()
+            return bookings
 
-        except mysql.connector.Error as e:
-            messagebox.showerror("Database Error", f"Failed to load bookings: {e}")
-            print(f"SQL Error: {e}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Unexpected error: {e}")
-            print(f"Unexpected Error: {e}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
-
-    # Update the `show_my_bookings` method to use the fixed function
     def show_my_bookings(self):
         bookings_window = tk.Toplevel(self.parent)
         bookings_window.title("My Bookings")
@@ -431,73 +452,111 @@ class UserDashboard:
         self.pay_button.pack(side="left", padx=5)'''
 
     def start_status_checker(self):
-        def check_status():
-            if self.current_request_id:
-                self.check_current_booking()
-            self.parent.after(5000, check_status)  # Check every 5 seconds
+        """
+        Fetch this user's request and bill changes whenever a notification
+        arrives. While the broker is unreachable it polls for changes since
+        the last seen version instead, and while connected it still polls
+        now and then in case an event was lost.
+        """
+        self.notifications = NotificationListener(
+            self.main_container,
+            [user_topic(self.user_data['id'])],
+            lambda topic, event: self.fetch_changes()
+        )
 
-        check_status()
+        def check_status(waited_ms=0):
+            if not self.main_container.winfo_exists():
+                return
+            waited_ms += CHANGE_POLL_MS
+            if not self.notifications.connected or waited_ms >= CONNECTED_POLL_MS:
+                self.fetch_changes()
+                waited_ms = 0
+            self.parent.after(CHANGE_POLL_MS, check_status, waited_ms)
+
+        self.fetch_changes()
+        self.parent.after(CHANGE_POLL_MS, check_status)
+
+    def fetch_changes(self):
+        self.executor.submit(
+            'changes',
+            get_changes_since,
+            self.changes_version,
+            user_id=self.user_data['id'],
+            on_success=self.apply_changes
+        )
 
-    def park_vehicle(self):
-        try:
-            conn = create_db_connection()
-            cursor = conn.cursor()
+    def apply_changes(self, changes):
+        """Update the current booking from changed requests and prompt for new bills"""
+        if changes is None:
+            return
+        first_poll = self.changes_version is None
+        self.changes_version = changes['version']
+        if first_poll:
+            return
 
-            cursor.execute("""
-                UPDATE parking_requests 
-                SET status = 'ACTIVE'
-                WHERE id = %s
-            """, (self.current_request_id,))
+        for request in changes['requests']:
+            if request['status'] in OCCUPYING_STATUSES:
+                self.show_current_booking((request['id'], request['vehicle_number'], request['status'],
+                                           request['address'], request['rate_per_hour']))
+            elif request['id'] == self.current_request_id:
+                self.show_current_booking(None)
 
-            conn.commit()
+        if any(bill['status'] == 'PENDING' for bill in changes['bills']):
+            self.load_pending_bills()
 
+    def park_vehicle(self):
+        def on_parked(updated):
+            if not updated:
+                messagebox.showerror("Error", "Failed to park vehicle")
+                return
             messagebox.showinfo("Success", "Vehicle parked successfully!")
 
             # Ensure UI updates
             self.check_current_booking()
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to park vehicle: {e}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+        self.executor.submit(
+            'park',
+            update_request_status,
+            self.current_request_id,
+            'ACTIVE',
+            on_success=on_parked,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to park vehicle: {e}")
+        )
 
     def unpark_vehicle(self):
-        try:
-            if messagebox.askyesno("Payment", "Parking fee: ₹50\n\nProceed with payment?"):
-                conn = create_db_connection()
-                cursor = conn.cursor()
-
-                cursor.execute("""
-                    UPDATE parking_requests 
-                    SET status = 'COMPLETED', amount_paid = 50
-                    WHERE id = %s
-                """, (self.current_request_id,))
-
-                conn.commit()
+        if not messagebox.askyesno("Payment", "Parking fee: ₹50\n\nProceed with payment?"):
+            return
 
-                messagebox.showinfo("Success", "Payment successful! You can now leave the parking space.")
+        def on_unparked(updated):
+            if not updated:
+                messagebox.showerror("Error", "Failed to process payment")
+                return
+            messagebox.showinfo("Success", "Payment successful! You can now leave the parking space.")
 
-                # Reset status and update UI
-                self.current_request_id = None
-                self.check_current_booking()
+            # Reset status and update UI
+            self.current_request_id = None
+            self.check_current_booking()
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process payment: {e}")
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+        # Completing the request frees its slot on the space
+        self.executor.submit(
+            'unpark',
+            update_request_status,
+            self.current_request_id,
+            'COMPLETED',
+            on_success=on_unparked,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to process payment: {e}")
+        )
 
     def load_pending_bills(self):
-        bills = get_pending_bills(self.user_data['id'])
-        if bills:
-            # If there are pending bills, show them
-            total_amount = sum(bill['amount'] for bill in bills)
-            message = f"You have {len(bills)} pending bills totaling ₹{total_amount}.\nWould you like to pay now?"
-            if messagebox.askyesno("Pending Bills", message):
-                self.show_payment_window(bills)
+        def prompt_payment(bills):
+            if bills:
+                # If there are pending bills, show them
+                total_amount = sum(bill['amount'] for bill in bills)
+                message = f"You have {len(bills)} pending bills totaling ₹{total_amount}.\nWould you like to pay now?"
+                if messagebox.askyesno("Pending Bills", message):
+                    self.show_payment_window(bills)
+
+        self.executor.submit('pending_bills', get_pending_bills, self.user_data['id'], on_success=prompt_payment)
 
     def show_payment_window(self, bills):
         """Opens a window to display pending bills."""
@@ -567,7 +626,7 @@ class UserDashboard:
                 # Disable the Pay Bill button after paying
                 self.pay_button.config(state="disabled")
 
-            except mysql.connector.Error as e:
+            except Error as e:
                 messagebox.showerror("Database Error", f"Failed to update status: {e}")
             except Exception as e:
                 messagebox.showerror("Error", f"Unexpected error: {e}")
@@ -0,0 +1,177 @@
+import math
+import time
+from collections import OrderedDict
+
+from spatial_index import project, unproject
+
+# Data tiles are cached at this zoom level (roughly 10 km across) or, when the
+# map is zoomed further out, at the map's own zoom so a view spans few tiles
+DATA_TILE_ZOOM = 12
+
+
+class ViewportLoader:
+    """
+    Load only the parking spaces inside the map's visible area (plus a margin).
+    Viewport changes are debounced, results are cached per data tile, and only
+    tiles missing from the cache are queried, in a single background request.
+    Tiles older than tile_ttl_seconds count as missing, and a viewport left
+    in place is reloaded once its tiles expire, so occupancy shown on the
+    markers stays current.
+    """
+
+    def __init__(self, map_view, executor, fetch_bbox, on_spaces, margin=0.25,
+                 debounce_ms=300, poll_ms=150, max_cached_tiles=256, tile_ttl_seconds=30):
+        """
+        fetch_bbox(min_lat, max_lat, min_lon, max_lon) runs on a worker thread
+        and returns a list of space dicts, or None on failure.
+        on_spaces(spaces) receives every cached space in the current viewport.
+        """
+        self.map_view = map_view
+        self.executor = executor
+        self.fetch_bbox = fetch_bbox
+        self.on_spaces = on_spaces
+        self.margin = margin
+        self.debounce_ms = debounce_ms
+        self.poll_ms = poll_ms
+        self.max_cached_tiles = max_cached_tiles
+        self.tile_ttl_seconds = tile_ttl_seconds
+
+        # (zoom, x, y) -> (loaded_at, list of spaces), least recently used first
+        self._tiles = OrderedDict()
+        self._last_viewport = None
+        self._loaded_viewport = None
+        self._loaded_at = 0.0
+        self._quiet_ms = 0
+        self._running = False
+
+    def start(self):
+        """Begin watching the map and load the initial viewport"""
+        if not self._running:
+            self._running = True
+            self._poll()
+
+    def stop(self):
+        self._running = False
+
+    def refresh(self):
+        """Drop cached tiles (e.g. after the data changed) and reload the viewport"""
+        self._tiles.clear()
+        self._load(self._current_viewport())
+
+    def _current_viewport(self):
+        widget = self.map_view.map_widget
+        return (round(widget.zoom), widget.upper_left_tile_pos, widget.lower_right_tile_pos)
+
+    def _poll(self):
+        if not self._running:
+            return
+
+        viewport = self._current_viewport()
+        if viewport != self._last_viewport:
+            # Still panning/zooming; wait until the map settles
+            self._last_viewport = viewport
+            self._quiet_ms = 0
+        elif viewport != self._loaded_viewport:
+            self._quiet_ms += self.poll_ms
+            if self._quiet_ms >= self.debounce_ms:
+                self._load(viewport)
+        elif time.monotonic() - self._loaded_at > self.tile_ttl_seconds:
+            # Unchanged view whose tiles have expired: refetch them
+            self._load(viewport)
+
+        try:
+            self.map_view.after(self.poll_ms, self._poll)
+        except Exception:
+            self._running = False
+
+    def _tile_keys(self, viewport):
+        zoom, upper_left, lower_right = viewport
+        tile_zoom = min(DATA_TILE_ZOOM, max(zoom, 0))
+
+        # Map tile coordinates are at the view zoom; rescale to the data tile zoom
+        scale = 2.0 ** (tile_zoom - zoom)
+        width = lower_right[0] - upper_left[0]
+        height = lower_right[1] - upper_left[1]
+        tiles_per_side = 2 ** tile_zoom
+
+        min_x = max(0, math.floor((upper_left[0] - width * self.margin) * scale))
+        max_x = min(tiles_per_side - 1, math.floor((lower_right[0] + width * self.margin) * scale))
+        min_y = max(0, math.floor((upper_left[1] - height * self.margin) * scale))
+        max_y = min(tiles_per_side - 1, math.floor((lower_right[1] + height * self.margin) * scale))
+
+        return [(tile_zoom, x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    @staticmethod
+    def _tile_bbox(keys):
+        """Latitude/longitude box covering a set of tiles at one zoom level"""
+        zoom = keys[0][0]
+        n = 2 ** zoom
+        min_x = min(x for _, x, _ in keys)
+        max_x = max(x for _, x, _ in keys) + 1
+        min_y = min(y for _, _, y in keys)
+        max_y = max(y for _, _, y in keys) + 1
+        max_lat, min_lon = unproject(min_x / n, min_y / n)
+        min_lat, max_lon = unproject(max_x / n, max_y / n)
+        return min_lat, max_lat, min_lon, max_lon
+
+    def _load(self, viewport):
+        self._loaded_viewport = viewport
+        self._loaded_at = time.monotonic()
+        keys = self._tile_keys(viewport)
+        expired = self._loaded_at - self.tile_ttl_seconds
+        missing = [key for key in keys if key not in self._tiles or self._tiles[key][0] < expired]
+
+        if not missing:
+            self._deliver(keys)
+            return
+
+        def fetch():
+            spaces = self.fetch_bbox(*self._tile_bbox(missing))
+            if spaces is None:
+                return None
+
+            # One query covered all missing tiles; bucket rows back into them
+            tiles = {key: [] for key in missing}
+            n = 2 ** missing[0][0]
+            for space in spaces:
+                x, y = project(space['latitude'], space['longitude'])
+                key = (missing[0][0], int(x * n), int(y * n))
+                if key in tiles:
+                    tiles[key].append(space)
+            return tiles
+
+        def retry_later():
+            # Leave the viewport marked unloaded so polling retries it,
+            # after a longer pause than the usual debounce
+            self._loaded_viewport = None
+            self._quiet_ms = -10 * self.debounce_ms
+
+        def on_fetched(tiles):
+            if tiles is None:
+                retry_later()
+                return
+            loaded_at = time.monotonic()
+            self._tiles.update((key, (loaded_at, spaces)) for key, spaces in tiles.items())
+            self._deliver(keys)
+
+        def on_error(error):
+            # e.g. no free pooled connection; not worth a dialog, the retry follows
+            print(f"Error loading parking spaces for the map: {error}")
+            retry_later()
+
+        self.executor.submit('viewport', fetch, on_success=on_fetched, on_error=on_error)
+
+    def _deliver(self, keys):
+        spaces = {}
+        for key in keys:
+            tile = self._tiles.get(key)
+            if tile is None:
+                continue
+            self._tiles.move_to_end(key)
+            for space in tile[1]:
+                spaces[space['id']] = space
+
+        while len(self._tiles) > self.max_cached_tiles:
+            self._tiles.popitem(last=False)
+
+        self.on_spaces(list(spaces.values()))